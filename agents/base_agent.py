@@ -47,8 +47,8 @@ class BaseAgent(ABC):
             await self.message_bus.send_message(message_or_type)
 
     async def register_handler(self, message_type: MessageType, handler: callable):
-        """Registers a message handler with the message bus."""
-        await self.message_bus.register_handler(message_type, handler)
+        """Registers a message handler with the message bus, addressed by this agent's id."""
+        await self.message_bus.register_handler(message_type, handler, agent_id=self.agent_id)
 
     async def _handle_error(self, original_message: MCPMessage, error_code: str, error_message: str, details: str = None):
         """Handles an error by sending an ERROR message back to the sender."""
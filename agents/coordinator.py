@@ -1,10 +1,12 @@
 import asyncio
-from typing import Dict, Any
+import time
+from typing import Any, Callable, Dict, Optional
 from agents.base_agent import BaseAgent
-from mcp.message_types import MCPMessage, MessageType, IngestionRequestPayload, RetrievalRequestPayload, LLMRequestPayload, LLMResponsePayload, ErrorPayload
+from mcp.message_types import MCPMessage, MessageType, IngestionRequestPayload, RetrievalRequestPayload, LLMRequestPayload, LLMResponsePayload, LLMStreamDeltaPayload, ErrorPayload
 from mcp.protocol import ModelContextProtocol
 from utils.logging_config import logger
 from utils.helpers import generate_unique_id
+from utils.metrics import LatencyStats
 
 class Coordinator(BaseAgent):
     """The Coordinator Agent manages the overall flow of the RAG chatbot."""
@@ -12,11 +14,17 @@ class Coordinator(BaseAgent):
     def __init__(self, message_bus: ModelContextProtocol):
         super().__init__("CoordinatorAgent", message_bus)
         self.active_requests: Dict[str, asyncio.Queue] = {}
+        # Streaming consumers and start times of in-flight queries, by trace id.
+        self.delta_callbacks: Dict[str, Callable[[str], Any]] = {}
+        self.request_started: Dict[str, float] = {}
+        # Seconds from a query entering the coordinator to its first token reaching it.
+        self.time_to_first_token = LatencyStats()
 
     async def setup(self):
         """Registers handlers for messages relevant to the Coordinator."""
         await self.register_handler(MessageType.INGESTION_COMPLETE, self._handle_ingestion_complete)
         await self.register_handler(MessageType.RETRIEVAL_RESULT, self._handle_retrieval_result)
+        await self.register_handler(MessageType.LLM_STREAM_DELTA, self._handle_llm_stream_delta)
         await self.register_handler(MessageType.LLM_RESPONSE, self._handle_llm_response)
         await self.register_handler(MessageType.ERROR, self._handle_error_message)
         logger.info("CoordinatorAgent setup complete.")
@@ -28,15 +36,29 @@ class Coordinator(BaseAgent):
         while True:
             await asyncio.sleep(1) # Keep the agent alive
 
-    async def process_query(self, query: str, file_path: str = None, file_type: str = None) -> Dict[str, Any]:
-        """Initiates a new RAG process based on user query and optional file upload."""
+    async def process_query(self, query: str, file_path: str = None, file_type: str = None,
+                            on_delta: Optional[Callable[[str], Any]] = None,
+                            namespace: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Initiates a new RAG process based on user query and optional file upload.
+
+        Args:
+            on_delta (callable, optional): Called (or awaited, if async) with each token
+                delta of the answer as it is generated.
+            namespace (str, optional): The vector store namespace (workspace or session)
+                to ingest into and search. Defaults to the shared default namespace.
+        """
         trace_id = generate_unique_id(query + str(file_path) + str(file_type))
         response_queue = asyncio.Queue(1)
         self.active_requests[trace_id] = response_queue
+        self.request_started[trace_id] = time.perf_counter()
+        if on_delta is not None:
+            self.delta_callbacks[trace_id] = on_delta
 
         if file_path and file_type:
             logger.info(f"Coordinator: Initiating ingestion for {file_path} (Trace ID: {trace_id})")
-            ingestion_payload = IngestionRequestPayload(file_path=file_path, file_type=file_type, document_id=trace_id)
+            ingestion_payload = IngestionRequestPayload(file_path=file_path, file_type=file_type, document_id=trace_id,
+                                                        namespace=namespace)
             await self.send_message(
                 MCPMessage(
                     sender=self.agent_id,
@@ -49,7 +71,7 @@ class Coordinator(BaseAgent):
             )
         else:
             logger.info(f"Coordinator: Initiating retrieval for query '{query}' (Trace ID: {trace_id})")
-            retrieval_payload = RetrievalRequestPayload(query=query)
+            retrieval_payload = RetrievalRequestPayload(query=query, namespace=namespace)
             await self.send_message(
                 MCPMessage(
                     sender=self.agent_id,
@@ -62,9 +84,16 @@ class Coordinator(BaseAgent):
             )
 
         # Wait for the final response
-        final_response = await response_queue.get()
-        del self.active_requests[trace_id]
-        return final_response
+        try:
+            return await response_queue.get()
+        finally:
+            del self.active_requests[trace_id]
+            self.request_started.pop(trace_id, None)
+            self.delta_callbacks.pop(trace_id, None)
+
+    def latency_stats(self) -> dict:
+        """Returns the end-to-end time-to-first-token distribution of recent queries."""
+        return {"time_to_first_token": self.time_to_first_token.stats()}
 
     async def _handle_ingestion_complete(self, message: MCPMessage):
         """Handles INGESTION_COMPLETE messages and triggers retrieval."""
@@ -76,7 +105,8 @@ class Coordinator(BaseAgent):
         # In a more complex system, the Coordinator would maintain state for each trace_id
         original_query = "" # Placeholder: need to retrieve original query associated with trace_id
 
-        retrieval_payload = RetrievalRequestPayload(query=original_query, document_ids=[payload.document_id])
+        retrieval_payload = RetrievalRequestPayload(query=original_query, document_ids=[payload.document_id],
+                                                    namespace=payload.namespace)
         await self.send_message(
             MCPMessage(
                 sender=self.agent_id,
@@ -96,8 +126,10 @@ class Coordinator(BaseAgent):
 
         llm_payload = LLMRequestPayload(
             query=payload.query,
-            context=retrieval_result.get("top_chunks", []),
-            chat_history=[] # Placeholder for actual chat history
+            context=retrieval_result.get("top_chunks") or retrieval_result.get("documents", []),
+            chat_history=[], # Placeholder for actual chat history
+            context_ids=retrieval_result.get("chunk_ids"),
+            namespace=retrieval_result.get("namespace")
         )
         await self.send_message(
             MCPMessage(
@@ -110,14 +142,42 @@ class Coordinator(BaseAgent):
             )
         )
 
+    def _record_first_token(self, trace_id: str) -> Optional[float]:
+        """Records the time to first token of a query the first time it is seen."""
+        started = self.request_started.pop(trace_id, None)
+        if started is None:
+            return None
+        elapsed = time.perf_counter() - started
+        self.time_to_first_token.record(elapsed)
+        logger.info(f"Coordinator: first token after {elapsed:.3f}s (Trace ID: {trace_id})")
+        return elapsed
+
+    async def _handle_llm_stream_delta(self, message: MCPMessage):
+        """Handles LLM_STREAM_DELTA messages and forwards each token delta to the caller."""
+        payload = LLMStreamDeltaPayload(**message.payload)
+        self._record_first_token(message.trace_id)
+        callback = self.delta_callbacks.get(message.trace_id)
+        if callback is not None:
+            result = callback(payload.delta)
+            if asyncio.iscoroutine(result):
+                await result
+
     async def _handle_llm_response(self, message: MCPMessage):
-        """Handles LLM_RESPONSE messages and sends the final response back to the caller."""
+        """
+        Handles LLM_RESPONSE messages and sends the final response back to the caller.
+        For streamed answers this is the summary sent after the last delta.
+        """
         payload = LLMResponsePayload(**message.payload)
         logger.info(f"Coordinator: LLM response received (Trace ID: {message.trace_id})")
+        if not payload.streamed:
+            self._record_first_token(message.trace_id)
         if message.trace_id in self.active_requests:
             await self.active_requests[message.trace_id].put({
                 "response": payload.response,
-                "source_documents": payload.source_documents
+                "source_documents": payload.source_documents,
+                "cached": payload.cached,
+                "time_to_first_token": payload.time_to_first_token,
+                "generation_seconds": payload.generation_seconds
             })
 
     async def _handle_error_message(self, message: MCPMessage):
@@ -1,13 +1,17 @@
+import asyncio
 import logging
 import os
+import time
+from datetime import datetime
+from typing import Optional
 from agents.base_agent import BaseAgent
-from mcp.message_types import MessageType, MCPMessage
-from processors.pdf_processor import PDFProcessor
-from processors.pptx_processor import PPTXProcessor
-from processors.docx_processor import DOCXProcessor
-from processors.csv_processor import CSVProcessor
-from processors.text_processor import TextProcessor
-from vector_store.faiss_store import FAISSVectorStore
+from mcp.message_types import MessageType, MCPMessage, IngestionStatusRequestPayload
+from processors.ingestion_jobs import JOBS_DIR_NAME, IngestionJob, IngestionJobStore
+from processors.pool import ProcessingPool
+from vector_store.embedding_cache import EmbeddingCacheStats
+from vector_store.faiss_store import validate_namespace
+from vector_store.registry import ResourceRegistry, registry
+from config.settings import settings
 from utils.helpers import get_file_extension
 
 logger = logging.getLogger(__name__)
@@ -16,35 +20,82 @@ class IngestionAgent(BaseAgent):
     """
     The IngestionAgent is responsible for processing documents, extracting text,
     chunking it, generating embeddings, and adding them to the vector store.
+
+    Each document is ingested as a persistent job (see processors.ingestion_jobs)
+    that is checkpointed after every chunk batch is durably added to the store. A
+    job cut short by a crash or an error resumes after its last committed batch when
+    the document is requested again, or on startup; the chunks before it are parsed
+    again but not re-embedded. INGESTION_STATUS_REQUEST messages are answered with
+    the jobs' progress and throughput.
+
+    Requests name the vector store namespace to ingest into; the registry loads its
+    store for the duration of the job.
     """
-    def __init__(self, message_bus):
+    def __init__(self, message_bus, resources: ResourceRegistry = registry,
+                 processing_pool: ProcessingPool = None):
         super().__init__("IngestionAgent", message_bus)
-        self.vector_store = FAISSVectorStore()
-        self.processors = {
-            ".pdf": PDFProcessor(),
-            ".pptx": PPTXProcessor(),
-            ".docx": DOCXProcessor(),
-            ".csv": CSVProcessor(),
-            ".txt": TextProcessor(),
-            ".md": TextProcessor(),
-        }
+        # The store (and its embedding model) is shared process-wide through the registry.
+        self.resources = resources
+        self.vector_store = resources.acquire_vector_store()
+        # Parsing runs in worker processes so large files never block the event loop.
+        self.processing_pool = processing_pool or ProcessingPool()
+        # Job checkpoints, for every namespace, live next to the default index.
+        self.jobs = IngestionJobStore(os.path.join(os.path.dirname(self.vector_store.index_path), JOBS_DIR_NAME))
+        self._resume_task: Optional[asyncio.Task] = None
         logger.info("IngestionAgent initialized.")
 
     async def setup(self):
         """Sets up the agent, including registering message handlers."""
         await self.register_handler(MessageType.INGESTION_REQUEST, self.handle_ingestion_request)
-        logger.info("IngestionAgent setup complete and handler for INGESTION_REQUEST registered.")
+        await self.register_handler(MessageType.INGESTION_STATUS_REQUEST, self.handle_ingestion_status_request)
+        if settings.INGESTION_RESUME_ON_STARTUP:
+            self._resume_task = asyncio.create_task(self.resume_interrupted_jobs())
+        logger.info("IngestionAgent setup complete and handlers for INGESTION_REQUEST and INGESTION_STATUS_REQUEST registered.")
 
     async def run(self):
         """Runs the agent's main logic. For IngestionAgent, this is a no-op as it's event-driven."""
         pass
 
+    def close(self):
+        """Stops the processing pool and releases the agent's handle on the shared vector store."""
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+        self.processing_pool.shutdown()
+        if self.vector_store is not None:
+            self.resources.release_vector_store(self.vector_store.namespace)
+            self.vector_store = None
+
+    async def resume_interrupted_jobs(self) -> int:
+        """
+        Resumes, one at a time, the jobs a process that is no longer running left
+        unfinished. Jobs whose file is gone are marked failed.
+
+        Returns:
+            int: The number of jobs resumed.
+        """
+        loop = asyncio.get_running_loop()
+        resumed = 0
+        for job in await loop.run_in_executor(None, self.jobs.interrupted):
+            if not os.path.exists(job.file_path):
+                job.status, job.error = "failed", f"File not found: {job.file_path}"
+                await loop.run_in_executor(None, self.jobs.save, job)
+                continue
+            claimed = await loop.run_in_executor(None, self.jobs.claim, job.document_id, job.file_path, job.namespace)
+            if claimed is not None:
+                logger.info(f"Resuming interrupted ingestion job {claimed.job_id} for {claimed.file_path}.")
+                await self._ingest(claimed, claimed.job_id)
+                resumed += 1
+        return resumed
+
     async def handle_ingestion_request(self, message: MCPMessage):
         """
         Handles an ingestion request by processing the document and adding it to the vector store.
         """
-        file_path = message.payload.file_path
-        request_id = message.payload.request_id
+        file_path = message.payload["file_path"]
+        request_id = message.payload.get("request_id", message.trace_id)
+        # Re-ingesting a document replaces its previous chunks instead of duplicating them.
+        document_id = message.payload.get("document_id") or file_path
+        namespace = message.payload.get("namespace") or settings.VECTOR_STORE_DEFAULT_NAMESPACE
         logger.info(f"IngestionAgent received request for file: {file_path} (Request ID: {request_id})")
 
         if not os.path.exists(file_path):
@@ -60,9 +111,7 @@ class IngestionAgent(BaseAgent):
             return
 
         file_extension = get_file_extension(file_path)
-        processor = self.processors.get(file_extension)
-
-        if not processor:
+        if not self.processing_pool.supports(file_extension):
             logger.error(f"No processor found for file type: {file_extension}")
             await self.send_message(
                 MessageType.INGESTION_RESPONSE,
@@ -74,36 +123,154 @@ class IngestionAgent(BaseAgent):
             )
             return
 
+        loop = asyncio.get_running_loop()
         try:
-            chunks = processor.process(file_path)
-            if chunks:
-                self.vector_store.add_documents(chunks)
-                logger.info(f"Successfully ingested and added {len(chunks)} chunks from {file_path} to vector store.")
-                await self.send_message(
-                    MessageType.INGESTION_RESPONSE,
-                    {
-                        "request_id": request_id,
-                        "status": "success",
-                        "message": f"Successfully ingested {len(chunks)} chunks from {file_path}"
-                    }
-                )
-            else:
-                logger.warning(f"No chunks extracted from {file_path}.")
-                await self.send_message(
-                    MessageType.INGESTION_RESPONSE,
-                    {
-                        "request_id": request_id,
-                        "status": "failed",
-                        "message": f"No content extracted or chunks generated from {file_path}"
-                    }
-                )
+            validate_namespace(namespace)
+            job = await loop.run_in_executor(None, self.jobs.claim, document_id, file_path, namespace)
         except Exception as e:
-            logger.error(f"Error during ingestion of {file_path}: {e}")
+            logger.error(f"Could not start the ingestion job for {file_path}: {e}")
+            job = None
+            error = f"Error during ingestion: {str(e)}"
+        else:
+            error = f"Ingestion of {document_id} is already in progress"
+        if job is None:
             await self.send_message(
                 MessageType.INGESTION_RESPONSE,
                 {
                     "request_id": request_id,
                     "status": "failed",
-                    "message": f"Error during ingestion: {str(e)}"
+                    "message": error
+                }
+            )
+            return
+        await self._ingest(job, request_id)
+
+    async def _ingest(self, job: IngestionJob, request_id: str):
+        """Runs a claimed job to completion or failure, checkpointing every batch, and reports the outcome."""
+        try:
+            async with self.resources.async_vector_store(job.namespace) as vector_store:
+                response = await self._run_job(job, request_id, vector_store)
+        except Exception as e:
+            # The namespace's store could not be loaded.
+            logger.error(f"Error during ingestion of {job.file_path}: {e}")
+            job.status, job.error = "failed", str(e)
+            self._finish(job)
+            response = {
+                "request_id": request_id,
+                "status": "failed",
+                "message": f"Error during ingestion: {str(e)}"
+            }
+        response["job_id"] = job.job_id
+        response["namespace"] = job.namespace
+        response["resumed_from_chunk"] = job.resumed_from_chunk
+        await self.send_message(MessageType.INGESTION_RESPONSE, response)
+
+    def _finish(self, job: IngestionJob):
+        """Saves a job's final status and ends this process's run of it."""
+        try:
+            self.jobs.save(job)
+        except Exception as e:
+            logger.error(f"Could not save ingestion job {job.job_id}: {e}")
+        self.jobs.release(job)
+
+    async def _run_job(self, job: IngestionJob, request_id: str, vector_store) -> dict:
+        """Ingests a claimed job's file into `vector_store` and returns the response payload."""
+        file_path, document_id = job.file_path, job.document_id
+        loop = asyncio.get_running_loop()
+        # The store, not the checkpoint, records what was added: a crash between adding a
+        # batch and checkpointing it leaves the batch stored but not yet counted.
+        stored = vector_store.document_chunk_count(document_id)
+        if job.committed_batches and stored >= job.committed_chunks:
+            job.committed_chunks = stored
+        else:
+            # Nothing of this version was committed; any stored chunks are the previous version's.
+            job.committed_batches = job.committed_chunks = 0
+        job.resumed_from_chunk = skip = job.committed_chunks
+        if skip:
+            logger.info(f"Resuming ingestion of {file_path} after {skip} committed chunks.")
+        checkpointed = time.perf_counter()
+        cache_stats = EmbeddingCacheStats()
+        try:
+            async for chunk_batch, chunk_metadatas in self.processing_pool.stream_records(file_path):
+                if skip >= len(chunk_batch):
+                    skip -= len(chunk_batch)
+                    continue
+                chunk_batch, chunk_metadatas = chunk_batch[skip:], chunk_metadatas[skip:]
+                skip = 0
+                metadatas = [{"document_id": document_id, "source": file_path, **metadata} for metadata in chunk_metadatas]
+                # Embedding is CPU-bound too; keep it off the event loop as batches arrive.
+                # The first batch replaces any earlier version of the document; later ones append.
+                if job.committed_chunks == 0:
+                    await loop.run_in_executor(None, vector_store.upsert_document, document_id, chunk_batch,
+                                               metadatas, cache_stats)
+                else:
+                    await loop.run_in_executor(None, vector_store.add_documents, chunk_batch, metadatas, cache_stats)
+                job.committed_batches += 1
+                job.committed_chunks += len(chunk_batch)
+                now = time.perf_counter()
+                job.active_seconds += now - checkpointed
+                checkpointed = now
+                await loop.run_in_executor(None, self.jobs.save, job)
+            processed_chunks = job.committed_chunks
+            if processed_chunks:
+                job.status = "completed"
+                logger.info(f"Successfully ingested and added {processed_chunks} chunks from {file_path} to vector store. "
+                            f"Embedding cache hit rate {cache_stats.hit_rate:.1%}, ~{cache_stats.seconds_saved:.2f}s saved.")
+                response = {
+                    "request_id": request_id,
+                    "status": "success",
+                    "message": f"Successfully ingested {processed_chunks} chunks from {file_path}",
+                    "embedding_cache": cache_stats.as_dict()
+                }
+            else:
+                job.status, job.error = "failed", "No chunks extracted"
+                logger.warning(f"No chunks extracted from {file_path}.")
+                response = {
+                    "request_id": request_id,
+                    "status": "failed",
+                    "message": f"No content extracted or chunks generated from {file_path}"
                 }
-            )
\ No newline at end of file
+        except Exception as e:
+            logger.error(f"Error during ingestion of {file_path}: {e}")
+            job.status, job.error = "failed", str(e)
+            response = {
+                "request_id": request_id,
+                "status": "failed",
+                "message": f"Error during ingestion: {str(e)}"
+            }
+        finally:
+            job.active_seconds += time.perf_counter() - checkpointed
+            self._finish(job)
+        return response
+
+    async def handle_ingestion_status_request(self, message: MCPMessage):
+        """
+        Answers an INGESTION_STATUS_REQUEST with the matching jobs' progress records,
+        under the request's trace id.
+        """
+        payload = IngestionStatusRequestPayload(**message.payload)
+        request_id = message.payload.get("request_id", message.trace_id)
+        loop = asyncio.get_running_loop()
+        jobs = await loop.run_in_executor(None, self.jobs.list)
+        interrupted = {job.job_id for job in await loop.run_in_executor(None, self.jobs.interrupted)}
+        records = []
+        for job in jobs:
+            if payload.job_id is not None and job.job_id != payload.job_id:
+                continue
+            if payload.document_id is not None and job.document_id != payload.document_id:
+                continue
+            if payload.namespace is not None and job.namespace != payload.namespace:
+                continue
+            record = job.as_dict()
+            record["interrupted"] = job.job_id in interrupted
+            records.append(record)
+        await self.send_message(
+            MCPMessage(
+                sender=self.agent_id,
+                receiver="*",
+                type=MessageType.INGESTION_STATUS,
+                trace_id=message.trace_id,
+                timestamp=datetime.now().isoformat(),
+                payload={"request_id": request_id, "jobs": records}
+            )
+        )
@@ -1,8 +1,14 @@
 import logging
+import time
 import traceback
+from typing import List, Optional
 from agents.base_agent import BaseAgent
-from mcp.message_types import MessageType, MCPMessage, LLMRequestPayload, LLMResponsePayload, ErrorPayload
+from mcp.message_types import MessageType, MCPMessage, LLMRequestPayload, LLMResponsePayload, LLMStreamDeltaPayload, ErrorPayload
 from config.settings import settings
+from utils.metrics import LatencyStats
+from vector_store.answer_cache import SemanticAnswerCache, context_fingerprint
+from vector_store.batching import BatchingEmbeddingService
+from vector_store.registry import ResourceRegistry, registry
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
@@ -16,12 +22,29 @@ class LLMAgent(BaseAgent):
     """
     The LLMAgent is responsible for interacting with the Language Model to generate responses.
     """
-    def __init__(self, message_bus):
+    def __init__(self, message_bus, resources: ResourceRegistry = registry,
+                 answer_cache: Optional[SemanticAnswerCache] = None):
         super().__init__("LLMAgent", message_bus)
         genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
         self.model_name = settings.LLM_MODEL_NAME
         self.temperature = settings.LLM_TEMPERATURE
         self.client = genai.GenerativeModel(self.model_name)
+        self.streaming = settings.LLM_STREAMING
+        # Seconds from receiving a request to its first token, cached answers included.
+        self.time_to_first_token = LatencyStats()
+
+        # Near-duplicate questions over the same retrieved context are answered from the
+        # semantic answer cache; deleting or re-ingesting a contributing chunk invalidates them.
+        self.resources = resources
+        self.vector_store = None
+        self.embedding_service = None
+        self.answer_cache = answer_cache
+        if self.answer_cache is not None or settings.ANSWER_CACHE_ENABLED:
+            self.vector_store = resources.acquire_vector_store()
+            self.embedding_service = BatchingEmbeddingService(self.vector_store.embedding_model)
+            if self.answer_cache is None:
+                self.answer_cache = SemanticAnswerCache(self.vector_store.embedding_model.dimension)
+            self.vector_store.add_change_listener(self.answer_cache.invalidate_chunks)
         logger.info("LLMAgent initialized.")
         
     async def setup(self):
@@ -33,26 +56,125 @@ class LLMAgent(BaseAgent):
         """Runs the agent's main logic. For LLMAgent, this is a no-op as it's event-driven."""
         pass
 
+    def latency_stats(self) -> dict:
+        """Returns the time-to-first-token distribution of recent requests."""
+        return {"time_to_first_token": self.time_to_first_token.stats()}
+
+    def cache_stats(self) -> Optional[dict]:
+        """Returns the hit/miss counters of the semantic answer cache, if enabled."""
+        return self.answer_cache.stats() if self.answer_cache is not None else None
+
+    def close(self):
+        """Releases the agent's handle on the shared vector store."""
+        if self.embedding_service is not None:
+            self.embedding_service.close()
+            self.embedding_service = None
+        if self.vector_store is not None:
+            self.vector_store.remove_change_listener(self.answer_cache.invalidate_chunks)
+            self.resources.release_vector_store(self.vector_store.namespace)
+            self.vector_store = None
+
+    async def _send_to_coordinator(self, message_type: MessageType, trace_id: str, payload: dict):
+        await self.send_message(
+            MCPMessage(
+                sender=self.agent_id,
+                receiver="CoordinatorAgent",
+                type=message_type,
+                trace_id=trace_id,
+                timestamp="",
+                payload=payload
+            )
+        )
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Returns the text of a streamed chunk; chunks carrying only a finish reason have none."""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    async def _generate(self, prompt: str, stream: bool, trace_id: str, started: float):
+        """
+        Generates a response to `prompt`, sending each streamed chunk as an
+        LLM_STREAM_DELTA message when `stream` is set.
+
+        Returns:
+            tuple: The full response text, the number of deltas sent and the time to first token.
+        """
+        generation_config = genai.GenerationConfig(temperature=self.temperature)
+        if not stream:
+            response = await self.client.generate_content_async(prompt, generation_config=generation_config)
+            return response.text, None, time.perf_counter() - started
+
+        parts: List[str] = []
+        first_token = None
+        response = await self.client.generate_content_async(prompt, generation_config=generation_config, stream=True)
+        async for chunk in response:
+            text = self._chunk_text(chunk)
+            if not text:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            delta = LLMStreamDeltaPayload(trace_id=trace_id, index=len(parts), delta=text)
+            await self._send_to_coordinator(MessageType.LLM_STREAM_DELTA, trace_id, delta.model_dump())
+            parts.append(text)
+        return "".join(parts), len(parts), first_token
+
     async def handle_llm_request(self, message: MCPMessage):
         """
         Handles an LLM request by generating a response based on the provided prompt and context.
+
+        In streaming mode the response is sent as LLM_STREAM_DELTA messages as it is
+        generated, followed by an LLM_RESPONSE carrying the full text and the timings.
         """
+        started = time.perf_counter()
         payload = LLMRequestPayload(**message.payload)
+        stream = self.streaming if payload.stream is None else payload.stream
         logger.info(f"LLMAgent received request (Trace ID: {message.trace_id})")
 
         try:
+            query_embedding = None
+            fingerprint = None
+            # Chunk ids are per namespace, and the cache only hears of changes to the store it listens to.
+            namespace = payload.namespace or settings.VECTOR_STORE_DEFAULT_NAMESPACE
+            if self.embedding_service is not None and namespace == self.vector_store.namespace:
+                fingerprint = context_fingerprint(payload.context_ids, payload.context)
+                query_embedding = await self.embedding_service.embed(payload.query)
+                cached = self.answer_cache.lookup(query_embedding, fingerprint)
+                if cached is not None:
+                    answer, similarity = cached
+                    logger.info(f"Answer cache hit (similarity {similarity:.3f}) for trace ID: {message.trace_id}")
+                    if stream:
+                        delta = LLMStreamDeltaPayload(trace_id=message.trace_id, index=0, delta=answer["response"])
+                        await self._send_to_coordinator(MessageType.LLM_STREAM_DELTA, message.trace_id, delta.model_dump())
+                    elapsed = time.perf_counter() - started
+                    self.time_to_first_token.record(elapsed)
+                    response_payload = LLMResponsePayload(
+                        response=answer["response"],
+                        source_documents=answer["source_documents"],
+                        trace_id=message.trace_id,
+                        cached=True,
+                        streamed=stream,
+                        deltas=1 if stream else None,
+                        time_to_first_token=elapsed,
+                        generation_seconds=elapsed
+                    )
+                    await self._send_to_coordinator(MessageType.LLM_RESPONSE, message.trace_id, response_payload.model_dump())
+                    return
+
             # Gemini expects a single string or a list of Content objects, not OpenAI-style {role, content} dicts
             context_str = "\n".join(payload.context)
             prompt = f"Context:\n{context_str}\n\nQuestion: {payload.query}"
 
-            response = await self.client.generate_content_async(
-                prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=self.temperature
-                )
+            llm_response_content, deltas, time_to_first_token = await self._generate(
+                prompt, stream, message.trace_id, started
             )
-            llm_response_content = response.text
-            logger.info(f"Successfully generated LLM response for trace ID: {message.trace_id}")
+            generation_seconds = time.perf_counter() - started
+            if time_to_first_token is not None:
+                self.time_to_first_token.record(time_to_first_token)
+            logger.info(f"Successfully generated LLM response for trace ID: {message.trace_id} "
+                        f"(first token {time_to_first_token or 0:.3f}s, total {generation_seconds:.3f}s)")
 
             # Prepare source_documents list from context and metadata if available
             source_documents = []
@@ -64,22 +186,21 @@ class LLMAgent(BaseAgent):
                 for chunk in payload.context:
                     source_documents.append({"content": chunk, "metadata": {}})
 
+            if query_embedding is not None:
+                self.answer_cache.add(payload.query, query_embedding, fingerprint, payload.context_ids,
+                                      {"response": llm_response_content, "source_documents": source_documents})
+
             # Send the response back to the Coordinator
             response_payload = LLMResponsePayload(
                 response=llm_response_content,
                 source_documents=source_documents,
-                trace_id=message.trace_id
-            )
-            await self.send_message(
-                MCPMessage(
-                    sender=self.agent_id,
-                    receiver="CoordinatorAgent",
-                    type=MessageType.LLM_RESPONSE,
-                    trace_id=message.trace_id,
-                    timestamp="",
-                    payload=response_payload.model_dump()
-                )
+                trace_id=message.trace_id,
+                streamed=stream,
+                deltas=deltas,
+                time_to_first_token=time_to_first_token,
+                generation_seconds=generation_seconds
             )
+            await self._send_to_coordinator(MessageType.LLM_RESPONSE, message.trace_id, response_payload.model_dump())
         except Exception as e:
             logger.error(f"Error generating LLM response for trace ID {message.trace_id}: {e}")
             error_payload = ErrorPayload(
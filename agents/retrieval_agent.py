@@ -1,18 +1,28 @@
+import asyncio
+import functools
 import logging
+from datetime import datetime
 from agents.base_agent import BaseAgent
-from mcp.message_types import MessageType, MCPMessage
-from vector_store.faiss_store import FAISSVectorStore
+from config.settings import settings
+from mcp.message_types import MessageType, MCPMessage, RetrievalRequestPayload
+from vector_store.batching import BatchingEmbeddingService
+from vector_store.registry import ResourceRegistry, registry
 
 logger = logging.getLogger(__name__)
 
 class RetrievalAgent(BaseAgent):
     """
     The RetrievalAgent is responsible for retrieving relevant information from the
-    vector store based on a user query.
+    vector store based on a user query. Requests may name a vector store namespace;
+    the registry keeps recently searched namespaces resident.
     """
-    def __init__(self, message_bus):
+    def __init__(self, message_bus, resources: ResourceRegistry = registry):
         super().__init__("RetrievalAgent", message_bus)
-        self.vector_store = FAISSVectorStore()
+        # The store (and its embedding model) is shared process-wide through the registry.
+        self.resources = resources
+        self.vector_store = resources.acquire_vector_store()
+        # Concurrent queries share encode calls instead of embedding one sentence at a time.
+        self.embedding_service = BatchingEmbeddingService(self.vector_store.embedding_model)
         logger.info("RetrievalAgent initialized.")
         
     async def setup(self):
@@ -24,50 +34,79 @@ class RetrievalAgent(BaseAgent):
         """Runs the agent's main logic. For RetrievalAgent, this is a no-op as it's event-driven."""
         pass
 
+    def cache_stats(self) -> dict:
+        """Returns the hit/miss counters of the query embedding and search result caches."""
+        return {
+            "query_embeddings": self.embedding_service.cache.stats(),
+            "results": self.vector_store.result_cache.stats(),
+        }
+
+    def close(self):
+        """Releases the agent's handle on the shared vector store."""
+        self.embedding_service.close()
+        if self.vector_store is not None:
+            self.resources.release_vector_store(self.vector_store.namespace)
+            self.vector_store = None
+
+    async def _send_result(self, request: MCPMessage, payload: dict):
+        """Broadcasts a RETRIEVAL_RESULT under the trace id of the request it answers."""
+        await self.send_message(
+            MCPMessage(
+                sender=self.agent_id,
+                receiver="*",
+                type=MessageType.RETRIEVAL_RESULT,
+                trace_id=request.trace_id,
+                timestamp=datetime.now().isoformat(),
+                payload=payload
+            )
+        )
+
     async def handle_retrieval_request(self, message: MCPMessage):
         """
         Handles a retrieval request by querying the vector store and returning
         the most relevant documents.
         """
-        query = message.payload.query
-        request_id = message.payload.request_id
-        top_k = message.payload.top_k
+        payload = RetrievalRequestPayload(**message.payload)
+        query = payload.query
+        request_id = message.payload.get("request_id", message.trace_id)
+        top_k = payload.top_k
+        namespace = payload.namespace or settings.VECTOR_STORE_DEFAULT_NAMESPACE
         logger.info(f"RetrievalAgent received request for query: '{query}' (Request ID: {request_id})")
 
         try:
-            retrieved_docs = self.vector_store.search(query, k=top_k)
+            query_embedding = await self.embedding_service.embed(query)
+            async with self.resources.async_vector_store(namespace) as vector_store:
+                # A search can take a while on a large store; other requests keep being handled.
+                search = functools.partial(vector_store.search_chunks, query_embedding, k=top_k,
+                                           document_ids=payload.document_ids)
+                hits = await asyncio.get_running_loop().run_in_executor(None, search)
+            retrieved_docs = [hit["text"] for hit in hits]
             if retrieved_docs:
                 logger.info(f"Successfully retrieved {len(retrieved_docs)} documents for query '{query}'.")
-                await self.send_message(
-                    MessageType.RETRIEVAL_RESULT,
-                    {
-                        "request_id": request_id,
-                        "status": "success",
-                        "query": query,
-                        "documents": retrieved_docs
-                    }
-                )
+                await self._send_result(message, {
+                    "request_id": request_id,
+                    "status": "success",
+                    "query": query,
+                    "namespace": namespace,
+                    "documents": retrieved_docs,
+                    "metadata": [hit["metadata"] for hit in hits],
+                    "chunk_ids": [hit["id"] for hit in hits]
+                })
             else:
                 logger.warning(f"No documents found for query '{query}'.")
-                await self.send_message(
-                    MessageType.RETRIEVAL_RESULT,
-                    {
-                        "request_id": request_id,
-                        "status": "failed",
-                        "query": query,
-                        "documents": [],
-                        "message": "No relevant documents found."
-                    }
-                )
-        except Exception as e:
-            logger.error(f"Error during retrieval for query '{query}': {e}")
-            await self.send_message(
-                MessageType.RETRIEVAL_RESULT,
-                {
+                await self._send_result(message, {
                     "request_id": request_id,
                     "status": "failed",
                     "query": query,
                     "documents": [],
-                    "message": f"Error during retrieval: {str(e)}"
-                }
-            )
\ No newline at end of file
+                    "message": "No relevant documents found."
+                })
+        except Exception as e:
+            logger.error(f"Error during retrieval for query '{query}': {e}")
+            await self._send_result(message, {
+                "request_id": request_id,
+                "status": "failed",
+                "query": query,
+                "documents": [],
+                "message": f"Error during retrieval: {str(e)}"
+            })
\ No newline at end of file
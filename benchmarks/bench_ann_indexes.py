@@ -0,0 +1,97 @@
+"""Compares the FAISS index types selectable with FAISS_INDEX_TYPE.
+
+For each synthetic corpus (clustered Gaussian vectors) every index type is built
+with vector_store.index_factory.build_index, then queried with held-out vectors.
+Reported per index type and search knob (nprobe for IVF, efSearch for HNSW):
+build time, recall@k against the exact Flat results, single-query QPS and the
+serialized index size as a proxy for memory.
+
+Large corpora need a lot of RAM (5M x 384 float32 vectors is ~7.7GB before any
+index is built); lower --dimension to stay within budget.
+
+Usage:
+    python -m benchmarks.bench_ann_indexes --sizes 10000 100000 1000000 5000000 --dimension 128
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from config.settings import settings
+from vector_store.index_factory import build_index, search_params
+
+
+def make_corpus(rng, size: int, dimension: int, clusters: int = 256) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = np.empty((size, dimension), dtype=np.float32)
+    step = 100_000
+    for start in range(0, size, step):
+        count = min(step, size - start)
+        vectors[start:start + count] = centers[rng.integers(clusters, size=count)] \
+            + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors
+
+
+def index_bytes(index: faiss.Index) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index")
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int, expected: np.ndarray, params):
+    started = time.perf_counter()
+    found = np.vstack([index.search(query.reshape(1, -1), k, params=params)[1] for query in queries])
+    elapsed = time.perf_counter() - started
+    recall = np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])
+    return recall, len(queries) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    # Benchmark every type at every size instead of falling back to Flat.
+    settings.FAISS_ANN_MIN_VECTORS = 0
+    rng = np.random.default_rng(0)
+
+    print(f"{'corpus':>10} {'index':<10}{'knob':>14}{'build s':>10}{'recall@' + str(args.k):>11}{'QPS':>10}{'MB':>10}")
+    for size in args.sizes:
+        vectors = make_corpus(rng, size, args.dimension)
+        queries = vectors[rng.choice(size, args.queries, replace=False)] \
+            + 0.1 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+        exact = faiss.IndexFlatL2(args.dimension)
+        exact.add(vectors)
+        _, expected = exact.search(queries, args.k)
+        del exact
+
+        for index_type in args.types:
+            started = time.perf_counter()
+            index = build_index(vectors, index_type)
+            build_seconds = time.perf_counter() - started
+            megabytes = index_bytes(index) / 1e6
+            if index_type.startswith("ivf"):
+                knobs = [(f"nprobe={n}", search_params(index, nprobe=n)) for n in args.nprobe]
+            elif index_type == "hnsw":
+                knobs = [(f"efSearch={ef}", search_params(index, ef_search=ef)) for ef in args.ef_search]
+            else:
+                knobs = [("-", None)]
+            for label, params in knobs:
+                recall, qps = measure(index, queries, args.k, expected, params)
+                print(f"{size:>10} {index_type:<10}{label:>14}{build_seconds:>10.1f}{recall:>11.3f}{qps:>10.0f}{megabytes:>10.1f}")
+            del index
+
+
+if __name__ == "__main__":
+    main()
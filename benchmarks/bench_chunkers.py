@@ -0,0 +1,76 @@
+"""Compares the character chunker with the token-bounded sentence chunker.
+
+Both chunkers (utils.chunking) run over the same text: --files, or a synthetic
+report of --paragraphs paragraphs. For each chunker the benchmark reports:
+
+    chunks/s    chunking throughput (for the token chunker, tokenization included)
+    chunks      number of chunks, i.e. vectors to embed and store
+    index MB    Flat index size (chunks x dimension x 4 bytes) plus chunk text
+    truncated   share of chunk tokens beyond the embedding model's limit, which
+                are tokenized and stored but never embedded
+
+Tokens are counted with the embedding model's tokenizer; --approximate uses the
+word-and-punctuation approximation instead (no model download).
+
+Usage:
+    python -m benchmarks.bench_chunkers --paragraphs 5000
+    python -m benchmarks.bench_chunkers --files docs/*.txt --approximate
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from config.settings import settings
+from utils.chunking import CharacterChunker, TokenChunker, approximate_token_counts, embedding_token_counter
+
+WORDS = ("revenue quarterly forecast customer invoice shipment warehouse margin contract "
+         "renewal onboarding latency throughput replication incident postmortem budget").split()
+
+
+def synthetic_text(paragraphs: int, rng) -> str:
+    out = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.integers(3, 9)):
+            words = rng.choice(WORDS, rng.integers(6, 30))
+            sentences.append(" ".join(words).capitalize() + ".")
+        out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+
+def measure(name: str, chunker, text: str, count_tokens, limit: int, dimension: int):
+    started = time.perf_counter()
+    # Feed the text in 64 KB pieces, as the processors do.
+    chunks = list(chunker.chunk_stream(text[i:i + 65536] for i in range(0, len(text), 65536)))
+    seconds = time.perf_counter() - started
+    tokens = np.array(count_tokens(chunks))
+    truncated = np.maximum(tokens - limit, 0).sum() / max(tokens.sum(), 1)
+    index_mb = (len(chunks) * dimension * 4 + sum(len(c.encode("utf-8")) for c in chunks)) / 1e6
+    print(f"{name:>12}{len(chunks) / seconds:>12.0f}{len(chunks):>9}{index_mb:>10.1f}{truncated:>11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--approximate", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.files:
+        text = "\n\n".join(open(path, encoding="utf-8").read() for path in args.files)
+    else:
+        text = synthetic_text(args.paragraphs, np.random.default_rng(0))
+    count_tokens = approximate_token_counts if args.approximate else embedding_token_counter()
+    limit = settings.EMBEDDING_MAX_TOKENS - 2
+
+    print(f"{len(text) / 1e6:.1f} MB of text, {limit} token limit")
+    print(f"{'chunker':>12}{'chunks/s':>12}{'chunks':>9}{'index MB':>10}{'truncated':>11}")
+    measure("characters", CharacterChunker(), text, count_tokens, limit, settings.EMBEDDING_DIMENSION)
+    measure("tokens", TokenChunker(count_tokens=count_tokens), text, count_tokens, limit, settings.EMBEDDING_DIMENSION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compares per-query embedding with the micro-batching embedding service.
+
+Simulates ``--users`` concurrent chat sessions that each send ``--queries``
+questions. The "per-query" path mirrors the original retrieval handler: one
+synchronous ``EmbeddingModel.get_embeddings([query])`` call per question on the
+event loop. The "batched" path awaits ``BatchingEmbeddingService.embed``.
+Reports throughput (queries/sec) and p50/p99 latency per query.
+
+Usage:
+    python -m benchmarks.bench_embedding_batching --users 50 --queries 20
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from vector_store.batching import BatchingEmbeddingService
+from vector_store.embeddings import EmbeddingModel
+
+
+def make_queries(users: int, queries: int) -> list[list[str]]:
+    return [[f"user {u} asks question number {q} about the uploaded report" for q in range(queries)] for u in range(users)]
+
+
+async def run_per_query(model: EmbeddingModel, workload: list[list[str]]) -> list[float]:
+    latencies = []
+
+    async def session(questions):
+        for question in questions:
+            started = time.perf_counter()
+            # Every session shares the event loop, so a query first waits for the
+            # encodes other sessions are blocking it with.
+            await asyncio.sleep(0)
+            model.get_embeddings([question])
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(session(questions) for questions in workload))
+    return latencies
+
+
+async def run_batched(service: BatchingEmbeddingService, workload: list[list[str]]) -> list[float]:
+    latencies = []
+
+    async def session(questions):
+        for question in questions:
+            started = time.perf_counter()
+            await service.embed(question)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(session(questions) for questions in workload))
+    return latencies
+
+
+def report(name: str, latencies: list[float], elapsed: float):
+    lat = np.array(latencies) * 1000
+    print(f"{name:<12}{len(lat) / elapsed:>14.1f}{np.percentile(lat, 50):>12.2f}{np.percentile(lat, 99):>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--max-batch-size", type=int, default=None)
+    parser.add_argument("--max-wait-ms", type=float, default=None)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    model = EmbeddingModel()
+    model.get_embeddings(["warm up"])
+    workload = make_queries(args.users, args.queries)
+
+    print(f"{'path':<12}{'queries/sec':>14}{'p50 ms':>12}{'p99 ms':>12}")
+    started = time.perf_counter()
+    latencies = asyncio.run(run_per_query(model, workload))
+    report("per-query", latencies, time.perf_counter() - started)
+
+    service = BatchingEmbeddingService(model, args.max_batch_size, args.max_wait_ms)
+    started = time.perf_counter()
+    latencies = asyncio.run(run_batched(service, workload))
+    report("batched", latencies, time.perf_counter() - started)
+    print(f"average batch size: {service.requests / max(service.batches, 1):.1f}")
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
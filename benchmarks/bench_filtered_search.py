@@ -0,0 +1,94 @@
+"""Measures document-filtered search across filter selectivities.
+
+A store of --corpus random vectors is split into documents of --doc-size
+chunks. For each selectivity, random documents are picked until that fraction
+of the corpus is selected, and FAISSVectorStore.search_chunks(document_ids=...)
+is timed with the filter forced to each strategy:
+
+    scan      exact distances over the selected chunks' memory-mapped vectors
+    selector  FAISS search with an IDSelector (range, batch or bitmap)
+    auto      the store's choice (FAISS_FILTER_BRUTE_FORCE_RATIO)
+
+Recall@k is measured against the exact scan. Approximate index types
+(--index-type ivf_flat / hnsw) show how selective filters hurt ANN recall.
+
+Usage:
+    python -m benchmarks.bench_filtered_search --corpus 200000 --index-type hnsw
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+from config.settings import settings
+from vector_store.faiss_store import FAISSVectorStore
+from vector_store.query_cache import TTLCache
+
+
+class PrecomputedEmbeddings:
+    """Placeholder embedding model; the benchmark only calls add_embeddings."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+
+def build_store(directory: str, corpus: int, doc_size: int, dimension: int, rng) -> FAISSVectorStore:
+    store = FAISSVectorStore(embedding_model=PrecomputedEmbeddings(dimension), base_dir=directory)
+    # One segment, so the configured index type is used regardless of its size.
+    store.max_segments = 1
+    # Every strategy runs the same queries; none may be answered from the result cache.
+    store.result_cache = TTLCache(0)
+    step = 50_000
+    for offset in range(0, corpus, step):
+        count = min(step, corpus - offset)
+        vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+        texts = [f"chunk {offset + i}" for i in range(count)]
+        metadatas = [{"document_id": f"doc-{(offset + i) // doc_size}"} for i in range(count)]
+        store.add_embeddings(vectors, texts, metadatas)
+        store.wait_for_compaction()
+    store.compact()
+    return store
+
+
+def time_queries(store: FAISSVectorStore, queries, k: int, document_ids, ratio: float):
+    store.filter_brute_force_ratio = ratio
+    started = time.perf_counter()
+    results = [[hit["id"] for hit in store.search_chunks(query, k=k, document_ids=document_ids)] for query in queries]
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=200000)
+    parser.add_argument("--doc-size", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--selectivities", type=float, nargs="+", default=[0.0005, 0.005, 0.02, 0.1, 0.5])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.FAISS_INDEX_TYPE = args.index_type
+    settings.FAISS_ANN_MIN_VECTORS = 0
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(directory, args.corpus, args.doc_size, args.dimension, rng)
+        documents = store.document_ids()
+        queries = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+
+        print(f"{'selected':>10}{'docs':>7}{'strategy':>10}{'QPS':>10}{'recall@' + str(args.k):>11}")
+        for selectivity in args.selectivities:
+            count = max(1, round(selectivity * len(documents)))
+            document_ids = list(rng.choice(documents, count, replace=False))
+            exact, _ = time_queries(store, queries, args.k, document_ids, ratio=1.0)
+            for strategy, ratio in (("scan", 1.0), ("selector", 0.0), ("auto", settings.FAISS_FILTER_BRUTE_FORCE_RATIO)):
+                found, qps = time_queries(store, queries, args.k, document_ids, ratio)
+                recall = np.mean([len(set(e) & set(f)) / max(len(e), 1) for e, f in zip(exact, found)])
+                print(f"{selectivity:>10.2%}{count:>7}{strategy:>10}{qps:>10.0f}{recall:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
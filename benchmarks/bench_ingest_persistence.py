@@ -0,0 +1,84 @@
+"""Measures the disk cost of one ingestion batch as the corpus grows.
+
+"full rewrite" reproduces the original persistence: after every add the whole
+FAISS index and the whole texts file are written again. "segments" is the
+append-only FAISSVectorStore, which writes only the new batch and one log
+record. Embedding is excluded: both paths receive precomputed random vectors.
+
+Usage:
+    python -m benchmarks.bench_ingest_persistence --sizes 1000 10000 100000 --batch 64
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from vector_store.faiss_store import FAISSVectorStore
+
+
+class PrecomputedEmbeddings:
+    """Placeholder embedding model; the benchmark only calls add_embeddings."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+
+def make_batch(rng, size: int, dimension: int, offset: int):
+    vectors = rng.standard_normal((size, dimension)).astype(np.float32)
+    texts = [f"chunk {offset + i} " + "lorem ipsum " * 80 for i in range(size)]
+    return vectors, texts
+
+
+def time_full_rewrite(directory: str, corpus: int, batch: int, dimension: int, rng) -> float:
+    index = faiss.IndexFlatL2(dimension)
+    vectors, texts = make_batch(rng, corpus, dimension, 0)
+    index.add(vectors)
+    new_vectors, new_texts = make_batch(rng, batch, dimension, corpus)
+    path = os.path.join(directory, "faiss_index")
+
+    started = time.perf_counter()
+    index.add(new_vectors)
+    texts.extend(new_texts)
+    faiss.write_index(index, path)
+    with open(path + ".texts", "w", encoding="utf-8") as f:
+        for text in texts:
+            f.write(text + "\n")
+    return time.perf_counter() - started
+
+
+def time_segment_append(directory: str, corpus: int, batch: int, dimension: int, rng) -> float:
+    store = FAISSVectorStore(embedding_model=PrecomputedEmbeddings(dimension), base_dir=directory)
+    step = max(corpus // 8, 1)
+    for offset in range(0, corpus, step):
+        store.add_embeddings(*make_batch(rng, min(step, corpus - offset), dimension, offset))
+    store.wait_for_compaction()
+    new_vectors, new_texts = make_batch(rng, batch, dimension, corpus)
+
+    started = time.perf_counter()
+    store.add_embeddings(new_vectors, new_texts)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--dimension", type=int, default=384)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+
+    print(f"{'corpus':>10}{'full rewrite ms':>18}{'segments ms':>14}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as segment_dir:
+            full = time_full_rewrite(full_dir, size, args.batch, args.dimension, rng)
+            segments = time_segment_append(segment_dir, size, args.batch, args.dimension, rng)
+        print(f"{size:>10}{full * 1000:>18.1f}{segments * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmarks InMemoryMessageBus dispatch modes under a mixed message load.
+
+Handlers simulate the latency profile of the real agents (slow LLM calls,
+medium ingestions, fast retrievals). For every dispatch mode the script reports
+overall messages/sec and the p50/p99 queueing delay, i.e. the time between
+``send_message`` and the moment a handler starts working on the message.
+
+Usage:
+    python -m benchmarks.bench_message_bus --messages 2000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from mcp.message_bus import InMemoryMessageBus
+from mcp.message_types import MCPMessage, MessageType
+from utils.logging_config import logger
+
+# (share of the load, simulated handler latency in seconds)
+LOAD_PROFILE = {
+    MessageType.LLM_REQUEST: (0.2, 0.200),
+    MessageType.INGESTION_REQUEST: (0.1, 0.050),
+    MessageType.RETRIEVAL_REQUEST: (0.7, 0.005),
+}
+
+
+async def run_mode(dispatch_mode: str, num_messages: int, num_traces: int, seed: int) -> dict:
+    bus = InMemoryMessageBus(dispatch_mode=dispatch_mode)
+    delays = defaultdict(list)
+
+    def make_handler(latency: float):
+        async def handler(message: MCPMessage):
+            delays[message.type].append(time.perf_counter() - message.payload["sent_at"])
+            await asyncio.sleep(latency)
+        return handler
+
+    for message_type, (_, latency) in LOAD_PROFILE.items():
+        await bus.register_handler(message_type, make_handler(latency))
+
+    rng = random.Random(seed)
+    types = list(LOAD_PROFILE)
+    weights = [LOAD_PROFILE[t][0] for t in types]
+    traces = [str(uuid.uuid4()) for _ in range(num_traces)]
+
+    await bus.start()
+    started = time.perf_counter()
+    for _ in range(num_messages):
+        await bus.send_message(MCPMessage(
+            sender="bench",
+            receiver="*",
+            type=rng.choices(types, weights)[0],
+            trace_id=rng.choice(traces),
+            timestamp=datetime.now().isoformat(),
+            payload={"sent_at": time.perf_counter()},
+        ))
+    await bus.join()
+    elapsed = time.perf_counter() - started
+    await bus.stop()
+
+    all_delays = np.array([d for per_type in delays.values() for d in per_type])
+    return {
+        "mode": dispatch_mode,
+        "msgs_per_sec": num_messages / elapsed,
+        "p50_ms": float(np.percentile(all_delays, 50) * 1000),
+        "p99_ms": float(np.percentile(all_delays, 99) * 1000),
+        "per_type_p99_ms": {t.value: float(np.percentile(d, 99) * 1000) for t, d in delays.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--traces", type=int, default=200, help="Distinct trace ids the load is spread over.")
+    parser.add_argument("--modes", nargs="+", default=["sequential", "concurrent"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'mode':<12}{'msgs/sec':>12}{'p50 delay ms':>15}{'p99 delay ms':>15}  per-type p99 ms")
+    for mode in args.modes:
+        result = asyncio.run(run_mode(mode, args.messages, args.traces, args.seed))
+        per_type = ", ".join(f"{k}={v:.1f}" for k, v in sorted(result["per_type_p99_ms"].items()))
+        print(f"{result['mode']:<12}{result['msgs_per_sec']:>12.1f}{result['p50_ms']:>15.1f}{result['p99_ms']:>15.1f}  {per_type}")
+
+
+if __name__ == "__main__":
+    main()
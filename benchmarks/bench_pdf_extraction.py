@@ -0,0 +1,122 @@
+"""Measures PDF extraction throughput per backend and parallel page-range scaling.
+
+Runs over --files, or a synthetic text PDF of --pages pages. Two tables:
+
+    backends    pages/s of each extraction backend (processors.pdf_backends) in one
+                process; backends whose library is not installed are listed as such
+    workers     pages/s and chunks/s of the ProcessingPool with the --backend backend,
+                splitting the PDF into page ranges of at least --pages-per-job pages
+                across 1, 2, 4... worker processes (--workers), time to first batch
+                included
+
+Usage:
+    python -m benchmarks.bench_pdf_extraction --pages 400
+    python -m benchmarks.bench_pdf_extraction --files manual.pdf --backend pymupdf --workers 1 4 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from config.settings import settings
+from processors.pdf_backends import PDF_BACKENDS, get_pdf_backend
+
+WORDS = ("revenue quarterly forecast customer invoice shipment warehouse margin contract "
+         "renewal onboarding latency throughput replication incident postmortem budget").split()
+
+
+def write_text_pdf(path: str, pages):
+    """Writes a minimal PDF with one page of Helvetica text lines per string in `pages`."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", "", "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines = " ".join("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '"
+                         for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 12 TL 72 780 Td {lines} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += (f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+            + "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+            + f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n").encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def synthetic_pages(count: int, rng):
+    return ["\n".join(" ".join(rng.choice(WORDS, 12)) for _ in range(60)) for _ in range(count)]
+
+
+def bench_backends(paths):
+    print(f"{'backend':>12}{'pages/s':>12}")
+    for name in PDF_BACKENDS:
+        backend = get_pdf_backend(name)
+        try:
+            started = time.perf_counter()
+            pages = sum(1 for path in paths for _ in backend.extract_pages(path))
+        except ImportError:
+            print(f"{name:>12}{'not installed':>16}")
+            continue
+        print(f"{name:>12}{pages / (time.perf_counter() - started):>12.1f}")
+
+
+def bench_workers(paths, workers, pages_per_job: int):
+    from processors.pool import ProcessingPool
+
+    async def run(pool):
+        chunks, first = 0, None
+        started = time.perf_counter()
+        for path in paths:
+            async for batch in pool.stream(path):
+                first = first or time.perf_counter() - started
+                chunks += len(batch)
+        return chunks, first, time.perf_counter() - started
+
+    pages = sum(get_pdf_backend().page_count(path) for path in paths)
+    print(f"{'workers':>12}{'pages/s':>12}{'chunks/s':>12}{'first s':>10}")
+    for count in workers:
+        pool = ProcessingPool(max_workers=count, pages_per_job=pages_per_job)
+        try:
+            asyncio.run(run(pool))  # Warm up: start the workers.
+            chunks, first, seconds = asyncio.run(run(pool))
+        finally:
+            pool.shutdown()
+        print(f"{count:>12}{pages / seconds:>12.1f}{chunks / seconds:>12.0f}{first:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--backend", default=settings.PDF_BACKEND, choices=sorted(PDF_BACKENDS))
+    parser.add_argument("--pages-per-job", type=int, default=settings.PDF_PAGES_PER_JOB)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    # Worker processes create their processors with the configured backend.
+    settings.PDF_BACKEND = args.backend
+
+    with tempfile.TemporaryDirectory() as scratch:
+        paths = args.files
+        if not paths:
+            paths = [os.path.join(scratch, "synthetic.pdf")]
+            write_text_pdf(paths[0], synthetic_pages(args.pages, np.random.default_rng(0)))
+        bench_backends(paths)
+        print()
+        bench_workers(paths, args.workers, args.pages_per_job)
+
+
+if __name__ == "__main__":
+    main()
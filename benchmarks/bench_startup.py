@@ -0,0 +1,126 @@
+"""Measures how long a fresh process takes to open the vector store and answer a query.
+
+For each --sizes corpus size, a store of random vectors is built once, compacted
+into --segments segments of --index-type. Each mode then opens it in --runs fresh
+worker processes at once, as the workers of a multi-process server would; they
+share the store's lock as readers:
+
+    mmap    segment indexes memory-mapped from their files (FAISS_MMAP_INDEXES)
+    read    segment indexes read into process memory
+
+Reported per mode, as the median over the workers: time to open the store,
+latency of the first query, and the process's anonymous (private) memory
+afterwards in MB. Memory-mapped pages are
+file-backed and shared through the page cache, so they are not counted. The page
+cache is warm after the build; drop it (echo 3 > /proc/sys/vm/drop_caches, as root)
+between runs to see cold-disk numbers.
+
+Usage:
+    python -m benchmarks.bench_startup --sizes 10000 100000 500000
+    python -m benchmarks.bench_startup --sizes 200000 --index-type hnsw
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from config.settings import settings
+
+
+class PrecomputedEmbeddings:
+    """Placeholder embedding model; the benchmark only adds and searches vectors."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+
+def build_store(directory: str, corpus: int, dimension: int, segments: int, index_type: str):
+    from vector_store.faiss_store import FAISSVectorStore
+
+    settings.FAISS_INDEX_TYPE = index_type
+    settings.FAISS_UPGRADE_INDEX_TYPE = ""
+    store = FAISSVectorStore(embedding_model=PrecomputedEmbeddings(dimension), base_dir=directory)
+    store.max_segments = segments
+    rng = np.random.default_rng(0)
+    step = -(-corpus // segments)
+    for offset in range(0, corpus, step):
+        count = min(step, corpus - offset)
+        vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+        store.add_embeddings(vectors, [f"chunk {offset + i}" for i in range(count)])
+        store.wait_for_compaction()
+    # A writer holds the store's lock exclusively; the workers only read.
+    store.close()
+
+
+def anonymous_mb() -> float:
+    """Returns the process's anonymous memory, or its peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Anonymous:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_and_query(directory: str, dimension: int, index_type: str, mmap: bool, results):
+    """Runs in a fresh process: opens the store and answers one query."""
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.FAISS_INDEX_TYPE = index_type
+    # No background upgrade, which would make a worker a writer.
+    settings.FAISS_UPGRADE_INDEX_TYPE = ""
+    settings.FAISS_MMAP_INDEXES = mmap
+    from vector_store.faiss_store import FAISSVectorStore
+
+    query = np.random.default_rng(1).standard_normal(dimension).astype(np.float32)
+    baseline = anonymous_mb()
+    started = time.perf_counter()
+    store = FAISSVectorStore(embedding_model=PrecomputedEmbeddings(dimension), base_dir=directory)
+    opened = time.perf_counter()
+    store.search_chunks(query, k=5)
+    answered = time.perf_counter()
+    results.put((opened - started, answered - opened, anonymous_mb() - baseline))
+
+
+def measure(directory: str, dimension: int, index_type: str, mmap: bool, runs: int):
+    """Opens the store in `runs` worker processes at once and returns each one's measurements."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=open_and_query, args=(directory, dimension, index_type, mmap, results))
+               for _ in range(runs)]
+    for worker in workers:
+        worker.start()
+    measured = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'chunks':>10}{'mode':>6}{'open ms':>10}{'first query ms':>16}{'private MB':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            build_store(directory, size, args.dimension, args.segments, args.index_type)
+            for mode in ("mmap", "read"):
+                runs = measure(directory, args.dimension, args.index_type, mode == "mmap", args.runs)
+                opened, first, private = np.median(np.array(runs), axis=0)
+                print(f"{size:>10}{mode:>6}{opened * 1000:>10.1f}{first * 1000:>16.2f}{private:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
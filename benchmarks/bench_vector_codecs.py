@@ -0,0 +1,123 @@
+"""Compares the compressed vector storage modes selectable with FAISS_VECTOR_CODEC.
+
+A store of --corpus clustered vectors is built as one segment of --index-type
+with float32 vectors (the current layout, codec "none"). Its segment is then
+rebuilt with each codec, as IndexMaintenance does after FAISS_VECTOR_CODEC
+changes:
+
+    fp16    half-precision floats
+    sq8     8-bit scalar quantization
+    binary  RaBitQ codes, about one bit per dimension
+    pca     float32 vectors reduced to FAISS_PCA_DIMENSION dimensions
+
+and queried through FAISSVectorStore.search_chunks at each --rescore factor
+(FAISS_RESCORE_FACTOR; 0 ranks by the codes alone). Reported per codec and
+factor: the segment index size per million chunks in MB (what searching keeps
+hot), single-query QPS and recall@k against the exact float32 Flat results.
+Rescoring reads k * factor rows of the memory-mapped float32 vectors, which
+every layout keeps on disk; their size per million chunks is printed once.
+
+Usage:
+    python -m benchmarks.bench_vector_codecs --corpus 200000 --rescore 0 2 4 10
+    python -m benchmarks.bench_vector_codecs --corpus 500000 --index-type hnsw --codecs none sq8 pca
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from benchmarks.bench_ann_indexes import make_corpus
+from config.settings import settings
+from vector_store.faiss_store import FAISSVectorStore
+from vector_store.query_cache import TTLCache
+
+
+class PrecomputedEmbeddings:
+    """Placeholder embedding model; the benchmark only calls add_embeddings."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+
+def build_store(directory: str, vectors: np.ndarray) -> FAISSVectorStore:
+    store = FAISSVectorStore(embedding_model=PrecomputedEmbeddings(vectors.shape[1]), base_dir=directory)
+    # One segment, so the configured index type and codec are used regardless of its size.
+    store.max_segments = 1
+    # Every codec runs the same queries; none may be answered from the result cache.
+    store.result_cache = TTLCache(0)
+    store.vector_codec = "none"
+    step = 50_000
+    for offset in range(0, len(vectors), step):
+        batch = vectors[offset:offset + step]
+        store.add_embeddings(batch, [f"chunk {offset + i}" for i in range(len(batch))])
+        store.wait_for_compaction()
+    store.compact()
+    return store
+
+
+def rebuild(store: FAISSVectorStore, codec: str) -> int:
+    """Rebuilds the store's segment with `codec` and returns the size of its index file."""
+    store.vector_codec = codec
+    for segment in store.maintenance.stale_segments():
+        store.rebuild_segment_index(segment)
+    [segment] = store.snapshot.segments
+    assert segment.codec == codec, f"{codec} is not available for {store.index_type} segments"
+    return os.path.getsize(os.path.join(store.segments_dir, segment.name + ".faiss"))
+
+
+def time_queries(store: FAISSVectorStore, queries: np.ndarray, k: int, rescore: int):
+    store.rescore_factor = rescore
+    started = time.perf_counter()
+    results = [[hit["id"] for hit in store.search_chunks(query, k=k)] for query in queries]
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf_flat", "hnsw"])
+    parser.add_argument("--codecs", nargs="+", default=["none", "fp16", "sq8", "binary", "pca"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 4, 10])
+    parser.add_argument("--pca-dimension", type=int, default=settings.FAISS_PCA_DIMENSION)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    settings.FAISS_INDEX_TYPE = args.index_type
+    settings.FAISS_ANN_MIN_VECTORS = 0
+    settings.FAISS_CODEC_MIN_VECTORS = 0
+    # Keep the store at --index-type; only the codec changes between measurements.
+    settings.FAISS_UPGRADE_INDEX_TYPE = ""
+    settings.FAISS_PCA_DIMENSION = args.pca_dimension
+    rng = np.random.default_rng(0)
+
+    vectors = make_corpus(rng, args.corpus, args.dimension)
+    queries = vectors[rng.choice(args.corpus, args.queries, replace=False)] \
+        + 0.1 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    _, expected = exact.search(queries, args.k)
+    del exact
+    per_million = 1_000_000 / args.corpus / 2 ** 20
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(directory, vectors)
+        del vectors
+        print(f"float32 vectors on disk (read for rescoring): {args.corpus * args.dimension * 4 * per_million:.0f} MB "
+              f"per 1M chunks")
+        print(f"{'codec':<8}{'rescore':>8}{'MB/1M':>10}{'QPS':>10}{'recall@' + str(args.k):>11}")
+        for codec in args.codecs:
+            size = rebuild(store, codec)
+            for rescore in args.rescore if codec != "none" else [0]:
+                found, qps = time_queries(store, queries, args.k, rescore)
+                recall = np.mean([len(set(e) & set(f)) / args.k for e, f in zip(expected, found)])
+                print(f"{codec:<8}{rescore:>8}{size * per_million:>10.0f}{qps:>10.0f}{recall:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
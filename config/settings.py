@@ -14,20 +14,93 @@ class Settings:
     # Document Processing
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNKER: str = "characters" # or "tokens" (sentence packing within the embedding model's token limit)
+    CHUNKER_BY_PROCESSOR: dict = {} # Per processor overrides of CHUNKER, e.g. {"PDFProcessor": "tokens"}
+    CHUNK_MAX_TOKENS: int = 0 # Token budget of the "tokens" chunker; 0 = EMBEDDING_MAX_TOKENS minus special tokens
+    CHUNK_OVERLAP_TOKENS: int = 32 # Tokens of trailing sentences repeated at the start of the next chunk
+
+    # Ingestion
+    INGESTION_MAX_WORKERS: int = 2 # Processes parsing documents in parallel
+    INGESTION_JOB_TIMEOUT: float = 600.0 # Seconds before a parsing job is cancelled
+    INGESTION_STREAM_BATCH_SIZE: int = 256 # Chunks per batch streamed back from a parsing job
+    INGESTION_MAX_PENDING_BATCHES: int = 4 # Batches a parsing job may run ahead of embedding before it waits
+    INGESTION_READ_BLOCK_SIZE: int = 1024 * 1024 # Characters read at a time from text files
+    INGESTION_CSV_ROWS_PER_BLOCK: int = 10000 # CSV rows parsed at a time
+    BULK_INGEST_INDEX_BATCH_SIZE: int = 8192 # Chunks embedded and appended as one segment by bulk ingestion
+    BULK_INGEST_MAX_PENDING_BATCHES: int = 64 # Parsed batches waiting for the bulk indexer before parsers pause
+    INGESTION_CSV_MODE: str = "rows" # Chunks of whole "column: value" row records, or "table" (padded text)
+    INGESTION_RESUME_ON_STARTUP: bool = True # The IngestionAgent resumes jobs a crashed process left unfinished
+    INGESTION_JOB_STALE_SECONDS: float = 600.0 # A running job of an unreachable process is presumed dead after this
+    PDF_BACKEND: str = "pypdf2" # or "pymupdf", "pypdfium2" (faster, optional installs); see processors.pdf_backends
+    PDF_PAGES_PER_JOB: int = 32 # Smallest page range extracted as its own job; longer PDFs are split across workers, 0 disables
 
     # Embeddings
     EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384 # Dimension for all-MiniLM-L6-v2
+    EMBEDDING_MAX_TOKENS: int = 256 # Word pieces all-MiniLM-L6-v2 embeds; the rest of an input is truncated
+    EMBEDDING_BATCH_MAX_SIZE: int = 64 # Max queries coalesced into one encode call
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0 # How long a query waits for others to join its batch
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096 # Query texts whose embeddings are kept in memory
+    QUERY_EMBEDDING_CACHE_TTL: float = 3600.0 # Seconds a cached query embedding stays valid
+    EMBEDDING_CACHE_ENABLED: bool = True # Reuse chunk embeddings across ingestions
+    EMBEDDING_CACHE_DIR: str = os.path.join(DATA_DIR, "embedding_cache")
+    EMBEDDING_CACHE_MAX_BYTES: int = 512 * 1024 * 1024 # Vector file size; LRU eviction beyond it
 
     # FAISS
     FAISS_INDEX_NAME: str = "faiss_index"
+    FAISS_MAX_SEGMENTS: int = 16 # Segments allowed before background compaction merges some
+    FAISS_MERGE_FACTOR: int = 4 # Adjacent segments merged per compaction step
+    FAISS_TOMBSTONE_RATIO: float = 0.2 # Deleted-chunk fraction that triggers compaction
+    FAISS_FILTER_BRUTE_FORCE_RATIO: float = 0.02 # Document filters selecting less than this fraction are scanned exactly
+    FAISS_FILTER_BATCH_MAX_IDS: int = 4096 # Larger multi-range document filters use a bitmap selector
+    RETRIEVAL_CACHE_SIZE: int = 1024 # Search results kept per store; keyed by the store version
+    RETRIEVAL_CACHE_TTL: float = 300.0 # Seconds cached search results stay valid
+    FAISS_INDEX_TYPE: str = "flat" # "flat", "ivf_flat", "ivf_pq" or "hnsw"
+    FAISS_ANN_MIN_VECTORS: int = 10000 # Segments smaller than this use exact Flat search
+    FAISS_IVF_NLIST: int = 0 # IVF lists; 0 derives ~4*sqrt(segment size)
+    FAISS_IVF_NPROBE: int = 16 # IVF lists scanned per query
+    FAISS_PQ_M: int = 48 # PQ sub-quantizers; lowered to a divisor of the dimension if needed
+    FAISS_PQ_NBITS: int = 8 # Bits per PQ code
+    FAISS_HNSW_M: int = 32 # HNSW graph neighbours per node
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 64 # HNSW candidate list size per query
+    FAISS_UPGRADE_INDEX_TYPE: str = "hnsw" # Index type a Flat store is upgraded to in the background; "" never upgrades
+    FAISS_UPGRADE_MIN_VECTORS: int = 200000 # Live chunks past which a Flat store is upgraded
+    FAISS_UPGRADE_LATENCY_MS: float = 50.0 # p95 search latency past which a Flat store is upgraded; 0 ignores latency
+    FAISS_UPGRADE_CHECK_SECONDS: float = 30.0 # How often searches and writes check whether maintenance is due
+    FAISS_VECTOR_CODEC: str = "none" # How segment indexes store vectors: "none" (float32), "fp16", "sq8", "binary" (RaBitQ codes) or "pca"
+    FAISS_PCA_DIMENSION: int = 128 # Dimensions kept by the "pca" codec
+    FAISS_CODEC_MIN_VECTORS: int = 1000 # Segments smaller than this keep float32 vectors
+    FAISS_RESCORE_FACTOR: int = 4 # Candidates per result taken from compressed segments and rescored exactly from the float vectors; 0 disables rescoring
+    FAISS_MMAP_INDEXES: bool = True # Save every segment index and open it memory-mapped; False reads them into memory
+
+    # Chunk store
+    CHUNK_STORE_COMPRESSION: str = "zlib" # or "none"
+    CHUNK_STORE_BLOCK_SIZE: int = 64 * 1024 # Bytes of chunk records per compressed block
+    CHUNK_STORE_CACHE_BLOCKS: int = 256 # Decoded blocks kept in the LRU cache
+    VECTOR_STORE_DEFAULT_NAMESPACE: str = "default"
+    VECTOR_STORE_RESIDENT_BYTES: int = 2 * 1024 * 1024 * 1024 # Idle namespaces are evicted, least recently used first, beyond this
+    VECTOR_STORE_SESSION_NAMESPACES: bool = False # Give each chat session its own namespace instead of the shared default
 
     # LLM
     LLM_MODEL_NAME = "models/gemini-1.5-flash-latest" # Fastest Gemini model, may have separate quota
     LLM_TEMPERATURE: float = 0.7
+    LLM_STREAMING: bool = True # Stream token deltas as LLM_STREAM_DELTA messages before the final LLM_RESPONSE
+    ANSWER_CACHE_ENABLED: bool = True # Serve near-duplicate questions over the same context from a semantic answer cache
+    ANSWER_CACHE_SIZE: int = 1024 # Maximum cached answers; the least recently used is evicted beyond it
+    ANSWER_CACHE_SIMILARITY: float = 0.95 # Minimum cosine similarity between query embeddings for a cache hit
+    ANSWER_CACHE_TTL: float = 86400.0 # Seconds a cached answer stays valid
 
     # MCP
     MCP_MESSAGE_BUS_TYPE: str = "in_memory" # or "redis", "kafka" etc.
+    MCP_DISPATCH_MODE: str = "concurrent" # or "sequential" (one message at a time)
+    MCP_DEFAULT_CONCURRENCY: int = 8 # Worker pool size for message types without an explicit limit
+    MCP_CONCURRENCY_LIMITS: dict = {
+        "LLM_REQUEST": 32,
+        "LLM_STREAM_DELTA": 32,
+        "INGESTION_REQUEST": 4,
+        "RETRIEVAL_REQUEST": 16,
+    }
 
     # UI
     UI_TITLE: str = "Agentic RAG Chatbot"
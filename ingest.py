@@ -0,0 +1,63 @@
+"""Bulk-ingests documents into the vector store without the Streamlit UI.
+
+Walks the given directories (recursively) and files, plus the entries of an
+optional manifest (one path per line), parses them across a pool of worker
+processes, embeds their chunks in large batches and appends them to the store.
+Prints a JSON report with files/sec, chunks/sec and per-stage timings.
+
+Usage:
+    python ingest.py data/uploads
+    python ingest.py --manifest files.txt --workers 8 --namespace support
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from config.settings import settings
+from processors.bulk import BulkIngestor, discover_files
+from processors.pool import PROCESSOR_CLASSES, ProcessingPool
+from vector_store.faiss_store import StoreLockedError
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="Files or directories to ingest")
+    parser.add_argument("--manifest", help="A file listing one path per line")
+    parser.add_argument("--namespace", default=settings.VECTOR_STORE_DEFAULT_NAMESPACE)
+    parser.add_argument("--workers", type=int, default=settings.INGESTION_MAX_WORKERS,
+                        help="Worker processes parsing documents")
+    parser.add_argument("--index-batch-size", type=int, default=settings.BULK_INGEST_INDEX_BATCH_SIZE,
+                        help="Chunks embedded and indexed per batch")
+    parser.add_argument("--no-compact", action="store_true", help="Skip compacting the store at the end")
+    args = parser.parse_args()
+    if not args.paths and not args.manifest:
+        parser.error("give at least one path or --manifest")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    files = discover_files(args.paths, args.manifest, extensions=PROCESSOR_CLASSES)
+    processing_pool = ProcessingPool(max_workers=args.workers)
+    try:
+        ingestor = BulkIngestor(processing_pool=processing_pool, namespace=args.namespace,
+                                index_batch_size=args.index_batch_size)
+    except StoreLockedError as e:
+        # The running app is writing the store; seed it before starting the app, or stop it first.
+        processing_pool.shutdown()
+        parser.exit(1, f"{e}\n")
+    if not ingestor.vector_store.can_write():
+        # The running app has the store open, and may write it at any time.
+        ingestor.close()
+        processing_pool.shutdown()
+        parser.exit(1, f"Vector store namespace '{args.namespace}' is open in another process; stop it first.\n")
+    try:
+        report = await ingestor.ingest(files, compact=not args.no_compact)
+    finally:
+        ingestor.processing_pool.shutdown()
+        ingestor.close()
+    print(json.dumps(report.as_dict(), indent=2))
+    for path, error in report.failed.items():
+        print(f"failed: {path}: {error}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,28 +1,246 @@
 import asyncio
-from collections import defaultdict
-from typing import Callable, Dict, Any, List
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+from config.settings import settings
 from mcp.message_types import MCPMessage, MessageType
 from mcp.protocol import ModelContextProtocol
 from utils.logging_config import logger
 
-class InMemoryMessageBus(ModelContextProtocol):
-    """An in-memory implementation of the Model Context Protocol message bus."""
+BROADCAST = "*"
+
+# Messages a handler emits while it is still running. They are ordered among
+# themselves per trace instead of behind the trace's in-flight message; the trace's
+# next message waits until they have all been handled.
+STREAM_MESSAGE_TYPES = frozenset({MessageType.LLM_STREAM_DELTA})
+
+class _ReplicaGroup:
+    """The handlers registered by every instance of one agent id for one message type.
+
+    Each message is delivered to exactly one replica: the one with the fewest
+    messages in flight, with ties broken round-robin.
+    """
 
     def __init__(self):
-        self._handlers: Dict[MessageType, List[Callable[[MCPMessage], Any]]] = defaultdict(list)
+        self.handlers: List[Callable[[MCPMessage], Any]] = []
+        self.in_flight: List[int] = []
+        self._cursor = 0
+
+    def add(self, handler: Callable[[MCPMessage], Any]):
+        self.handlers.append(handler)
+        self.in_flight.append(0)
+
+    def acquire(self) -> int:
+        """Picks a replica for the next message and marks it busy."""
+        count = len(self.handlers)
+        best = None
+        for offset in range(count):
+            slot = (self._cursor + offset) % count
+            if best is None or self.in_flight[slot] < self.in_flight[best]:
+                best = slot
+        self._cursor = (best + 1) % count
+        self.in_flight[best] += 1
+        return best
+
+    def release(self, slot: int):
+        self.in_flight[slot] -= 1
+
+class InMemoryMessageBus(ModelContextProtocol):
+    """An in-memory implementation of the Model Context Protocol message bus.
+
+    Two dispatch modes are supported:
+
+    - ``"sequential"``: a single consumer handles one message at a time.
+    - ``"concurrent"``: every message type gets its own pool of workers whose
+      size is taken from ``concurrency_limits`` (falling back to
+      ``default_concurrency``). Messages sharing a ``trace_id`` are still
+      handled strictly in the order they were sent. Stream messages
+      (``STREAM_MESSAGE_TYPES``) form a separate ordered lane per trace, so
+      deltas emitted by a running handler are delivered while it runs; the
+      trace's next message (e.g. the final response) is held until they are
+      all handled.
+
+    Routing honours ``MCPMessage.receiver``: handlers are indexed by
+    ``(agent_id, message_type)``, so a message addressed to an agent is handled
+    by exactly one of that agent's instances. Only receiver ``"*"`` is broadcast,
+    reaching one instance of every agent subscribed to the type. Handlers
+    registered without an agent id are observers and see every message of the type.
+    """
+
+    def __init__(self, dispatch_mode: Optional[str] = None,
+                 concurrency_limits: Optional[Dict[Any, int]] = None,
+                 default_concurrency: Optional[int] = None):
+        self._routes: Dict[Tuple[str, MessageType], _ReplicaGroup] = {}
+        self._subscribers: Dict[MessageType, List[str]] = defaultdict(list)
+        self._observers: Dict[MessageType, List[Callable[[MCPMessage], Any]]] = defaultdict(list)
         self._queue: asyncio.Queue[MCPMessage] = asyncio.Queue()
         self._running = False
         self._consumer_task = None
 
+        self.dispatch_mode = dispatch_mode or settings.MCP_DISPATCH_MODE
+        if self.dispatch_mode not in ("sequential", "concurrent"):
+            raise ValueError(f"Unknown dispatch mode: {self.dispatch_mode}")
+        limits = settings.MCP_CONCURRENCY_LIMITS if concurrency_limits is None else concurrency_limits
+        self._concurrency_limits: Dict[MessageType, int] = {MessageType(k): int(v) for k, v in limits.items()}
+        self._default_concurrency = default_concurrency or settings.MCP_DEFAULT_CONCURRENCY
+
+        # Concurrent mode state: one queue + worker pool per message type, and a
+        # backlog of held-back messages for every trace that has one in flight.
+        self._type_queues: Dict[MessageType, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._trace_backlog: Dict[str, Deque[MCPMessage]] = {}
+        # A trace's next message, held until the trace's stream lanes drain.
+        self._held_for_streams: Dict[str, MCPMessage] = {}
+
+        self._unfinished = 0
+        self._all_done: Optional[asyncio.Event] = None
+
     async def send_message(self, message: MCPMessage):
         """Sends a message by putting it into the queue."""
+        self._unfinished += 1
+        if self._all_done is not None:
+            self._all_done.clear()
         await self._queue.put(message)
         logger.info(f"Message sent: {message.type} from {message.sender} to {message.receiver}")
 
-    async def register_handler(self, message_type: MessageType, handler: Callable[[MCPMessage], Any]):
-        """Registers a handler for a specific message type."""
-        self._handlers[message_type].append(handler)
-        logger.info(f"Handler registered for message type: {message_type}")
+    async def register_handler(self, message_type: MessageType, handler: Callable[[MCPMessage], Any],
+                               agent_id: Optional[str] = None):
+        """Registers a handler for a message type, optionally on behalf of an agent id.
+
+        Registering several handlers under the same agent id and type (e.g. one per
+        replica of an agent) load-balances messages across them.
+        """
+        if agent_id is None or agent_id == BROADCAST:
+            self._observers[message_type].append(handler)
+            logger.info(f"Observer registered for message type: {message_type}")
+            return
+        group = self._routes.get((agent_id, message_type))
+        if group is None:
+            group = self._routes[(agent_id, message_type)] = _ReplicaGroup()
+            self._subscribers[message_type].append(agent_id)
+        group.add(handler)
+        logger.info(f"Handler registered for message type: {message_type} on agent {agent_id} "
+                    f"({len(group.handlers)} replica(s))")
+
+    def concurrency_limit(self, message_type: MessageType) -> int:
+        """Returns the worker pool size used for a message type in concurrent mode."""
+        return self._concurrency_limits.get(message_type, self._default_concurrency)
+
+    async def join(self):
+        """Waits until every message sent so far (and any it triggered) has been handled."""
+        if self._all_done is None:
+            self._all_done = asyncio.Event()
+        if self._unfinished == 0:
+            return
+        self._all_done.clear()
+        await self._all_done.wait()
+
+    def _mark_done(self):
+        self._unfinished -= 1
+        if self._unfinished == 0 and self._all_done is not None:
+            self._all_done.set()
+
+    def _resolve(self, message: MCPMessage) -> List[Tuple[Callable[[MCPMessage], Any], Optional[_ReplicaGroup], int]]:
+        """Looks up the handlers a message should be delivered to.
+
+        Returns (handler, replica group, slot) triples; observers have no group.
+        """
+        if message.receiver == BROADCAST:
+            groups = [self._routes[(agent_id, message.type)] for agent_id in self._subscribers.get(message.type, ())]
+        else:
+            group = self._routes.get((message.receiver, message.type))
+            groups = [group] if group is not None else []
+        targets = []
+        for group in groups:
+            slot = group.acquire()
+            targets.append((group.handlers[slot], group, slot))
+        targets.extend((handler, None, -1) for handler in self._observers.get(message.type, ()))
+        return targets
+
+    async def _dispatch(self, message: MCPMessage):
+        """Runs the handlers the message is routed to."""
+        targets = self._resolve(message)
+        if not targets:
+            logger.warning(f"No handler registered for message type: {message.type} (receiver: {message.receiver})")
+            return
+        for handler, group, slot in targets:
+            try:
+                # Handlers can be async or sync
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(message)
+                else:
+                    handler(message)
+                logger.debug(f"Message {message.type} handled by {handler.__name__}")
+            except Exception as e:
+                logger.error(f"Error handling message {message.type} with handler {handler.__name__}: {e}")
+            finally:
+                if group is not None:
+                    group.release(slot)
+
+    def _type_queue(self, message_type: MessageType) -> asyncio.Queue:
+        """Returns the queue for a message type, starting its worker pool on first use."""
+        queue = self._type_queues.get(message_type)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._type_queues[message_type] = queue
+            limit = self.concurrency_limit(message_type)
+            for _ in range(limit):
+                self._workers.append(asyncio.create_task(self._worker(queue)))
+            logger.info(f"Started {limit} workers for message type: {message_type}")
+        return queue
+
+    @staticmethod
+    def _order_key(message: MCPMessage) -> str:
+        """The ordering lane of a message: its trace, or its trace's stream."""
+        if message.trace_id and message.type in STREAM_MESSAGE_TYPES:
+            return f"{message.trace_id}#{message.type.value}"
+        return message.trace_id
+
+    def _schedule(self, message: MCPMessage):
+        """Hands a message to its type's worker pool, or parks it behind its trace."""
+        key = self._order_key(message)
+        if key:
+            if key in self._trace_backlog:
+                self._trace_backlog[key].append(message)
+                return
+            self._trace_backlog[key] = deque()
+        self._enqueue(message)
+
+    def _streaming(self, trace_id: str) -> bool:
+        """Whether any stream lane of a trace still has messages queued or in flight."""
+        return any(f"{trace_id}#{message_type.value}" in self._trace_backlog for message_type in STREAM_MESSAGE_TYPES)
+
+    def _enqueue(self, message: MCPMessage):
+        """Puts a message whose turn has come on its type's queue, unless its trace is still streaming."""
+        if message.trace_id and message.type not in STREAM_MESSAGE_TYPES and self._streaming(message.trace_id):
+            self._held_for_streams[message.trace_id] = message
+            return
+        self._type_queue(message.type).put_nowait(message)
+
+    def _release_trace(self, message: MCPMessage):
+        """Releases the next held-back message of a lane once its predecessor is handled."""
+        key = self._order_key(message)
+        if not key:
+            return
+        backlog = self._trace_backlog.get(key)
+        if backlog:
+            self._enqueue(backlog.popleft())
+            return
+        self._trace_backlog.pop(key, None)
+        if message.type in STREAM_MESSAGE_TYPES and not self._streaming(message.trace_id):
+            held = self._held_for_streams.pop(message.trace_id, None)
+            if held is not None:
+                self._type_queue(held.type).put_nowait(held)
+
+    async def _worker(self, queue: asyncio.Queue):
+        """Handles messages of a single type until cancelled."""
+        while True:
+            message = await queue.get()
+            try:
+                await self._dispatch(message)
+            finally:
+                queue.task_done()
+                self._release_trace(message)
+                self._mark_done()
 
     async def _consume_messages(self):
         """Continuously consumes messages from the queue and dispatches them to handlers."""
@@ -30,19 +248,13 @@ class InMemoryMessageBus(ModelContextProtocol):
             try:
                 message = await self._queue.get()
                 logger.debug(f"Message received from queue: {message.type}")
-                if message.type in self._handlers:
-                    for handler in self._handlers[message.type]:
-                        try:
-                            # Handlers can be async or sync
-                            if asyncio.iscoroutinefunction(handler):
-                                await handler(message)
-                            else:
-                                handler(message)
-                            logger.debug(f"Message {message.type} handled by {handler.__name__}")
-                        except Exception as e:
-                            logger.error(f"Error handling message {message.type} with handler {handler.__name__}: {e}")
+                if self.dispatch_mode == "concurrent":
+                    self._schedule(message)
                 else:
-                    logger.warning(f"No handler registered for message type: {message.type}")
+                    try:
+                        await self._dispatch(message)
+                    finally:
+                        self._mark_done()
                 self._queue.task_done()
             except asyncio.CancelledError:
                 logger.info("Message consumer task cancelled.")
@@ -55,13 +267,20 @@ class InMemoryMessageBus(ModelContextProtocol):
         if not self._running:
             self._running = True
             self._consumer_task = asyncio.create_task(self._consume_messages())
-            logger.info("In-memory message bus started.")
+            logger.info(f"In-memory message bus started ({self.dispatch_mode} dispatch).")
 
     async def stop(self):
-        """Stops the message bus consumer."""
+        """Stops the message bus consumer and any worker pools."""
         if self._running:
             self._running = False
             if self._consumer_task:
                 self._consumer_task.cancel()
                 await self._consumer_task
-            logger.info("In-memory message bus stopped.")
\ No newline at end of file
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers.clear()
+            self._type_queues.clear()
+            self._trace_backlog.clear()
+            self._held_for_streams.clear()
+            logger.info("In-memory message bus stopped.")
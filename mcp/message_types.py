@@ -6,10 +6,13 @@ class MessageType(str, Enum):
     INGESTION_REQUEST = "INGESTION_REQUEST"
     INGESTION_RESPONSE = "INGESTION_RESPONSE"
     INGESTION_COMPLETE = "INGESTION_COMPLETE"
+    INGESTION_STATUS_REQUEST = "INGESTION_STATUS_REQUEST"
+    INGESTION_STATUS = "INGESTION_STATUS"
     RETRIEVAL_REQUEST = "RETRIEVAL_REQUEST"
     RETRIEVAL_RESULT = "RETRIEVAL_RESULT"
     LLM_REQUEST = "LLM_REQUEST"
     LLM_RESPONSE = "LLM_RESPONSE"
+    LLM_STREAM_DELTA = "LLM_STREAM_DELTA"
     ERROR = "ERROR"
 
 class MCPMessage(BaseModel):
@@ -24,12 +27,22 @@ class IngestionRequestPayload(BaseModel):
     file_path: str
     file_type: str
     document_id: str
+    namespace: Optional[str] = None # Vector store namespace; defaults to the shared default namespace
 
 class IngestionResponsePayload(BaseModel):
     request_id: str
     status: str
     message: str
 
+class IngestionStatusRequestPayload(BaseModel):
+    job_id: Optional[str] = None # Defaults to every job of the IngestionAgent's store
+    document_id: Optional[str] = None
+    namespace: Optional[str] = None
+
+class IngestionStatusPayload(BaseModel):
+    request_id: str
+    jobs: List[Dict[str, Any]] # IngestionJob records, with "chunks_per_second" and "interrupted"
+
 class IngestionCompletePayload(BaseModel):
     document_id: str
     status: str
@@ -40,6 +53,7 @@ class RetrievalRequestPayload(BaseModel):
     query: str
     top_k: int = 5
     document_ids: Optional[List[str]] = None
+    namespace: Optional[str] = None # Vector store namespace; defaults to the shared default namespace
 
 class RetrievalResultPayload(BaseModel):
     query: str
@@ -51,11 +65,24 @@ class LLMRequestPayload(BaseModel):
     query: str
     context: List[str]
     chat_history: Optional[List[Dict[str, str]]] = None
+    context_ids: Optional[List[int]] = None # Stable chunk ids of `context`, if known
+    stream: Optional[bool] = None # Overrides settings.LLM_STREAMING
+    namespace: Optional[str] = None # Vector store namespace `context_ids` belong to
+
+class LLMStreamDeltaPayload(BaseModel):
+    trace_id: str
+    index: int # Position of this delta in the response, starting at 0
+    delta: str
 
 class LLMResponsePayload(BaseModel):
     response: str
     source_documents: List[Dict[str, Any]]
     trace_id: str
+    cached: bool = False # True if served from the semantic answer cache
+    streamed: bool = False # True if the response was also sent as LLM_STREAM_DELTA messages
+    deltas: Optional[int] = None # Number of deltas sent, when streamed
+    time_to_first_token: Optional[float] = None # Seconds from request receipt to the first delta
+    generation_seconds: Optional[float] = None # Seconds from request receipt to the full response
 
 class ErrorPayload(BaseModel):
     code: str
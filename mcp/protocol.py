@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Dict, Any
+from typing import Callable, Dict, Any, Optional
 from mcp.message_types import MCPMessage, MessageType
 
 class ModelContextProtocol(ABC):
@@ -11,8 +11,14 @@ class ModelContextProtocol(ABC):
         pass
 
     @abstractmethod
-    async def register_handler(self, message_type: MessageType, handler: Callable[[MCPMessage], Any]):
-        """Registers a handler for a specific message type."""
+    async def register_handler(self, message_type: MessageType, handler: Callable[[MCPMessage], Any],
+                               agent_id: Optional[str] = None):
+        """Registers a handler for a specific message type.
+
+        Handlers registered with an ``agent_id`` receive messages addressed to that
+        agent (or broadcast with receiver ``"*"``); handlers without one observe
+        every message of the type.
+        """
         pass
 
     @abstractmethod
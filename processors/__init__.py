@@ -2,4 +2,5 @@ from .pdf_processor import PDFProcessor
 from .pptx_processor import PPTXProcessor
 from .docx_processor import DOCXProcessor
 from .csv_processor import CSVProcessor
-from .text_processor import TextProcessor
\ No newline at end of file
+from .text_processor import TextProcessor
+from .pool import ProcessingPool
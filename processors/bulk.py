@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from config.settings import settings
+from processors.pool import ProcessingPool
+from utils.helpers import get_file_extension
+from vector_store.embedding_cache import EmbeddingCacheStats
+from vector_store.registry import ResourceRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+def discover_files(paths: Iterable[str], manifest: Optional[str] = None,
+                   extensions: Optional[Iterable[str]] = None) -> Iterator[str]:
+    """
+    Yields the files to ingest: every file under each directory in `paths` (recursively),
+    each plain file in `paths`, and each line of the `manifest` file. Blank manifest
+    lines and lines starting with '#' are skipped; relative manifest entries are resolved
+    against the manifest's directory. Files with other extensions are skipped.
+
+    Paths are yielded as absolute paths, each once: a file listed twice (say, in the
+    manifest and under a directory) would otherwise be parsed twice at once and its
+    chunks indexed twice.
+    """
+    allowed = set(extensions) if extensions is not None else None
+    seen = set()
+
+    def accept(path: str) -> bool:
+        return allowed is None or get_file_extension(path) in allowed
+
+    def candidates() -> Iterator[str]:
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if accept(name):
+                            yield os.path.join(root, name)
+            elif accept(path):
+                yield path
+        if manifest:
+            base = os.path.dirname(os.path.abspath(manifest))
+            with open(manifest, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = line.strip()
+                    if entry and not entry.startswith("#") and accept(entry):
+                        yield entry if os.path.isabs(entry) else os.path.join(base, entry)
+
+    for path in candidates():
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+class BulkIngestReport:
+    """Counts and per-stage timings of one bulk ingestion run."""
+    def __init__(self):
+        self.files = 0
+        self.failed: Dict[str, str] = {}
+        self.chunks = 0
+        self.wall_seconds = 0.0
+        self.parse_seconds = 0.0 # Summed over files parsed in parallel, excluding waits for the indexer
+        self.embed_seconds = 0.0
+        self.index_seconds = 0.0
+        self.compact_seconds = 0.0
+        self.embedding_cache = EmbeddingCacheStats()
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = self.wall_seconds or 1e-9
+        return {
+            "files": self.files,
+            "failed_files": len(self.failed),
+            "chunks": self.chunks,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "files_per_second": round(self.files / wall, 2),
+            "chunks_per_second": round(self.chunks / wall, 2),
+            "stages": {
+                "parse_seconds": round(self.parse_seconds, 3),
+                "embed_seconds": round(self.embed_seconds, 3),
+                "index_seconds": round(self.index_seconds, 3),
+                "compact_seconds": round(self.compact_seconds, 3),
+            },
+            "embedding_cache": self.embedding_cache.as_dict(),
+        }
+
+class BulkIngestor:
+    """
+    Ingests many files into one vector store without going through the message bus.
+
+    Files are parsed by the ProcessingPool, several at a time, and their chunks are
+    pooled across files into batches of `index_batch_size`. Each batch is embedded in
+    one call and appended to the store as one large segment, so the index is built in
+    a few big steps rather than one small segment per file. Parsing, embedding and
+    indexing overlap: workers keep parsing while a batch is embedded. The store is
+    compacted once at the end. Re-ingesting a file replaces its previous chunks; a
+    file that fails part-way keeps the chunks it produced until it is ingested again.
+    """
+    def __init__(self, resources: ResourceRegistry = registry, processing_pool: Optional[ProcessingPool] = None,
+                 namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE, parallel_files: Optional[int] = None,
+                 index_batch_size: Optional[int] = None):
+        """
+        Initializes the BulkIngestor.
+
+        Args:
+            resources (ResourceRegistry): Provides the vector store.
+            processing_pool (ProcessingPool, optional): Parses the files. One with the
+                default settings is created (and shut down by `close`) if omitted.
+            namespace (str): The vector store namespace to ingest into.
+            parallel_files (int, optional): Files parsed at once. Defaults to twice the
+                pool's worker count, so workers never wait for the next file.
+            index_batch_size (int, optional): Overrides `settings.BULK_INGEST_INDEX_BATCH_SIZE`.
+        """
+        self.resources = resources
+        self._owns_pool = processing_pool is None
+        self.processing_pool = processing_pool or ProcessingPool()
+        self.namespace = namespace
+        self.parallel_files = parallel_files or 2 * self.processing_pool.max_workers
+        self.index_batch_size = index_batch_size or settings.BULK_INGEST_INDEX_BATCH_SIZE
+        self.vector_store = resources.acquire_vector_store(namespace)
+
+    def close(self):
+        """Releases the vector store and stops the processing pool if this ingestor created it."""
+        if self._owns_pool:
+            self.processing_pool.shutdown()
+        if self.vector_store is not None:
+            self.resources.release_vector_store(self.namespace)
+            self.vector_store = None
+
+    async def ingest(self, files: Iterable[str], compact: bool = True) -> BulkIngestReport:
+        """
+        Ingests `files`, using each file's path as its document id.
+
+        Args:
+            files (iterable of str): The files to ingest; consumed lazily.
+            compact (bool): Compact the store once all files are indexed.
+
+        Returns:
+            BulkIngestReport: File and chunk counts, failures and stage timings.
+        """
+        report = BulkIngestReport()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pending: asyncio.Queue = asyncio.Queue(settings.BULK_INGEST_MAX_PENDING_BATCHES)
+        paths = iter(files)
+
+        async def parse_files():
+            for path in paths:
+                if not self.processing_pool.supports(get_file_extension(path)):
+                    report.failed[path] = "unsupported file type"
+                    continue
+                file_started = time.perf_counter()
+                try:
+                    # Replace any earlier version of the document before its new chunks arrive.
+                    await loop.run_in_executor(None, self.vector_store.delete_document, path)
+                    async for batch in self.processing_pool.stream_records(path):
+                        wait_started = time.perf_counter()
+                        await pending.put((path, batch))
+                        file_started += time.perf_counter() - wait_started
+                    report.files += 1
+                except Exception as e:
+                    logger.error(f"Bulk ingestion of {path} failed: {e}")
+                    report.failed[path] = str(e)
+                report.parse_seconds += time.perf_counter() - file_started
+
+        async def index_batches():
+            texts: List[str] = []
+            metadatas: List[Dict[str, Any]] = []
+            done = False
+            while not done:
+                item = await pending.get()
+                if item is None:
+                    done = True
+                else:
+                    path, (chunks, chunk_metadatas) = item
+                    texts.extend(chunks)
+                    metadatas.extend({"document_id": path, "source": path, **metadata} for metadata in chunk_metadatas)
+                if texts and (done or len(texts) >= self.index_batch_size):
+                    await loop.run_in_executor(None, self._index, texts, metadatas, report)
+                    texts, metadatas = [], []
+
+        indexer = asyncio.create_task(index_batches())
+        parsers = asyncio.gather(*(parse_files() for _ in range(self.parallel_files)))
+        await asyncio.wait({indexer, parsers}, return_when=asyncio.FIRST_COMPLETED)
+        if indexer.done():
+            # Indexing failed; nothing would drain the queue the parsers are filling.
+            parsers.cancel()
+            await asyncio.gather(parsers, return_exceptions=True)
+            await indexer
+        await parsers
+        await pending.put(None)
+        await indexer
+        if compact:
+            compact_started = time.perf_counter()
+            await loop.run_in_executor(None, self._compact)
+            report.compact_seconds = time.perf_counter() - compact_started
+        report.wall_seconds = time.perf_counter() - started
+        logger.info(f"Bulk ingestion finished: {report.as_dict()}")
+        return report
+
+    def _index(self, texts: List[str], metadatas: List[Dict[str, Any]], report: BulkIngestReport):
+        """Embeds one pooled batch and appends it to the store as a single segment."""
+        embed_started = time.perf_counter()
+        embeddings = self.vector_store.embed_documents(texts, report.embedding_cache)
+        report.embed_seconds += time.perf_counter() - embed_started
+        if len(embeddings) != len(texts):
+            raise RuntimeError(f"Embedding {len(texts)} chunks returned {len(embeddings)} vectors.")
+        index_started = time.perf_counter()
+        self.vector_store.add_embeddings(embeddings, texts, metadatas)
+        report.index_seconds += time.perf_counter() - index_started
+        report.chunks += len(texts)
+
+    def _compact(self):
+        self.vector_store.wait_for_compaction()
+        self.vector_store.compact()
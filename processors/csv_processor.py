@@ -1,10 +1,13 @@
 import logging
+from itertools import islice
+from typing import Iterator, List
 import pandas as pd
 from config.settings import settings
-from utils.chunking import chunk_text
+from utils.chunking import TokenChunker, get_chunker
 
+ROWS_PER_BLOCK = settings.INGESTION_CSV_ROWS_PER_BLOCK
+CSV_MODE = settings.INGESTION_CSV_MODE
 CHUNK_SIZE = settings.CHUNK_SIZE
-CHUNK_OVERLAP = settings.CHUNK_OVERLAP
 
 logger = logging.getLogger(__name__)
 
@@ -12,10 +15,15 @@ class CSVProcessor:
     """
     A processor for extracting text from CSV documents and chunking it.
     """
-    def __init__(self):
+    def __init__(self, chunker=None):
         """
         Initializes the CSVProcessor.
+
+        Args:
+            chunker (optional): Overrides the chunker configured for this processor,
+                see utils.chunking.get_chunker.
         """
+        self.chunker = chunker or get_chunker("CSVProcessor")
         logger.info("CSVProcessor initialized.")
 
     def process(self, file_path: str) -> list[str]:
@@ -29,13 +37,85 @@ class CSVProcessor:
             list[str]: A list of text chunks extracted from the CSV.
         """
         try:
-            df = pd.read_csv(file_path)
-            # Convert all columns to string to ensure consistent text extraction
-            full_text = df.to_string(index=False)
-            
-            chunks = chunk_text(full_text, CHUNK_SIZE, CHUNK_OVERLAP)
+            chunks = list(self.iter_chunks(file_path))
             logger.info(f"Successfully processed CSV file: {file_path}. Extracted {len(chunks)} chunks.")
             return chunks
         except Exception as e:
             logger.error(f"Error processing CSV file {file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_chunks(self, file_path: str) -> Iterator[str]:
+        """
+        Yields the text chunks of a CSV file while its rows are read. In "rows" mode
+        (`INGESTION_CSV_MODE`) each chunk is a run of whole row records within the
+        configured chunker's budget; in "table" mode the padded table text is cut by
+        the configured chunker.
+        """
+        if CSV_MODE == "table":
+            return self.chunker.chunk_stream(self.extract(file_path))
+        return self._pack_records(self.iter_records(file_path))
+
+    def iter_records(self, file_path: str) -> Iterator[str]:
+        """
+        Yields one compact record per row, "column: value" pairs separated by " | ",
+        with empty cells left out. Repeating the column names in every record keeps
+        each chunk self-describing without a table header.
+        """
+        with pd.read_csv(file_path, chunksize=ROWS_PER_BLOCK, dtype=str, keep_default_na=False) as reader:
+            for block in reader:
+                columns = [str(column).strip() for column in block.columns]
+                for row in block.itertuples(index=False, name=None):
+                    record = " | ".join(f"{column}: {value.strip()}" for column, value in zip(columns, row) if value.strip())
+                    if record:
+                        yield record
+
+    def _pack_records(self, records: Iterator[str]) -> Iterator[str]:
+        """
+        Packs whole records into chunks within the configured chunker's budget: up to
+        `max_tokens` tokens with the token chunker, else up to `CHUNK_SIZE` characters.
+        A record over a token budget is split by the token chunker, so no part of it is
+        truncated when embedded; a record over `CHUNK_SIZE` characters becomes a chunk
+        of its own.
+        """
+        tokens = isinstance(self.chunker, TokenChunker)
+        if tokens:
+            budget, measure = self.chunker.max_tokens, self.chunker.count_tokens
+        else:
+            budget, measure = CHUNK_SIZE, self._record_lengths
+        records = iter(records)
+        batch, size = [], 0
+        # Records are measured a block at a time, one tokenizer call per block.
+        while True:
+            block = list(islice(records, ROWS_PER_BLOCK))
+            if not block:
+                break
+            for record, cost in zip(block, measure(block)):
+                if tokens and cost > budget:
+                    if batch:
+                        yield "\n".join(batch)
+                        batch, size = [], 0
+                    yield from self.chunker.chunk_stream([record])
+                    continue
+                if batch and size + cost > budget:
+                    yield "\n".join(batch)
+                    batch, size = [], 0
+                batch.append(record)
+                size += cost
+        if batch:
+            yield "\n".join(batch)
+
+    @staticmethod
+    def _record_lengths(records: List[str]) -> List[int]:
+        """Counts the characters of each record and its line break."""
+        return [len(record) + 1 for record in records]
+
+    def extract(self, file_path: str) -> Iterator[str]:
+        """
+        Yields the rows of a CSV file as padded table text, `INGESTION_CSV_ROWS_PER_BLOCK`
+        rows at a time. Only the first block carries the header line.
+        """
+        with pd.read_csv(file_path, chunksize=ROWS_PER_BLOCK) as reader:
+            for number, block in enumerate(reader):
+                # Convert all columns to string to ensure consistent text extraction
+                text = block.to_string(index=False, header=number == 0)
+                yield text if number == 0 else "\n" + text
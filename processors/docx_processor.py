@@ -1,10 +1,7 @@
 import logging
+from typing import Iterator
 from docx import Document
-from config.settings import settings
-from utils.chunking import chunk_text
-
-CHUNK_SIZE = settings.CHUNK_SIZE
-CHUNK_OVERLAP = settings.CHUNK_OVERLAP
+from utils.chunking import get_chunker, join_pieces
 
 logger = logging.getLogger(__name__)
 
@@ -12,10 +9,15 @@ class DOCXProcessor:
     """
     A processor for extracting text from DOCX documents and chunking it.
     """
-    def __init__(self):
+    def __init__(self, chunker=None):
         """
         Initializes the DOCXProcessor.
+
+        Args:
+            chunker (optional): Overrides the chunker configured for this processor,
+                see utils.chunking.get_chunker.
         """
+        self.chunker = chunker or get_chunker("DOCXProcessor")
         logger.info("DOCXProcessor initialized.")
 
     def process(self, file_path: str) -> list[str]:
@@ -29,15 +31,19 @@ class DOCXProcessor:
             list[str]: A list of text chunks extracted from the DOCX.
         """
         try:
-            document = Document(file_path)
-            full_text = []
-            for paragraph in document.paragraphs:
-                full_text.append(paragraph.text)
-            
-            combined_text = "\n".join(full_text)
-            chunks = chunk_text(combined_text, CHUNK_SIZE, CHUNK_OVERLAP)
+            chunks = list(self.iter_chunks(file_path))
             logger.info(f"Successfully processed DOCX file: {file_path}. Extracted {len(chunks)} chunks.")
             return chunks
         except Exception as e:
             logger.error(f"Error processing DOCX file {file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_chunks(self, file_path: str) -> Iterator[str]:
+        """Yields the text chunks of a DOCX file paragraph by paragraph."""
+        return self.chunker.chunk_stream(join_pieces(self.extract(file_path), "\n"))
+
+    def extract(self, file_path: str) -> Iterator[str]:
+        """Yields the text of each paragraph of a DOCX file."""
+        document = Document(file_path)
+        for paragraph in document.paragraphs:
+            yield paragraph.text
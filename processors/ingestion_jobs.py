@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR_NAME = "ingestion_jobs"
+
+# Identifies this process as the owner of the jobs it runs.
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+# Job files (by path) being run in this process, by any IngestionJobStore.
+_active: Set[str] = set()
+_active_lock = threading.Lock()
+
+def _fingerprint(file_path: str) -> Dict[str, int]:
+    """Identifies a version of a file by its size and modification time."""
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class IngestionJob:
+    """
+    The persistent progress record of ingesting one file into one document of a
+    vector store namespace.
+
+    `committed_batches` and `committed_chunks` count the chunk batches embedded and
+    durably added to the vector store, across every run of the job. A job interrupted
+    by a crash keeps the status "running" on disk; it can be resumed as long as the
+    file is unchanged.
+    """
+    def __init__(self, job_id: str, document_id: str, file_path: str, fingerprint: Dict[str, int],
+                 namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE):
+        self.job_id = job_id
+        self.document_id = document_id
+        self.namespace = namespace
+        self.file_path = file_path
+        self.fingerprint = fingerprint
+        self.status = "running" # "running", "completed" or "failed"
+        self.owner = _OWNER
+        self.committed_batches = 0
+        self.committed_chunks = 0
+        self.runs = 0
+        self.resumed_from_chunk = 0 # Chunks skipped at the start of the latest run
+        self.active_seconds = 0.0 # Time spent in runs, excluding the current one's unsaved part
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        record = dict(vars(self))
+        record["chunks_per_second"] = round(self.committed_chunks / self.active_seconds, 2) if self.active_seconds else 0.0
+        return record
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "IngestionJob":
+        job = cls(record["job_id"], record["document_id"], record["file_path"], record["fingerprint"],
+                  record.get("namespace", settings.VECTOR_STORE_DEFAULT_NAMESPACE))
+        for key, value in record.items():
+            if key in vars(job):
+                setattr(job, key, value)
+        return job
+
+class IngestionJobStore:
+    """
+    Keeps one JSON job file per document and namespace in a directory, normally next
+    to the default vector store. Every save replaces the file atomically, so a crash
+    leaves either the previous checkpoint or the new one.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def job_id(document_id: str, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE) -> str:
+        key = document_id if namespace == settings.VECTOR_STORE_DEFAULT_NAMESPACE else f"{namespace}\x1f{document_id}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id + ".json")
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return IngestionJob.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable ingestion job {job_id}: {e}")
+            return None
+
+    def list(self) -> List[IngestionJob]:
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = (self.get(name[:-len(".json")]) for name in sorted(os.listdir(self.directory)) if name.endswith(".json"))
+        return [job for job in jobs if job is not None]
+
+    def save(self, job: IngestionJob):
+        """Durably replaces the job's file."""
+        job.updated_at = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job.job_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(job.as_dict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def claim(self, document_id: str, file_path: str,
+              namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE) -> Optional[IngestionJob]:
+        """
+        Starts a run of the job for a document, marking it as run by this process.
+        The job keeps its progress if it did not complete and the file is unchanged;
+        otherwise it starts over.
+
+        Returns:
+            IngestionJob: The claimed job, or None if it is running elsewhere.
+        """
+        job_id = self.job_id(document_id, namespace)
+        path = self._path(job_id)
+        with _active_lock:
+            if path in _active:
+                return None
+            job = self.get(job_id)
+            if job is not None and job.status == "running" and self._owner_alive(job):
+                return None
+            _active.add(path)
+        fingerprint = _fingerprint(file_path)
+        if job is None or job.status == "completed" or job.fingerprint != fingerprint or job.file_path != file_path:
+            job = IngestionJob(job_id, document_id, file_path, fingerprint, namespace)
+        job.status = "running"
+        job.owner = _OWNER
+        job.error = None
+        job.runs += 1
+        try:
+            self.save(job)
+        except Exception:
+            self.release(job)
+            raise
+        return job
+
+    def release(self, job: IngestionJob):
+        """Ends this process's run of a job; save its final status first."""
+        with _active_lock:
+            _active.discard(self._path(job.job_id))
+
+    def interrupted(self) -> List[IngestionJob]:
+        """Returns the jobs left running by a process that no longer runs them."""
+        return [job for job in self.list() if job.status == "running" and not self._owner_alive(job)]
+
+    def _owner_alive(self, job: IngestionJob) -> bool:
+        """Whether the process that last ran a job may still be running it."""
+        if job.owner == _OWNER:
+            with _active_lock:
+                return self._path(job.job_id) in _active
+        host, _, pid = job.owner.rpartition(":")
+        if host == socket.gethostname() and os.name == "posix" and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return False
+            except OSError:
+                pass  # The process exists but belongs to another user.
+            return True
+        # Without a way to probe the owner, a job not checkpointed for a while is presumed abandoned.
+        return time.time() - job.updated_at < settings.INGESTION_JOB_STALE_SECONDS
@@ -0,0 +1,96 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional, Tuple, Type
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class PDFBackend(ABC):
+    """
+    Extracts text from PDF pages. Subclasses wrap one PDF library; register them in
+    `PDF_BACKENDS` to make them selectable with `settings.PDF_BACKEND`.
+    """
+    name = "base"
+
+    @abstractmethod
+    def page_count(self, file_path: str) -> int:
+        """Returns the number of pages in the PDF."""
+        pass
+
+    @abstractmethod
+    def extract_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Yields (page number, text) for the pages in [start, end), in order. Page
+        numbers start at 1; `start` and `end` are 0-based indexes. `end` defaults to
+        the last page.
+        """
+        pass
+
+class PyPDF2Backend(PDFBackend):
+    """Pure-Python extraction with PyPDF2, the default."""
+    name = "pypdf2"
+
+    def page_count(self, file_path: str) -> int:
+        from PyPDF2 import PdfReader
+        with open(file_path, "rb") as f:
+            return len(PdfReader(f).pages)
+
+    def extract_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        from PyPDF2 import PdfReader
+        with open(file_path, "rb") as f:
+            pages = PdfReader(f).pages
+            for index in range(start, len(pages) if end is None else min(end, len(pages))):
+                yield index + 1, pages[index].extract_text() or ""
+
+class PyMuPDFBackend(PDFBackend):
+    """Extraction with PyMuPDF (`pip install pymupdf`), typically much faster than PyPDF2."""
+    name = "pymupdf"
+
+    def page_count(self, file_path: str) -> int:
+        import fitz
+        with fitz.open(file_path) as document:
+            return document.page_count
+
+    def extract_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        import fitz
+        with fitz.open(file_path) as document:
+            for index in range(start, document.page_count if end is None else min(end, document.page_count)):
+                yield index + 1, document.load_page(index).get_text()
+
+class PdfiumBackend(PDFBackend):
+    """Extraction with pypdfium2 (`pip install pypdfium2`), PDFium's text layer."""
+    name = "pypdfium2"
+
+    def page_count(self, file_path: str) -> int:
+        import pypdfium2
+        document = pypdfium2.PdfDocument(file_path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+    def extract_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        import pypdfium2
+        document = pypdfium2.PdfDocument(file_path)
+        try:
+            for index in range(start, len(document) if end is None else min(end, len(document))):
+                page = document[index]
+                text_page = page.get_textpage()
+                yield index + 1, text_page.get_text_range()
+                text_page.close()
+                page.close()
+        finally:
+            document.close()
+
+PDF_BACKENDS: Dict[str, Type[PDFBackend]] = {
+    PyPDF2Backend.name: PyPDF2Backend,
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PdfiumBackend.name: PdfiumBackend,
+}
+
+def get_pdf_backend(name: Optional[str] = None) -> PDFBackend:
+    """Returns an instance of the named backend, `settings.PDF_BACKEND` by default."""
+    name = name or settings.PDF_BACKEND
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {name}. Expected one of {sorted(PDF_BACKENDS)}.")
+    return PDF_BACKENDS[name]()
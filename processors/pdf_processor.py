@@ -1,34 +1,52 @@
-from typing import List
-from PyPDF2 import PdfReader
-from utils.chunking import chunk_text
+from typing import Iterator, List, Optional, Tuple
+from processors.pdf_backends import PDFBackend, get_pdf_backend
+from utils.chunking import get_chunker
 from utils.logging_config import logger
-from config.settings import settings
-
-CHUNK_SIZE = settings.CHUNK_SIZE
-CHUNK_OVERLAP = settings.CHUNK_OVERLAP
 
 class PDFProcessor:
     """Processes PDF documents to extract text and chunk it."""
 
-    def __init__(self):
-        logger.info("PDFProcessor initialized.")
+    def __init__(self, chunker=None, backend: Optional[PDFBackend] = None):
+        # Character windows or token-bounded sentences, see utils.chunking.get_chunker.
+        self.chunker = chunker or get_chunker("PDFProcessor")
+        # The PDF library doing the extraction, see processors.pdf_backends.
+        self.backend = backend or get_pdf_backend()
+        logger.info(f"PDFProcessor initialized with the {self.backend.name} backend.")
 
     def process(self, file_path: str) -> List[str]:
         """Extracts text from a PDF and returns a list of text chunks."""
-        text_content = self._extract_text_from_pdf(file_path)
-        chunks = chunk_text(text_content)
+        chunks = list(self.iter_chunks(file_path))
         logger.info(f"Processed PDF: {file_path}, extracted {len(chunks)} chunks.")
         return chunks
 
-    def _extract_text_from_pdf(self, file_path: str) -> str:
-        """Helper to extract all text from a PDF file."""
-        full_text = ""
+    def page_count(self, file_path: str) -> int:
+        """Returns the number of pages, so the processing pool can split the PDF into page ranges."""
+        return self.backend.page_count(file_path)
+
+    def iter_chunks(self, file_path: str) -> Iterator[str]:
+        """Yields the text chunks of a PDF as its pages are extracted."""
+        for _, chunk in self.iter_page_chunks(file_path):
+            yield chunk
+
+    def iter_page_chunks(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Yields (page number, chunk) for the pages in [start, end). Each page is chunked
+        on its own, so every chunk comes from exactly one page and a page range gives
+        the same chunks whether it is extracted alone or as part of the whole document.
+        """
+        for page_number, text in self.extract_pages(file_path, start, end):
+            for chunk in self.chunker.chunk_stream([text]):
+                yield page_number, chunk
+
+    def extract(self, file_path: str) -> Iterator[str]:
+        """Yields the text of a PDF one page at a time."""
+        for _, text in self.extract_pages(file_path):
+            yield text
+
+    def extract_pages(self, file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Yields (page number, text) for the pages in [start, end); page numbers start at 1."""
         try:
-            with open(file_path, "rb") as f:
-                reader = PdfReader(f)
-                for page in reader.pages:
-                    full_text += page.extract_text() or ""
+            yield from self.backend.extract_pages(file_path, start, end)
         except Exception as e:
             logger.error(f"Error extracting text from PDF {file_path}: {e}")
             raise
-        return full_text
\ No newline at end of file
@@ -0,0 +1,281 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from config.settings import settings
+from processors.pdf_processor import PDFProcessor
+from processors.pptx_processor import PPTXProcessor
+from processors.docx_processor import DOCXProcessor
+from processors.csv_processor import CSVProcessor
+from processors.text_processor import TextProcessor
+from utils.helpers import get_file_extension
+
+logger = logging.getLogger(__name__)
+
+PROCESSOR_CLASSES = {
+    ".pdf": PDFProcessor,
+    ".pptx": PPTXProcessor,
+    ".docx": DOCXProcessor,
+    ".csv": CSVProcessor,
+    ".txt": TextProcessor,
+    ".md": TextProcessor,
+}
+
+# Seconds between checks for new results, completion, timeout and cancellation.
+_POLL_INTERVAL = 0.05
+
+# Processor instances are created once per worker process and reused across jobs.
+_worker_processors = {}
+
+def _get_processor(file_extension: str):
+    processor = _worker_processors.get(file_extension)
+    if processor is None:
+        processor = PROCESSOR_CLASSES[file_extension]()
+        _worker_processors[file_extension] = processor
+    return processor
+
+def _put(results, batch: Tuple[List[str], List[Dict[str, Any]]], cancel_event) -> bool:
+    """Waits for room in the bounded results queue. Returns False if the job was cancelled."""
+    while not cancel_event.is_set():
+        try:
+            results.put(batch, True, _POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _run_job(file_path: str, page_range: Optional[Tuple[int, int]], results, cancel_event, batch_size: int) -> int:
+    """
+    Parses a file, or one page range of it, inside a worker process and streams its
+    chunks back in (chunks, metadatas) batches as they are produced. Chunks of paged
+    documents carry their page number in their metadata. The results queue is bounded,
+    so parsing pauses while the consumer is behind and at most a few batches are held
+    in memory.
+
+    Returns:
+        int: The number of chunks sent back.
+    """
+    processor = _get_processor(get_file_extension(file_path))
+    if hasattr(processor, "iter_page_chunks"):
+        records = ((chunk, {"page": page}) for page, chunk in processor.iter_page_chunks(file_path, *(page_range or ())))
+    else:
+        records = ((chunk, {}) for chunk in processor.iter_chunks(file_path))
+    sent = 0
+    chunks, metadatas = [], []
+    for chunk, metadata in records:
+        chunks.append(chunk)
+        metadatas.append(metadata)
+        if len(chunks) == batch_size:
+            if not _put(results, (chunks, metadatas), cancel_event):
+                return sent
+            sent += len(chunks)
+            chunks, metadatas = [], []
+    if chunks and _put(results, (chunks, metadatas), cancel_event):
+        sent += len(chunks)
+    return sent
+
+class _Job:
+    """A submitted parsing job, the executor it runs on and the queue it streams through."""
+    def __init__(self, future: concurrent.futures.Future, executor: ProcessPoolExecutor, results, cancel_event,
+                 label: str):
+        self.future = future
+        self.executor = executor
+        self.results = results
+        self.cancel_event = cancel_event
+        self.label = label
+
+class ProcessingPool:
+    """
+    Runs document processors in a pool of worker processes, off the event loop.
+
+    Each job streams its chunks back to the caller in batches as an async iterator,
+    is bounded by a timeout, and can be cancelled by abandoning the iterator. A running
+    job that does not stop within `cancel_grace` seconds is killed by terminating the
+    worker processes of the executor it ran on; new jobs are already being sent to a
+    fresh executor by then.
+
+    Processors yield their chunks while they parse, and a job runs at most
+    `max_pending_batches` batches ahead of the caller, so memory stays bounded however
+    large the file is and the first batches can be indexed before parsing finishes.
+
+    Documents with pages (PDFs) of at least twice `pages_per_job` pages are split into
+    up to `max_workers` page ranges of at least `pages_per_job` pages, parsed as
+    separate jobs at once. Their batches are merged back in page order, so the caller
+    sees the same stream as from a single job, only sooner.
+    """
+    def __init__(self, max_workers: Optional[int] = None, job_timeout: Optional[float] = None,
+                 batch_size: Optional[int] = None, max_pending_batches: Optional[int] = None,
+                 pages_per_job: Optional[int] = None, cancel_grace: float = 2.0):
+        """
+        Initializes the ProcessingPool. Worker processes are started on first use.
+
+        Args:
+            max_workers (int, optional): Number of worker processes.
+            job_timeout (float, optional): Seconds before a job is cancelled.
+            batch_size (int, optional): Chunks per streamed batch.
+            max_pending_batches (int, optional): Batches a job may produce ahead of the consumer.
+            pages_per_job (int, optional): Overrides `settings.PDF_PAGES_PER_JOB`, the
+                smallest page range parsed as its own job; 0 parses every document as one job.
+            cancel_grace (float): Seconds a cancelled job gets to stop before its
+                worker processes are terminated.
+        """
+        self.max_workers = max_workers or settings.INGESTION_MAX_WORKERS
+        self.job_timeout = job_timeout or settings.INGESTION_JOB_TIMEOUT
+        self.batch_size = batch_size or settings.INGESTION_STREAM_BATCH_SIZE
+        self.max_pending_batches = max_pending_batches or settings.INGESTION_MAX_PENDING_BATCHES
+        self.pages_per_job = settings.PDF_PAGES_PER_JOB if pages_per_job is None else pages_per_job
+        self.cancel_grace = cancel_grace
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._start_lock = threading.Lock()
+
+    def supports(self, file_extension: str) -> bool:
+        """Returns True if a processor exists for the file extension."""
+        return file_extension in PROCESSOR_CLASSES
+
+    def _prepare_job(self):
+        """Starts the pool if needed and creates a job's queues. Blocks; run it off the event loop."""
+        with self._start_lock:
+            self._ensure_started()
+            return self._executor, self._manager.Queue(self.max_pending_batches), self._manager.Event()
+
+    def _ensure_started(self):
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Started document processing pool with {self.max_workers} workers.")
+
+    async def stream(self, file_path: str, timeout: Optional[float] = None) -> AsyncIterator[List[str]]:
+        """
+        Parses a file in worker processes, yielding its chunks in batches as they arrive.
+        Like `stream_records`, without the metadata.
+
+        Yields:
+            list[str]: Successive batches of text chunks.
+        """
+        async for chunks, _ in self.stream_records(file_path, timeout):
+            yield chunks
+
+    async def stream_records(self, file_path: str,
+                             timeout: Optional[float] = None) -> AsyncIterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        Parses a file in worker processes, yielding its chunks and their metadata in
+        batches as they arrive, in document order.
+
+        Args:
+            file_path (str): The document to process.
+            timeout (float, optional): Overrides the pool's job timeout. Only time spent
+                waiting for the next batch counts, not time the caller spends on batches.
+
+        Yields:
+            tuple[list[str], list[dict]]: Successive batches of text chunks and one
+                metadata dict per chunk, e.g. {"page": 3} for PDFs.
+
+        Raises:
+            TimeoutError: If parsing does not finish in time. The jobs are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        ranges = iter(await self._page_ranges(file_path))
+        limit = timeout or self.job_timeout
+        waited = 0.0
+        jobs: Deque[_Job] = deque()
+        try:
+            for page_range in islice(ranges, self.max_workers):
+                jobs.append(await self._submit(file_path, page_range))
+            while jobs:
+                job = jobs[0]
+                while True:
+                    started = loop.time()
+                    try:
+                        batch = await loop.run_in_executor(None, job.results.get, True, _POLL_INTERVAL)
+                    except queue.Empty:
+                        if job.future.done():
+                            break
+                        batch = None
+                    waited += loop.time() - started
+                    if waited > limit:
+                        raise TimeoutError(f"Processing {file_path} exceeded {limit}s")
+                    if batch is not None:
+                        yield batch
+                # The job may have queued its last batches between our final poll and finishing.
+                while True:
+                    try:
+                        batch = job.results.get_nowait()
+                    except queue.Empty:
+                        break
+                    yield batch
+                await asyncio.wrap_future(job.future)  # Re-raises any error from the worker.
+                jobs.popleft()
+                # Keep the workers busy with the next page range while this one is consumed.
+                for page_range in islice(ranges, 1):
+                    jobs.append(await self._submit(file_path, page_range))
+        finally:
+            for job in jobs:
+                self._cancel(job)
+
+    async def _page_ranges(self, file_path: str) -> List[Optional[Tuple[int, int]]]:
+        """Splits a paged document into [start, end) page ranges; [None] parses it as one job."""
+        file_extension = get_file_extension(file_path)
+        if not self.pages_per_job or not hasattr(PROCESSOR_CLASSES.get(file_extension), "page_count"):
+            return [None]
+        processor = _get_processor(file_extension)
+        pages = await asyncio.get_running_loop().run_in_executor(None, processor.page_count, file_path)
+        # Every job opens the document again, so use as few ranges as keep the workers busy.
+        count = min(self.max_workers, pages // self.pages_per_job)
+        if count <= 1:
+            return [None]
+        size = -(-pages // count)
+        return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+    async def _submit(self, file_path: str, page_range: Optional[Tuple[int, int]]) -> _Job:
+        loop = asyncio.get_running_loop()
+        # Starting the manager and forking workers takes a while; keep it off the event loop.
+        executor, results, cancel_event = await loop.run_in_executor(None, self._prepare_job)
+        future = await loop.run_in_executor(None, executor.submit, _run_job, file_path, page_range, results,
+                                            cancel_event, self.batch_size)
+        label = file_path if page_range is None else f"{file_path} pages {page_range[0] + 1}-{page_range[1]}"
+        return _Job(future, executor, results, cancel_event, label)
+
+    def _cancel(self, job: _Job):
+        """Stops a job whose results are no longer wanted."""
+        if job.future.done():
+            return
+        job.cancel_event.set()
+        if not job.future.cancel():
+            # The job is already running. New jobs go to a fresh executor while
+            # this one is given a grace period to stop before it is torn down.
+            if job.executor is self._executor:
+                self._executor = None
+            asyncio.get_running_loop().create_task(self._reap(job.future, job.executor, job.label))
+
+    async def _reap(self, job: concurrent.futures.Future, executor: ProcessPoolExecutor, file_path: str):
+        """Waits for a cancelled job to stop, terminating its executor's workers if it will not."""
+        outcome = asyncio.wrap_future(job)
+        # The job's own result or error no longer matters to anyone.
+        outcome.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            await asyncio.wait_for(asyncio.shield(outcome), self.cancel_grace)
+        except asyncio.TimeoutError:
+            logger.warning(f"Processing job for {file_path} did not stop; terminating worker processes.")
+            # ProcessPoolExecutor has no public way to stop a running task.
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+        except Exception:
+            pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
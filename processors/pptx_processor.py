@@ -1,10 +1,7 @@
 import logging
+from typing import Iterator
 from pptx import Presentation
-from config.settings import settings
-from utils.chunking import chunk_text
-
-CHUNK_SIZE = settings.CHUNK_SIZE
-CHUNK_OVERLAP = settings.CHUNK_OVERLAP
+from utils.chunking import get_chunker, join_pieces
 
 logger = logging.getLogger(__name__)
 
@@ -12,10 +9,15 @@ class PPTXProcessor:
     """
     A processor for extracting text from PPTX documents and chunking it.
     """
-    def __init__(self):
+    def __init__(self, chunker=None):
         """
         Initializes the PPTXProcessor.
+
+        Args:
+            chunker (optional): Overrides the chunker configured for this processor,
+                see utils.chunking.get_chunker.
         """
+        self.chunker = chunker or get_chunker("PPTXProcessor")
         logger.info("PPTXProcessor initialized.")
 
     def process(self, file_path: str) -> list[str]:
@@ -29,17 +31,21 @@ class PPTXProcessor:
             list[str]: A list of text chunks extracted from the PPTX.
         """
         try:
-            presentation = Presentation(file_path)
-            full_text = []
-            for slide in presentation.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):  # Reason: Check if the shape has text content.
-                        full_text.append(shape.text)
-            
-            combined_text = "\n".join(full_text)
-            chunks = chunk_text(combined_text, CHUNK_SIZE, CHUNK_OVERLAP)
+            chunks = list(self.iter_chunks(file_path))
             logger.info(f"Successfully processed PPTX file: {file_path}. Extracted {len(chunks)} chunks.")
             return chunks
         except Exception as e:
             logger.error(f"Error processing PPTX file {file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_chunks(self, file_path: str) -> Iterator[str]:
+        """Yields the text chunks of a PPTX file slide by slide."""
+        return self.chunker.chunk_stream(join_pieces(self.extract(file_path), "\n"))
+
+    def extract(self, file_path: str) -> Iterator[str]:
+        """Yields the text of each text-bearing shape, slide by slide."""
+        presentation = Presentation(file_path)
+        for slide in presentation.slides:
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):  # Reason: Check if the shape has text content.
+                    yield shape.text
@@ -1,9 +1,9 @@
 import logging
+from typing import Iterator
 from config.settings import settings
-from utils.chunking import chunk_text
+from utils.chunking import get_chunker
 
-CHUNK_SIZE = settings.CHUNK_SIZE
-CHUNK_OVERLAP = settings.CHUNK_OVERLAP
+READ_BLOCK_SIZE = settings.INGESTION_READ_BLOCK_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +11,15 @@ class TextProcessor:
     """
     A processor for extracting text from plain text and Markdown documents and chunking it.
     """
-    def __init__(self):
+    def __init__(self, chunker=None):
         """
         Initializes the TextProcessor.
+
+        Args:
+            chunker (optional): Overrides the chunker configured for this processor,
+                see utils.chunking.get_chunker.
         """
+        self.chunker = chunker or get_chunker("TextProcessor")
         logger.info("TextProcessor initialized.")
 
     def process(self, file_path: str) -> list[str]:
@@ -28,12 +33,22 @@ class TextProcessor:
             list[str]: A list of text chunks extracted from the file.
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                full_text = f.read()
-            
-            chunks = chunk_text(full_text, CHUNK_SIZE, CHUNK_OVERLAP)
+            chunks = list(self.iter_chunks(file_path))
             logger.info(f"Successfully processed text file: {file_path}. Extracted {len(chunks)} chunks.")
             return chunks
         except Exception as e:
             logger.error(f"Error processing text file {file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_chunks(self, file_path: str) -> Iterator[str]:
+        """Yields the text chunks of a file while it is being read."""
+        return self.chunker.chunk_stream(self.extract(file_path))
+
+    def extract(self, file_path: str) -> Iterator[str]:
+        """Yields the text of a file in blocks of `INGESTION_READ_BLOCK_SIZE` characters."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
@@ -0,0 +1,27 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+
+class FakeEmbeddingModel:
+    """Deterministic stand-in for EmbeddingModel: each text maps to a fixed random vector."""
+
+    def __init__(self, dimension: int = 16):
+        self.dimension = dimension
+        self.calls = []
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+    def get_embeddings(self, texts):
+        self.calls.append(list(texts))
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.stack([self.vector(text) for text in texts])
+
+
+@pytest.fixture
+def embedding_model():
+    return FakeEmbeddingModel()
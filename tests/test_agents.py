@@ -0,0 +1,439 @@
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from agents.coordinator import Coordinator
+from agents.ingestion_agent import IngestionAgent
+from agents.llm_agent import LLMAgent
+from agents.retrieval_agent import RetrievalAgent
+from mcp.message_bus import InMemoryMessageBus
+from mcp.message_types import MCPMessage, MessageType
+from config.settings import settings
+from processors.pool import ProcessingPool
+from vector_store.registry import ResourceRegistry
+from utils.chunking import chunk_text
+
+
+def make_message(message_type: MessageType, receiver: str, **payload) -> MCPMessage:
+    return MCPMessage(
+        sender="test",
+        receiver=receiver,
+        type=message_type,
+        trace_id=str(uuid.uuid4()),
+        timestamp=datetime.now().isoformat(),
+        payload=payload,
+    )
+
+
+def test_retrieval_sees_ingested_vectors_immediately(tmp_path, embedding_model):
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus()
+        ingestion = IngestionAgent(bus, resources=resources)
+        retrieval = RetrievalAgent(bus, resources=resources)
+        assert ingestion.vector_store is retrieval.vector_store
+
+        results = []
+        await retrieval.setup()
+        await bus.register_handler(MessageType.RETRIEVAL_RESULT, results.append)
+        await bus.start()
+
+        ingestion.vector_store.add_documents(["the invoice total is 42 euros", "the meeting is on monday"])
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, "RetrievalAgent",
+                                            query="the meeting is on monday", top_k=1))
+        await bus.join()
+        await bus.stop()
+        ingestion.close()
+        retrieval.close()
+        return results, resources.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results[0].payload["documents"] == ["the meeting is on monday"]
+    assert stats["vector_stores"] == {}
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Stand-in for the Gemini client that counts generate calls.
+
+    Streamed responses yield one word at a time; before each word after the first
+    they wait for `release`, if set.
+    """
+
+    def __init__(self, release: asyncio.Event = None):
+        self.prompts = []
+        self.release = release
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.prompts.append(prompt)
+        text = f"answer number {len(self.prompts)}"
+        if not stream:
+            return FakeChunk(text)
+
+        async def chunks():
+            for i, word in enumerate(text.split(" ")):
+                if i and self.release is not None:
+                    await self.release.wait()
+                yield FakeChunk(word if i == 0 else " " + word)
+        return chunks()
+
+
+def test_llm_agent_answers_repeated_questions_from_the_answer_cache(tmp_path, embedding_model):
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus()
+        llm = LLMAgent(bus, resources=resources)
+        llm.client = FakeGenerativeModel()
+        responses = []
+        await llm.setup()
+        await bus.register_handler(MessageType.LLM_RESPONSE, responses.append)
+        await bus.start()
+
+        llm.vector_store.add_documents(["the invoice total is 42 euros"], [{"document_id": "invoice"}])
+        chunk_id = llm.vector_store.search_chunks(embedding_model.vector("invoice"), k=1)[0]["id"]
+
+        async def ask():
+            await bus.send_message(make_message(MessageType.LLM_REQUEST, "LLMAgent", query="what is the total?",
+                                                context=["the invoice total is 42 euros"], context_ids=[chunk_id]))
+            await bus.join()
+
+        await ask()
+        await ask()
+        llm.vector_store.upsert_document("invoice", ["the invoice total is 43 euros"])
+        await ask()
+        await bus.stop()
+        stats = llm.cache_stats()
+        llm.close()
+        return responses, llm.client.prompts, stats
+
+    responses, prompts, stats = asyncio.run(scenario())
+    assert [m.payload["cached"] for m in responses] == [False, True, False]
+    assert responses[0].payload["response"] == "answer number 1"
+    assert responses[1].payload["response"] == responses[0].payload["response"]
+    assert len(prompts) == 2
+    assert stats["invalidations"] == 1
+
+
+def test_coordinator_streams_token_deltas_before_generation_finishes(tmp_path, embedding_model, monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus(dispatch_mode="concurrent")
+        coordinator = Coordinator(bus)
+        retrieval = RetrievalAgent(bus, resources=resources)
+        llm = LLMAgent(bus, resources=resources)
+        release = asyncio.Event()
+        llm.client = FakeGenerativeModel(release)
+        for agent in (coordinator, retrieval, llm):
+            await agent.setup()
+        await bus.start()
+        retrieval.vector_store.add_documents(["the invoice total is 42 euros"])
+
+        deltas = []
+        first_delta = asyncio.Event()
+
+        async def on_delta(delta):
+            deltas.append(delta)
+            first_delta.set()
+
+        answer = asyncio.create_task(coordinator.process_query("what is the total?", on_delta=on_delta))
+        await asyncio.wait_for(first_delta.wait(), timeout=5)
+        streamed_before_release = list(deltas)
+        release.set()
+        result = await asyncio.wait_for(answer, timeout=5)
+        await bus.join()
+        await bus.stop()
+        retrieval.close()
+        llm.close()
+        return streamed_before_release, deltas, result, coordinator.latency_stats(), llm.latency_stats()
+
+    early, deltas, result, coordinator_stats, llm_stats = asyncio.run(scenario())
+    assert early == ["answer"]
+    assert "".join(deltas) == result["response"] == "answer number 1"
+    assert 0 < result["time_to_first_token"] <= result["generation_seconds"]
+    assert coordinator_stats["time_to_first_token"]["count"] == 1
+    assert llm_stats["time_to_first_token"]["count"] == 1
+
+
+def test_streamed_deltas_all_reach_a_slow_consumer_before_the_result(tmp_path, embedding_model, monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus(dispatch_mode="concurrent")
+        coordinator = Coordinator(bus)
+        retrieval = RetrievalAgent(bus, resources=resources)
+        llm = LLMAgent(bus, resources=resources)
+        llm.client = FakeGenerativeModel()
+        for agent in (coordinator, retrieval, llm):
+            await agent.setup()
+        await bus.start()
+        retrieval.vector_store.add_documents(["the invoice total is 42 euros"])
+
+        deltas = []
+
+        async def on_delta(delta):
+            await asyncio.sleep(0.05)
+            deltas.append(delta)
+
+        result = await asyncio.wait_for(coordinator.process_query("what is the total?", on_delta=on_delta), timeout=5)
+        received = list(deltas)
+        await bus.join()
+        await bus.stop()
+        retrieval.close()
+        llm.close()
+        return received, result
+
+    received, result = asyncio.run(scenario())
+    assert "".join(received) == result["response"] == "answer number 1"
+
+
+def write_large_csv(path, rows: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,customer,amount,notes\n")
+        for i in range(rows):
+            f.write(f"{i},customer-{i % 977},{i * 1.37:.2f},order note number {i} for the quarterly report\n")
+
+
+def test_query_latency_stays_flat_during_large_ingestion(tmp_path, embedding_model):
+    csv_path = tmp_path / "large.csv"
+    write_large_csv(csv_path, 60000)
+
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path / "vectors"))
+        bus = InMemoryMessageBus()
+        ingestion = IngestionAgent(bus, resources=resources, processing_pool=ProcessingPool(max_workers=1))
+        retrieval = RetrievalAgent(bus, resources=resources)
+        await ingestion.setup()
+        await retrieval.setup()
+        ingestion.vector_store.add_documents(["a seed chunk so searches have something to hit"])
+
+        pending = {}
+        ingestion_done = asyncio.Event()
+
+        def on_result(message):
+            pending.pop(message.payload["request_id"]).set_result(time.perf_counter())
+
+        await bus.register_handler(MessageType.RETRIEVAL_RESULT, on_result)
+        await bus.register_handler(MessageType.INGESTION_RESPONSE, lambda m: ingestion_done.set())
+        await bus.start()
+
+        async def query_latency() -> float:
+            request_id = str(uuid.uuid4())
+            pending[request_id] = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, "RetrievalAgent",
+                                                request_id=request_id, query="quarterly report", top_k=3))
+            return await pending[request_id] - started
+
+        baseline = [await query_latency() for _ in range(5)]
+
+        ingestion_started = time.perf_counter()
+        await bus.send_message(make_message(MessageType.INGESTION_REQUEST, "IngestionAgent", file_path=str(csv_path)))
+        during = []
+        while not ingestion_done.is_set():
+            during.append(await query_latency())
+            await asyncio.sleep(0.02)
+        ingestion_seconds = time.perf_counter() - ingestion_started
+
+        await bus.join()
+        await bus.stop()
+        ingestion.close()
+        retrieval.close()
+        return baseline, during, ingestion_seconds
+
+    baseline, during, ingestion_seconds = asyncio.run(scenario())
+    assert len(during) >= 5, "ingestion finished too quickly to overlap with queries"
+    # Parsing takes far longer than any single query was allowed to stall.
+    assert max(during) < max(0.25, 10 * max(baseline))
+    assert max(during) < ingestion_seconds / 2
+
+
+def test_ingestion_resumes_after_the_last_committed_batch(tmp_path, embedding_model):
+    path = tmp_path / "handbook.txt"
+    path.write_text(" ".join(f"word{i}" for i in range(5000)), encoding="utf-8")
+    expected = chunk_text(path.read_text(encoding="utf-8"))
+
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path / "vectors"))
+        bus = InMemoryMessageBus()
+        responses, statuses = [], []
+        await bus.register_handler(MessageType.INGESTION_RESPONSE, responses.append)
+        await bus.register_handler(MessageType.INGESTION_STATUS, statuses.append)
+        await bus.start()
+
+        # Held across both agents, as a process serving queries would.
+        store = resources.acquire_vector_store()
+        ingestion = IngestionAgent(bus, resources=resources, processing_pool=ProcessingPool(max_workers=1, batch_size=4))
+        await ingestion.setup()
+        added = []
+        failing = [True]
+        add_documents, upsert_document = store.add_documents, store.upsert_document
+
+        def flaky_add(documents, metadatas=None, cache_stats=None):
+            if failing[0] and len(added) == 8:
+                raise RuntimeError("embedding service went away")
+            added.extend(documents)
+            add_documents(documents, metadatas, cache_stats)
+
+        def recording_upsert(document_id, documents, metadatas=None, cache_stats=None):
+            added.extend(documents)
+            upsert_document(document_id, documents, metadatas, cache_stats)
+
+        store.add_documents, store.upsert_document = flaky_add, recording_upsert
+        await bus.send_message(make_message(MessageType.INGESTION_REQUEST, "IngestionAgent", file_path=str(path)))
+        await bus.join()
+        ingestion.close()
+
+        # Leave the job as a crashed process would: still running, owned by a process that is gone.
+        job = ingestion.jobs.list()[0]
+        job.status, job.owner, job.updated_at = "running", "elsewhere:1", 0.0
+        with open(ingestion.jobs._path(job.job_id), "w", encoding="utf-8") as f:
+            json.dump(job.as_dict(), f)
+
+        failing[0] = False
+        restarted = IngestionAgent(bus, resources=resources, processing_pool=ProcessingPool(max_workers=1, batch_size=4))
+        await restarted.setup()
+        await restarted._resume_task
+        await bus.send_message(make_message(MessageType.INGESTION_STATUS_REQUEST, "IngestionAgent",
+                                            document_id=str(path)))
+        await bus.join()
+        await bus.stop()
+        count = store.document_chunk_count(str(path))
+        restarted.close()
+        resources.release_vector_store()
+        return responses, statuses, added, count
+
+    responses, statuses, added, count = asyncio.run(scenario())
+    assert [r.payload["status"] for r in responses] == ["failed", "success"]
+    assert responses[1].payload["resumed_from_chunk"] == 8
+    # Only the chunks after the committed batches were embedded again.
+    assert added == expected and count == len(expected)
+    [job] = statuses[0].payload["jobs"]
+    assert job["status"] == "completed" and job["runs"] == 2 and not job["interrupted"]
+    assert job["committed_chunks"] == len(expected) and job["chunks_per_second"] > 0
+
+
+def test_namespaces_keep_workspaces_apart(tmp_path, embedding_model):
+    path = tmp_path / "contract.txt"
+    path.write_text("the contract renewal is due in march", encoding="utf-8")
+
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path / "vectors"))
+        bus = InMemoryMessageBus()
+        ingestion = IngestionAgent(bus, resources=resources, processing_pool=ProcessingPool(max_workers=1))
+        retrieval = RetrievalAgent(bus, resources=resources)
+        await ingestion.setup()
+        await retrieval.setup()
+        ingestion.vector_store.add_documents(["the default workspace chunk"])
+        responses, results = [], []
+        await bus.register_handler(MessageType.INGESTION_RESPONSE, responses.append)
+        await bus.register_handler(MessageType.RETRIEVAL_RESULT, results.append)
+        await bus.start()
+
+        await bus.send_message(make_message(MessageType.INGESTION_REQUEST, "IngestionAgent",
+                                            file_path=str(path), namespace="acme"))
+        await bus.join()
+        for namespace in ("acme", None, "../etc"):
+            await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, "RetrievalAgent",
+                                                query="contract renewal", top_k=1, namespace=namespace))
+            await bus.join()
+        await bus.stop()
+        ingestion.close()
+        retrieval.close()
+        return responses, results, resources.residency_stats()
+
+    responses, results, residency = asyncio.run(scenario())
+    assert responses[0].payload["status"] == "success" and responses[0].payload["namespace"] == "acme"
+    assert results[0].payload["documents"] == ["the contract renewal is due in march"]
+    assert results[0].payload["namespace"] == "acme"
+    assert results[1].payload["documents"] == ["the default workspace chunk"]
+    assert results[2].payload["status"] == "failed"
+    assert set(residency["resident"]) == {"default", "acme"} and residency["loads"] == 2
+
+
+def test_opening_a_cold_namespace_does_not_block_the_event_loop(tmp_path, embedding_model):
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus()
+        retrieval = RetrievalAgent(bus, resources=resources)
+        await retrieval.setup()
+        results = []
+        await bus.register_handler(MessageType.RETRIEVAL_RESULT, results.append)
+        await bus.start()
+
+        acquire = resources.acquire_vector_store
+
+        def slow_acquire(namespace):
+            time.sleep(0.3)  # A large namespace being opened, or an evicted one being closed.
+            return acquire(namespace)
+
+        resources.acquire_vector_store = slow_acquire
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, "RetrievalAgent",
+                                            query="anything", namespace="cold"))
+        await bus.join()
+        ticking.cancel()
+        await bus.stop()
+        retrieval.close()
+        return ticks, results, resources.residency_stats()
+
+    ticks, results, residency = asyncio.run(scenario())
+    assert ticks >= 10
+    assert results[0].payload["status"] == "failed"  # The new namespace is empty.
+    assert residency["resident"]["cold"]["refs"] == 0
+
+
+def test_a_slow_search_does_not_block_the_event_loop(tmp_path, embedding_model):
+    async def scenario():
+        resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path))
+        bus = InMemoryMessageBus()
+        retrieval = RetrievalAgent(bus, resources=resources)
+        await retrieval.setup()
+        results = []
+        await bus.register_handler(MessageType.RETRIEVAL_RESULT, results.append)
+        await bus.start()
+
+        store = retrieval.vector_store
+        store.add_documents(["the quarterly report"])
+        search = store.search_chunks
+
+        def slow_search(*args, **kwargs):
+            time.sleep(0.3)  # A large store, or one whose index is being paged in.
+            return search(*args, **kwargs)
+
+        store.search_chunks = slow_search
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, "RetrievalAgent", query="quarterly report"))
+        await bus.join()
+        ticking.cancel()
+        await bus.stop()
+        retrieval.close()
+        return ticks, results
+
+    ticks, results = asyncio.run(scenario())
+    assert ticks >= 10
+    assert results[0].payload["documents"] == ["the quarterly report"]
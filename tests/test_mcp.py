@@ -0,0 +1,195 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from mcp.message_bus import InMemoryMessageBus
+from mcp.message_types import MCPMessage, MessageType
+
+
+def make_message(message_type: MessageType, trace_id: str = None, receiver: str = "*", **payload) -> MCPMessage:
+    return MCPMessage(
+        sender="test",
+        receiver=receiver,
+        type=message_type,
+        trace_id=trace_id or str(uuid.uuid4()),
+        timestamp=datetime.now().isoformat(),
+        payload=payload,
+    )
+
+
+def test_sequential_dispatch_runs_sync_and_async_handlers():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="sequential")
+        seen = []
+
+        async def async_handler(message):
+            seen.append(("async", message.payload["n"]))
+
+        def sync_handler(message):
+            seen.append(("sync", message.payload["n"]))
+
+        await bus.register_handler(MessageType.RETRIEVAL_REQUEST, async_handler)
+        await bus.register_handler(MessageType.RETRIEVAL_REQUEST, sync_handler)
+        await bus.start()
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, n=1))
+        await bus.join()
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(scenario()) == [("async", 1), ("sync", 1)]
+
+
+def test_slow_handler_does_not_block_other_message_types():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="concurrent")
+        release = asyncio.Event()
+        retrieval_done = asyncio.Event()
+
+        async def slow_llm(message):
+            await release.wait()
+
+        async def retrieval(message):
+            retrieval_done.set()
+
+        await bus.register_handler(MessageType.LLM_REQUEST, slow_llm)
+        await bus.register_handler(MessageType.RETRIEVAL_REQUEST, retrieval)
+        await bus.start()
+        await bus.send_message(make_message(MessageType.LLM_REQUEST))
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST))
+        await asyncio.wait_for(retrieval_done.wait(), timeout=1)
+        release.set()
+        await bus.join()
+        await bus.stop()
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_limit_per_message_type():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="concurrent", concurrency_limits={"LLM_REQUEST": 3})
+        active = 0
+        peak = 0
+
+        async def handler(message):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        await bus.register_handler(MessageType.LLM_REQUEST, handler)
+        await bus.start()
+        for _ in range(12):
+            await bus.send_message(make_message(MessageType.LLM_REQUEST))
+        await bus.join()
+        await bus.stop()
+        return peak
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_messages_of_one_trace_are_handled_in_order():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="concurrent")
+        seen = []
+
+        async def handler(message):
+            # Earlier messages sleep longer, so only ordering guarantees keep them first.
+            await asyncio.sleep(0.02 / (message.payload["n"] + 1))
+            seen.append(message.payload["n"])
+
+        for message_type in (MessageType.RETRIEVAL_REQUEST, MessageType.LLM_REQUEST):
+            await bus.register_handler(message_type, handler)
+        await bus.start()
+        for n in range(6):
+            message_type = MessageType.RETRIEVAL_REQUEST if n % 2 else MessageType.LLM_REQUEST
+            await bus.send_message(make_message(message_type, trace_id="trace-1", n=n))
+        await bus.join()
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(scenario()) == list(range(6))
+
+
+def test_stream_deltas_are_delivered_while_their_trace_is_in_flight():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="concurrent")
+        seen = []
+        all_seen = asyncio.Event()
+
+        async def generate(message):
+            # Waits for its own deltas, which would deadlock if they queued behind it.
+            for n in range(5):
+                await bus.send_message(make_message(MessageType.LLM_STREAM_DELTA, trace_id="trace-1", n=n))
+            await asyncio.wait_for(all_seen.wait(), timeout=1)
+
+        async def on_delta(message):
+            await asyncio.sleep(0.01 / (message.payload["n"] + 1))
+            seen.append(message.payload["n"])
+            if len(seen) == 5:
+                all_seen.set()
+
+        await bus.register_handler(MessageType.LLM_REQUEST, generate)
+        await bus.register_handler(MessageType.LLM_STREAM_DELTA, on_delta)
+        await bus.start()
+        await bus.send_message(make_message(MessageType.LLM_REQUEST, trace_id="trace-1"))
+        await bus.join()
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(scenario()) == list(range(5))
+
+
+def test_addressed_message_reaches_only_its_receiver():
+    async def scenario():
+        bus = InMemoryMessageBus()
+        seen = []
+        await bus.register_handler(MessageType.RETRIEVAL_REQUEST, lambda m: seen.append("retrieval"), agent_id="RetrievalAgent")
+        await bus.register_handler(MessageType.RETRIEVAL_REQUEST, lambda m: seen.append("other"), agent_id="OtherAgent")
+        await bus.start()
+        await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, receiver="RetrievalAgent"))
+        await bus.join()
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(scenario()) == ["retrieval"]
+
+
+def test_broadcast_reaches_each_agent_once_plus_observers():
+    async def scenario():
+        bus = InMemoryMessageBus()
+        seen = []
+        for replica in range(3):
+            await bus.register_handler(MessageType.LLM_RESPONSE, lambda m, r=replica: seen.append(f"coordinator-{r}"), agent_id="CoordinatorAgent")
+        await bus.register_handler(MessageType.LLM_RESPONSE, lambda m: seen.append("monitor"), agent_id="MonitorAgent")
+        await bus.register_handler(MessageType.LLM_RESPONSE, lambda m: seen.append("ui"))
+        await bus.start()
+        await bus.send_message(make_message(MessageType.LLM_RESPONSE))
+        await bus.join()
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(scenario()) == ["coordinator-0", "monitor", "ui"]
+
+
+def test_replicas_of_one_agent_share_the_load():
+    async def scenario():
+        bus = InMemoryMessageBus(dispatch_mode="concurrent", concurrency_limits={"RETRIEVAL_REQUEST": 4})
+        handled = {replica: 0 for replica in range(4)}
+
+        def make_replica(replica):
+            async def handler(message):
+                handled[replica] += 1
+                await asyncio.sleep(0.01)
+            return handler
+
+        for replica in handled:
+            await bus.register_handler(MessageType.RETRIEVAL_REQUEST, make_replica(replica), agent_id="RetrievalAgent")
+        await bus.start()
+        for _ in range(40):
+            await bus.send_message(make_message(MessageType.RETRIEVAL_REQUEST, receiver="RetrievalAgent"))
+        await bus.join()
+        await bus.stop()
+        return handled
+
+    assert asyncio.run(scenario()) == {0: 10, 1: 10, 2: 10, 3: 10}
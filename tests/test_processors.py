@@ -0,0 +1,216 @@
+import asyncio
+import time
+
+import pytest
+
+import processors.csv_processor as csv_processor
+import utils.chunking as chunking
+from benchmarks.bench_pdf_extraction import write_text_pdf
+from processors.bulk import BulkIngestor, discover_files
+from processors.csv_processor import CSVProcessor
+from processors.pdf_processor import PDFProcessor
+from processors.pool import ProcessingPool
+from processors.text_processor import TextProcessor
+from config.settings import settings
+from vector_store.registry import ResourceRegistry
+from utils.chunking import TokenChunker, approximate_token_counts, chunk_stream, chunk_text
+
+
+def collect(pool: ProcessingPool, path, **kwargs):
+    async def run():
+        return [batch async for batch in pool.stream(str(path), **kwargs)]
+    return asyncio.run(run())
+
+
+def test_processing_pool_streams_chunks_in_batches(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("x" * 8000, encoding="utf-8")
+    pool = ProcessingPool(max_workers=1, batch_size=3)
+    try:
+        batches = collect(pool, path)
+    finally:
+        pool.shutdown()
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert all(len(chunk) <= 1000 for batch in batches for chunk in batch)
+
+
+def test_processing_pool_times_out_and_recovers(tmp_path):
+    big = tmp_path / "big.csv"
+    with open(big, "w", encoding="utf-8") as f:
+        f.write("a,b\n")
+        for i in range(200000):
+            f.write(f"{i},value {i}\n")
+    small = tmp_path / "small.txt"
+    small.write_text("hello world", encoding="utf-8")
+
+    async def scenario(pool):
+        with pytest.raises(TimeoutError):
+            async for _ in pool.stream(str(big), timeout=0.2):
+                pass
+        # The stuck worker is terminated and the pool keeps serving new jobs.
+        started = time.perf_counter()
+        batches = [batch async for batch in pool.stream(str(small))]
+        return batches, time.perf_counter() - started
+
+    pool = ProcessingPool(max_workers=1, cancel_grace=0.1)
+    try:
+        batches, seconds = asyncio.run(scenario(pool))
+    finally:
+        pool.shutdown()
+    assert batches == [["hello world"]]
+    assert seconds < 1.5
+
+
+def test_pdf_page_ranges_are_parsed_in_parallel_and_merged_in_page_order(tmp_path):
+    path = tmp_path / "report.pdf"
+    write_text_pdf(str(path), [f"page {page} " + "lorem ipsum " * 150 for page in range(1, 10)])
+
+    async def run(pool):
+        return [batch async for batch in pool.stream_records(str(path))]
+
+    expected = list(PDFProcessor().iter_page_chunks(str(path)))
+    assert [page for page, _ in expected] == [page for page in range(1, 10) for _ in range(3)]
+    for pages_per_job in (2, 0):
+        pool = ProcessingPool(max_workers=3, batch_size=4, pages_per_job=pages_per_job)
+        try:
+            assert asyncio.run(pool._page_ranges(str(path))) == ([(0, 3), (3, 6), (6, 9)] if pages_per_job else [None])
+            batches = asyncio.run(run(pool))
+        finally:
+            pool.shutdown()
+        chunks = [chunk for texts, _ in batches for chunk in texts]
+        pages = [metadata["page"] for _, metadatas in batches for metadata in metadatas]
+        assert list(zip(pages, chunks)) == expected
+
+
+@pytest.mark.parametrize("piece_sizes", [[1], [7, 3], [999, 1, 1000], [2500], [0, 50, 0, 1201]])
+def test_chunk_stream_matches_chunking_the_joined_text(piece_sizes):
+    text = "".join(chr(ord("a") + i % 26) for i in range(sum(piece_sizes)))
+    pieces, start = [], 0
+    for size in piece_sizes:
+        pieces.append(text[start:start + size])
+        start += size
+    assert list(chunk_stream(iter(pieces), 100, 30)) == chunk_text(text, 100, 30)
+
+
+def test_processors_yield_chunks_before_reading_the_whole_file(tmp_path, monkeypatch):
+    path = tmp_path / "rows.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,name\n")
+        for i in range(5000):
+            f.write(f"{i},name {i}\n")
+    monkeypatch.setattr(csv_processor, "ROWS_PER_BLOCK", 100)
+    blocks = CSVProcessor().extract(str(path))
+    assert next(blocks).splitlines()[0].split() == ["id", "name"]
+    assert len(next(blocks).strip("\n").splitlines()) == 100
+    assert len(CSVProcessor().process(str(path))) > 1
+
+    text_path = tmp_path / "notes.txt"
+    text_path.write_text("word " * 5000, encoding="utf-8")
+    assert TextProcessor().process(str(text_path)) == chunk_text("word " * 5000)
+
+
+
+def test_csv_rows_become_compact_records_packed_into_chunks(tmp_path, monkeypatch):
+    path = tmp_path / "orders.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id, customer ,note\n")
+        f.write('1,Acme,"late, but paid"\n')
+        f.write("2,,\n")
+        for i in range(3, 400):
+            f.write(f"{i},customer {i},note {i}\n")
+    monkeypatch.setattr(csv_processor, "ROWS_PER_BLOCK", 64)
+    monkeypatch.setattr(csv_processor, "CHUNK_SIZE", 300)
+
+    processor = CSVProcessor()
+    records = list(processor.iter_records(str(path)))
+    assert records[:2] == ["id: 1 | customer: Acme | note: late, but paid", "id: 2"]
+    assert len(records) == 399
+
+    chunks = processor.process(str(path))
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == records
+
+
+def test_csv_records_are_packed_within_the_token_chunkers_budget(tmp_path, monkeypatch):
+    path = tmp_path / "orders.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,note\n")
+        for i in range(200):
+            f.write(f"{i},paid in full on time\n")
+        f.write("200," + "very long note " * 40 + "\n")
+    monkeypatch.setattr(csv_processor, "ROWS_PER_BLOCK", 64)
+    monkeypatch.setattr(settings, "CHUNKER_BY_PROCESSOR", {"CSVProcessor": "tokens"})
+    monkeypatch.setattr(settings, "CHUNK_MAX_TOKENS", 40)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP_TOKENS", 0)
+    monkeypatch.setattr(chunking, "embedding_token_counter", lambda: approximate_token_counts)
+
+    processor = CSVProcessor()
+    records = list(processor.iter_records(str(path)))
+    chunks = processor.process(str(path))
+    assert all(count <= 40 for count in approximate_token_counts(chunks))
+    # Records that fit stay whole and in order; the long one is split between words.
+    parts = [chunk for chunk in chunks if "very long note" in chunk]
+    assert len(parts) > 1
+    assert "\n".join(chunks[:-len(parts)]).splitlines() == records[:-1]
+    assert " ".join(parts).split() == records[-1].split()
+
+
+def sample_document(paragraphs: int = 12) -> str:
+    sentences = [f"Sentence {i} of the report mentions item {i * 7} and its cost." for i in range(paragraphs * 5)]
+    return "\n\n".join(" ".join(sentences[p * 5:(p + 1) * 5]) for p in range(paragraphs))
+
+
+def test_token_chunker_packs_whole_sentences_within_the_budget():
+    text = sample_document() + "\n\n" + " ".join(f"word{i}" for i in range(100))
+    chunker = TokenChunker(max_tokens=40, overlap_tokens=15, count_tokens=approximate_token_counts)
+    chunks = list(chunker.chunk_stream([text]))
+
+    assert max(approximate_token_counts(chunks)) <= 40
+    for chunk in chunks[:-3]:
+        assert chunk.endswith(".")
+    # Every sentence survives, and a boundary-free run is split between words.
+    for i in range(60):
+        assert any(f"Sentence {i} of" in chunk for chunk in chunks)
+    assert "word99" in chunks[-1] and not any("word" in chunk and "Sentence" in chunk for chunk in chunks)
+    # Overlapping chunks repeat their predecessor's last sentence.
+    assert chunks[1].startswith(chunks[0].split(". ")[-1].rstrip("."))
+
+
+def test_token_chunker_gives_the_same_chunks_however_the_text_arrives():
+    text = sample_document()
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=10, count_tokens=approximate_token_counts)
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(chunker.chunk_stream(pieces)) == list(chunker.chunk_stream([text]))
+
+
+def test_bulk_ingestor_indexes_a_directory_in_pooled_batches(tmp_path, embedding_model):
+    docs = tmp_path / "docs"
+    (docs / "nested").mkdir(parents=True)
+    for i in range(12):
+        folder = docs / "nested" if i % 3 == 0 else docs
+        (folder / f"note-{i}.txt").write_text(f"note {i} " * (150 * (i + 1)), encoding="utf-8")
+    (docs / "image.png").write_bytes(b"not a document")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# extra files\n\ndocs/note-1.txt\n", encoding="utf-8")
+
+    files = list(discover_files([str(docs), str(docs / "note-2.txt")], str(manifest), extensions={".txt"}))
+    # note-1.txt and note-2.txt are listed twice; each is ingested once.
+    assert len(files) == 12 and str(tmp_path / "docs" / "note-1.txt") in files
+
+    resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path / "vectors"))
+    ingestor = BulkIngestor(resources, ProcessingPool(max_workers=2, batch_size=4), index_batch_size=16)
+    try:
+        report = asyncio.run(ingestor.ingest(files))
+        store = ingestor.vector_store
+        expected = sum(len(chunk_text(open(path, encoding="utf-8").read())) for path in files)
+        assert store.ntotal == expected
+        assert report.files == 12 and report.chunks == expected
+        assert sorted(store.document_ids()) == sorted(files)
+        assert len(embedding_model.calls) < 20
+        stats = report.as_dict()
+        assert stats["chunks_per_second"] > 0 and stats["stages"]["embed_seconds"] > 0
+        first_chunk = chunk_text("note 11 " * 1800)[0]
+        assert store.search(first_chunk, k=1) == [first_chunk]
+    finally:
+        ingestor.processing_pool.shutdown()
+        ingestor.close()
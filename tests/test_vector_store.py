@@ -0,0 +1,773 @@
+import asyncio
+import os
+import threading
+
+import faiss
+import numpy as np
+import pytest
+
+from vector_store.answer_cache import SemanticAnswerCache, context_fingerprint
+from vector_store.batching import BatchingEmbeddingService
+from vector_store.chunk_store import BlockCache, ChunkStore, write_chunk_store
+from vector_store.embedding_cache import EmbeddingCache, EmbeddingCacheStats
+from config.settings import settings
+from vector_store.faiss_store import FAISSVectorStore, StoreLockedError, _IdFilter
+from vector_store.index_factory import build_index, codec_of, index_type_of
+from vector_store.query_cache import TTLCache
+from vector_store.registry import ResourceRegistry
+from vector_store import faiss_store, index_factory, segments
+
+
+def test_batching_service_coalesces_concurrent_requests(embedding_model):
+    async def scenario():
+        service = BatchingEmbeddingService(embedding_model, max_batch_size=64, max_wait_ms=20)
+        texts = [f"question {i}" for i in range(50)]
+        rows = await asyncio.gather(*(service.embed(text) for text in texts))
+        service.close()
+        return texts, rows
+
+    texts, rows = asyncio.run(scenario())
+    assert len(embedding_model.calls) == 1
+    for text, row in zip(texts, rows):
+        assert row.dtype == np.float32
+        np.testing.assert_array_equal(row, embedding_model.vector(text))
+
+
+def test_batching_service_respects_max_batch_size(embedding_model):
+    async def scenario():
+        service = BatchingEmbeddingService(embedding_model, max_batch_size=8, max_wait_ms=50)
+        result = await service.embed_many([f"chunk {i}" for i in range(20)])
+        service.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result.shape == (20, embedding_model.dimension)
+    assert max(len(call) for call in embedding_model.calls) <= 8
+    assert sum(len(call) for call in embedding_model.calls) == 20
+
+
+def test_batching_service_propagates_encode_failures(embedding_model):
+    embedding_model.get_embeddings = lambda texts: np.empty((0, embedding_model.dimension), dtype=np.float32)
+
+    async def scenario():
+        service = BatchingEmbeddingService(embedding_model, max_wait_ms=1)
+        try:
+            await service.embed("anything")
+        finally:
+            service.close()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_batching_service_serves_repeated_queries_from_cache(embedding_model):
+    async def scenario():
+        service = BatchingEmbeddingService(embedding_model, max_wait_ms=1)
+        first = await service.embed("what is the total?")
+        second = await service.embed("what is the total?")
+        service.close()
+        return service, first, second
+
+    service, first, second = asyncio.run(scenario())
+    assert embedding_model.calls == [["what is the total?"]]
+    assert second is first and not second.flags.writeable
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(capacity=2, ttl=10.0, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # Evicts "b", the least recently used.
+    assert cache.get("b") is None
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2, "hit_rate": 0.3333, "evictions": 1, "expirations": 1}
+
+
+def test_registry_shares_one_model_and_store_per_namespace(tmp_path, embedding_model):
+    loads = []
+
+    def factory():
+        loads.append(1)
+        return embedding_model
+
+    # With no residency budget, stores close as soon as their last holder releases them.
+    resources = ResourceRegistry(embedding_model_factory=factory, base_dir=str(tmp_path), resident_bytes=0)
+    assert not loads  # Nothing is loaded until first use.
+
+    writer = resources.acquire_vector_store()
+    reader = resources.acquire_vector_store()
+    other = resources.acquire_vector_store("workspace-a")
+    assert writer is reader
+    assert other is not writer
+    assert other.embedding_model is writer.embedding_model
+    assert len(loads) == 1
+
+    writer.add_documents(["alpha chunk", "beta chunk"])
+    assert reader.search("beta chunk", k=1) == ["beta chunk"]
+
+    for namespace in ("default", "default", "workspace-a"):
+        resources.release_vector_store(namespace)
+    assert resources.stats() == {"embedding_model_loaded": False, "embedding_model_refs": 0,
+                                 "embedding_cache": None, "vector_stores": {}, "result_caches": {}}
+
+
+def test_registry_keeps_hot_namespaces_resident_within_the_byte_budget(tmp_path, embedding_model):
+    resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path),
+                                 resident_bytes=0)
+    for namespace in ("a", "b", "c"):
+        with resources.vector_store(namespace) as store:
+            store.add_documents([f"{namespace} chunk {i}" for i in range(50)])
+            one_store = store.resident_bytes()
+    assert one_store > 0 and resources.residency_stats()["resident"] == {}
+
+    resources = ResourceRegistry(embedding_model_factory=lambda: embedding_model, base_dir=str(tmp_path),
+                                 resident_bytes=int(2.5 * one_store))
+    for namespace in ("a", "b", "c", "b"):
+        with resources.vector_store(namespace):
+            pass
+    stats = resources.residency_stats()
+    assert list(stats["resident"]) == ["c", "b"]  # "a" was the least recently used.
+    assert (stats["loads"], stats["hits"], stats["evictions"]) == (3, 1, 1)
+    assert stats["load_seconds"]["count"] == 3
+
+    # An evicted namespace is reloaded on demand; a held one is never evicted.
+    with resources.vector_store("a") as store:
+        assert store.search("a chunk 7", k=1) == ["a chunk 7"]
+        resources.resident_bytes = 1
+        with resources.vector_store("b"):
+            pass
+        assert list(resources.residency_stats()["resident"]) == ["a"]
+    assert resources.residency_stats()["resident"] == {}
+    assert resources.stats()["embedding_model_loaded"] is False
+
+    with pytest.raises(ValueError):
+        resources.acquire_vector_store("../escape")
+
+
+def test_embedding_cache_encodes_only_unseen_chunks(tmp_path, embedding_model):
+    cache = EmbeddingCache("fake-model", embedding_model.dimension, directory=str(tmp_path))
+    store = FAISSVectorStore(embedding_model=embedding_model, base_dir=str(tmp_path), embedding_cache=cache)
+    store.upsert_document("doc", ["intro", "body", "body", "outro"])
+    assert embedding_model.calls == [["intro", "body", "outro"]]
+
+    stats = EmbeddingCacheStats()
+    store.upsert_document("doc", ["intro", "new body", "outro"], cache_stats=stats)
+    assert embedding_model.calls[-1] == ["new body"]
+    assert (stats.hits, stats.misses) == (2, 1)
+    assert store.search("new body", k=1) == ["new body"]
+    cache.close()
+
+    # The cache survives a restart, and vectors come back bit-identical.
+    reopened = EmbeddingCache("fake-model", embedding_model.dimension, directory=str(tmp_path))
+    vectors = reopened.get_embeddings(["intro", "body"], embedding_model.get_embeddings)
+    assert embedding_model.calls[-1] == ["new body"]
+    assert np.array_equal(vectors, embedding_model.get_embeddings(["intro", "body"]))
+    # Another model never sees these entries.
+    other = EmbeddingCache("other-model", embedding_model.dimension, directory=str(tmp_path))
+    other.get_embeddings(["intro"], embedding_model.get_embeddings)
+    assert other.stats.misses == 1
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path, embedding_model):
+    cache = EmbeddingCache("fake-model", embedding_model.dimension, directory=str(tmp_path),
+                           max_bytes=4 * embedding_model.dimension * 4)
+    cache.get_embeddings(["a", "b", "c", "d"], embedding_model.get_embeddings)
+    cache.get_embeddings(["a"], embedding_model.get_embeddings)  # "b" is now the oldest.
+    cache.get_embeddings(["e"], embedding_model.get_embeddings)
+    assert len(cache) == 4
+
+    embedding_model.calls.clear()
+    result = cache.get_embeddings(["a", "c", "d", "e"], embedding_model.get_embeddings)
+    assert embedding_model.calls == []
+    assert np.array_equal(result, embedding_model.get_embeddings(["a", "c", "d", "e"]))
+    cache.get_embeddings(["b"], embedding_model.get_embeddings)
+    assert cache.stats.misses == 6
+
+
+def test_embedding_cache_shared_by_two_processes_never_returns_another_chunks_vector(tmp_path, embedding_model):
+    # Two caches on one directory hold separate file locks, as the app and ingest.py do.
+    def open_cache():
+        return EmbeddingCache("fake-model", embedding_model.dimension, directory=str(tmp_path),
+                              max_bytes=4 * embedding_model.dimension * 4)
+
+    app, ingest = open_cache(), open_cache()
+    texts = ["a", "b", "c", "d"]
+    app.get_embeddings(texts, embedding_model.get_embeddings)
+    # Before the app flushes, the other process fills every row with its own chunks.
+    ingest.get_embeddings(["w", "x", "y", "z"], embedding_model.get_embeddings)
+    assert np.array_equal(app.get_embeddings(texts, embedding_model.get_embeddings),
+                          embedding_model.get_embeddings(texts))
+    assert app.stats.hits == 0
+
+    # Flushed entries are picked up by the other process.
+    app.flush()
+    embedding_model.calls.clear()
+    assert np.array_equal(ingest.get_embeddings(texts, embedding_model.get_embeddings),
+                          embedding_model.get_embeddings(texts))
+    assert embedding_model.calls == [texts]
+    assert np.array_equal(ingest.get_embeddings(["w"], embedding_model.get_embeddings),
+                          embedding_model.get_embeddings(["w"]))
+    app.close()
+    ingest.close()
+
+
+def make_store(tmp_path, embedding_model, **overrides):
+    store = FAISSVectorStore(embedding_model=embedding_model, base_dir=str(tmp_path))
+    for name, value in overrides.items():
+        setattr(store, name, value)
+    return store
+
+
+def test_each_add_writes_one_segment_and_reload_replays_them(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["first chunk\nwith a newline", "second chunk"])
+    store.add_documents(["third chunk"])
+    segment_files = sorted(os.listdir(store.segments_dir))
+    assert segment_files == [
+        "seg-00000001.blocks.npy", "seg-00000001.chunkidx.npy", "seg-00000001.chunks", "seg-00000001.faiss",
+        "seg-00000001.ids.npy", "seg-00000001.npy",
+        "seg-00000002.blocks.npy", "seg-00000002.chunkidx.npy", "seg-00000002.chunks", "seg-00000002.faiss",
+        "seg-00000002.ids.npy", "seg-00000002.npy",
+        "segments.log",
+    ]
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert reloaded.ntotal == 3
+    assert reloaded.search("first chunk\nwith a newline", k=1) == ["first chunk\nwith a newline"]
+    assert reloaded.search("third chunk", k=1) == ["third chunk"]
+
+
+def test_store_is_shared_by_readers_and_locked_by_a_writer(tmp_path, embedding_model):
+    fcntl = pytest.importorskip("fcntl")
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["first chunk"])
+    store.close()
+
+    store = make_store(tmp_path, embedding_model)
+    reopened = make_store(tmp_path, embedding_model)  # The same process shares the lock.
+    lock_path = store.index_path + ".lock"
+    # A separate open file description stands in for another process.
+    with open(lock_path, "a") as other:
+        # Another process may read the store too; then neither writes it.
+        fcntl.flock(other, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        with pytest.raises(StoreLockedError):
+            store.add_documents(["second chunk"])
+        assert not store.can_write()
+        assert store.search("first chunk", k=1) == ["first chunk"]
+        fcntl.flock(other, fcntl.LOCK_UN)
+
+        # Alone, the store writes, and keeps other processes out until it is closed.
+        store.add_documents(["second chunk"])
+        with pytest.raises(BlockingIOError):
+            fcntl.flock(other, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        reopened.close()
+        with pytest.raises(BlockingIOError):
+            fcntl.flock(other, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        store.close()
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with pytest.raises(StoreLockedError):
+            make_store(tmp_path, embedding_model)
+
+
+def test_compaction_merges_segments_without_changing_results(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model, max_segments=3, merge_factor=2)
+    texts = [f"chunk number {i}" for i in range(20)]
+    for i in range(0, 20, 2):
+        store.add_documents(texts[i:i + 2])
+    store.wait_for_compaction()
+    store.compact()
+
+    assert len(store.snapshot.segments) <= 3
+    assert store.ntotal == 20
+    for text in texts:
+        assert store.search(text, k=1) == [text]
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert [s.name for s in reloaded.snapshot.segments] == [s.name for s in store.snapshot.segments]
+    assert all(reloaded.search(text, k=1) == [text] for text in texts)
+    # Files of merged-away segments are gone.
+    live = {s.name for s in store.snapshot.segments}
+    assert {f.split(".")[0] for f in os.listdir(store.segments_dir) if f.startswith("seg-")} == live
+
+
+def test_torn_log_record_is_ignored(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["kept chunk"])
+    with open(os.path.join(store.segments_dir, "segments.log"), "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "segm')
+
+    reloaded = make_store(tmp_path, embedding_model)
+    reloaded.add_documents(["later chunk"])
+    assert make_store(tmp_path, embedding_model).ntotal == 2
+
+
+def test_unloadable_segment_fails_the_open_and_keeps_the_data(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["first chunk"])
+    store.add_documents(["second chunk"])
+    store.close()
+    names = sorted(os.listdir(store.segments_dir))
+    index_path = os.path.join(store.segments_dir, [name for name in names if name.endswith(".faiss")][-1])
+    with open(index_path, "rb") as f:
+        saved = f.read()
+    with open(index_path, "wb") as f:
+        f.write(b"not a faiss index")
+
+    with pytest.raises(RuntimeError, match="Could not load"):
+        make_store(tmp_path, embedding_model)
+    assert sorted(os.listdir(store.segments_dir)) == names
+
+    with open(index_path, "wb") as f:
+        f.write(saved)
+    reloaded = make_store(tmp_path, embedding_model)
+    assert sorted(hit["text"] for hit in reloaded.search_chunks(embedding_model.vector("first chunk"), k=5)) \
+        == ["first chunk", "second chunk"]
+
+
+def test_legacy_index_is_migrated_to_segments(tmp_path, embedding_model):
+    index = faiss.IndexFlatL2(embedding_model.dimension)
+    index.add(embedding_model.get_embeddings(["legacy one", "legacy two"]))
+    faiss.write_index(index, str(tmp_path / "faiss_index"))
+    (tmp_path / "faiss_index.texts").write_text("legacy one\nlegacy two\n", encoding="utf-8")
+
+    store = make_store(tmp_path, embedding_model)
+    assert store.ntotal == 2
+    assert store.search("legacy two", k=1) == ["legacy two"]
+    assert not (tmp_path / "faiss_index").exists()
+
+
+@pytest.mark.parametrize("compression", ["zlib", "none"])
+def test_chunk_store_round_trips_text_and_metadata(tmp_path, compression):
+    records = [(f"chunk {i}\nspans lines " + "x" * (i * 37), {"document_id": f"doc-{i % 3}", "page": i, "char_start": i * 10})
+               for i in range(200)]
+    write_chunk_store(str(tmp_path), "seg", records, compression=compression, block_size=4096)
+    cache = BlockCache(capacity=2)
+    store = ChunkStore(str(tmp_path), "seg", cache=cache)
+
+    assert len(store) == 200
+    assert store.get(123) == records[123]
+    assert store.text(0) == records[0][0]
+    assert list(store) == records
+    if compression == "zlib":
+        store.get(1)
+        store.get(2)  # Same block as chunk 1, served from the LRU.
+        assert cache.hits >= 1
+    store.close()
+
+
+def test_search_results_are_cached_until_the_store_changes(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["alpha", "beta"], [{"document_id": "a"}, {"document_id": "b"}])
+    query = embedding_model.vector("beta")
+    assert store.search_chunks(query, k=1)[0]["text"] == "beta"
+    store.search_chunks(query, k=1)[0]["text"] = "mutated by a caller"
+    assert store.search_chunks(query, k=1)[0]["text"] == "beta"
+    assert store.result_cache.stats()["hits"] == 2
+
+    store.upsert_document("b", ["beta v2"])
+    assert store.search_chunks(query, k=2)[1]["text"] != "beta"
+    store.delete_document("b")
+    assert [hit["text"] for hit in store.search_chunks(query, k=2)] == ["alpha"]
+
+
+def test_answer_cache_matches_near_duplicate_queries_over_the_same_context(embedding_model):
+    now = [0.0]
+    cache = SemanticAnswerCache(embedding_model.dimension, capacity=2, threshold=0.9, ttl=10.0, clock=lambda: now[0])
+    query = embedding_model.vector("what is the invoice total")
+    fingerprint = context_fingerprint([3, 1, 2], ["ignored"])
+    cache.add("what is the invoice total", query, fingerprint, [1, 2, 3], "42 euros")
+
+    near_duplicate = query + 0.05 * embedding_model.vector("noise")
+    answer, similarity = cache.lookup(near_duplicate, context_fingerprint([1, 2, 3], []))
+    assert answer == "42 euros" and similarity > 0.9
+    assert cache.lookup(near_duplicate, context_fingerprint([1, 2, 4], [])) is None
+    assert cache.lookup(embedding_model.vector("when is the meeting"), fingerprint) is None
+
+    now[0] = 11.0
+    assert cache.lookup(query, fingerprint) is None
+    assert cache.stats()["hits"] == 1 and len(cache) == 0
+
+
+def test_answer_cache_is_invalidated_when_a_contributing_chunk_changes(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    cache = SemanticAnswerCache(embedding_model.dimension)
+    store.add_change_listener(cache.invalidate_chunks)
+    store.add_documents(["alpha", "beta", "gamma"], [{"document_id": "a"}, {"document_id": "b"}, {"document_id": "c"}])
+    ids = {hit["text"]: hit["id"] for hit in store.search_chunks(embedding_model.vector("alpha"), k=3)}
+    for name, used in (("q1", ["alpha"]), ("q2", ["beta"]), ("q3", ["gamma"])):
+        chunk_ids = [ids[text] for text in used]
+        cache.add(name, embedding_model.vector(name), context_fingerprint(chunk_ids, used), chunk_ids, name)
+
+    store.delete_document("a")
+    store.upsert_document("b", ["beta v2"])
+    assert sorted(entry.query for entry in cache._entries.values()) == ["q3"]
+    store.clear_index()
+    assert len(cache) == 0
+
+
+def test_search_returns_metadata_for_hits(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["alpha", "beta"], [{"document_id": "a", "source": "a.txt"}, {"document_id": "b", "source": "b.txt"}])
+    hits = store.search_chunks(embedding_model.vector("beta"), k=1)
+    assert hits[0]["text"] == "beta"
+    assert hits[0]["metadata"] == {"document_id": "b", "source": "b.txt"}
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-4)
+
+
+def test_delete_and_upsert_touch_only_the_document(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model, max_segments=100)
+    for name in ("a", "b", "c"):
+        store.add_documents([f"{name} chunk {i}" for i in range(10)], [{"document_id": name}] * 10)
+    ids_before = [hit["id"] for hit in store.search_chunks(embedding_model.vector("c chunk 3"), k=1)]
+
+    store.upsert_document("b", ["b rewritten 0", "b rewritten 1"])
+    assert store.delete_document("a") == 10
+    assert store.delete_document("missing") == 0
+
+    assert store.ntotal == 12
+    live = sorted([f"c chunk {i}" for i in range(10)] + ["b rewritten 0", "b rewritten 1"])
+    assert sorted(store.search("a chunk 1", k=20)) == live
+    assert store.search("b rewritten 1", k=1) == ["b rewritten 1"]
+    assert [hit["id"] for hit in store.search_chunks(embedding_model.vector("c chunk 3"), k=1)] == ids_before
+
+    store.wait_for_compaction()
+    reloaded = make_store(tmp_path, embedding_model)
+    assert reloaded.ntotal == 12
+    assert sorted(reloaded.document_ids()) == ["b", "c"]
+    assert reloaded.search("b chunk 1", k=3) == store.search("b chunk 1", k=3)
+
+
+def test_compaction_purges_tombstoned_chunks(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model, max_segments=100, tombstone_ratio=0.3)
+    store.add_documents([f"keep {i}" for i in range(10)], [{"document_id": "keep"}] * 10)
+    store.add_documents([f"drop {i}" for i in range(10)], [{"document_id": "drop"}] * 10)
+    store.delete_document("drop")
+    store.wait_for_compaction()
+
+    assert [s.size for s in store.snapshot.segments] == [10]
+    assert store.snapshot.tombstones.count == 0
+    assert store.search("drop 3", k=3)[0].startswith("keep")
+    # Ids survive the rewrite, so a re-upsert of a document still replaces it.
+    store.upsert_document("keep", ["keep again"])
+    store.wait_for_compaction()
+    reloaded = make_store(tmp_path, embedding_model)
+    assert reloaded.ntotal == 1
+    assert reloaded.search("keep 1", k=5) == ["keep again"]
+
+
+def test_pinned_snapshot_keeps_compacted_segments_readable(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model, max_segments=100)
+    for i in range(3):
+        store.add_documents([f"segment {i} chunk {j}" for j in range(4)])
+
+    def segment_files(names):
+        return [name for name in names if os.path.exists(os.path.join(store.segments_dir, name + ".npy"))]
+
+    with store.pin() as snapshot:
+        old = [segment.name for segment in snapshot.segments]
+        store.max_segments = 1
+        store.compact()
+        assert len(store.snapshot.segments) == 1 and store.snapshot.version == snapshot.version
+        # The merged-away segments stay on disk and readable while the snapshot is pinned.
+        assert segment_files(old) == old
+        assert snapshot.segments[2].chunks.get(3)[0] == "segment 2 chunk 3"
+        assert store.snapshot_stats()["retired_segments"] == 3
+    assert segment_files(old) == []
+    assert store.snapshot_stats() == {"version": snapshot.version, "pinned_snapshots": 0, "retired_segments": 0}
+
+
+def test_searches_stay_consistent_during_heavy_ingestion(tmp_path, embedding_model):
+    store = make_store(tmp_path, embedding_model, max_segments=4, merge_factor=2)
+    anchors = [f"anchor chunk {i}" for i in range(5)]
+    store.add_documents(anchors, [{"document_id": "anchors"}] * 5)
+    store.upsert_document("churn", [f"churn seed part {j}" for j in range(4)], [{"batch": -1}] * 4)
+    done = threading.Event()
+    errors, searches = [], []
+
+    def ingest():
+        try:
+            for batch in range(40):
+                # Every version of "churn" has 4 chunks tagged with the batch that wrote it.
+                store.upsert_document("churn", [f"churn {batch} part {j}" for j in range(4)], [{"batch": batch}] * 4)
+                store.add_documents([f"bulk {batch} chunk {j}" for j in range(16)], [{"document_id": f"bulk-{batch}"}] * 16)
+                if batch % 2:
+                    store.delete_document(f"bulk-{batch - 1}")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def search(reader: int):
+        query = embedding_model.vector("churn")
+        count = 0
+        try:
+            while not done.is_set():
+                anchor = anchors[(reader + count) % len(anchors)]
+                assert store.search(anchor, k=1) == [anchor]
+                hits = store.search_chunks(query, k=8, document_ids=["churn"])
+                # A search sees exactly one version of the document, never a mix or none.
+                assert len(hits) == 4 and len({hit["metadata"]["batch"] for hit in hits}) == 1
+                count += 1
+        except Exception as e:
+            errors.append(e)
+        searches.append(count)
+
+    threads = [threading.Thread(target=ingest)] + [threading.Thread(target=search, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.wait_for_compaction()
+
+    assert errors == []
+    assert min(searches) > 0
+    assert store.snapshot_stats()["pinned_snapshots"] == 0 and store.snapshot_stats()["retired_segments"] == 0
+    live = {segment.name for segment in store.snapshot.segments}
+    assert {f.split(".")[0] for f in os.listdir(store.segments_dir) if f.startswith("seg-")} == live
+    reloaded = make_store(tmp_path, embedding_model)
+    assert reloaded.ntotal == store.ntotal == 5 + 4 + 20 * 16
+    assert sorted(reloaded.document_ids()) == sorted(store.document_ids())
+
+
+@pytest.mark.parametrize("brute_force_ratio,batch_max_ids", [(1.0, 4096), (0.0, 4096), (0.0, 1)])
+def test_search_is_restricted_to_document_ids(tmp_path, embedding_model, brute_force_ratio, batch_max_ids):
+    # Exact scan, then FAISS with batch and bitmap selectors.
+    store = make_store(tmp_path, embedding_model, filter_brute_force_ratio=brute_force_ratio,
+                       filter_batch_max_ids=batch_max_ids)
+    for name in ("a", "b", "c"):
+        store.add_documents([f"{name} chunk {i}" for i in range(20)], [{"document_id": name}] * 20)
+    store.add_documents(["a chunk 20"], [{"document_id": "a"}])
+    query = embedding_model.vector("b chunk 4")
+
+    assert store.search_chunks(query, k=1, document_ids=["b"])[0]["text"] == "b chunk 4"
+    hits = store.search_chunks(query, k=50, document_ids=["a", "c"])
+    assert sorted(hit["text"] for hit in hits) == sorted([f"a chunk {i}" for i in range(21)] + [f"c chunk {i}" for i in range(20)])
+    assert [hit["distance"] for hit in hits] == sorted(hit["distance"] for hit in hits)
+    assert store.search_chunks(query, k=5, document_ids=["missing"]) == []
+
+    store.upsert_document("b", ["b replaced"])
+    assert [hit["text"] for hit in store.search_chunks(query, k=5, document_ids=["b"])] == ["b replaced"]
+
+
+def test_bitmap_filter_is_bounded_by_its_bitmap():
+    id_filter = _IdFilter([(0, 3), (9, 12)], id_limit=12, batch_max_ids=1)
+    assert id_filter.kind == "bitmap" and id_filter.selector.n == len(id_filter._bitmap) == 2
+    members = [chunk_id for chunk_id in range(200) if id_filter.selector.is_member(chunk_id)]
+    assert members == [0, 1, 2, 9, 10, 11]
+
+
+def clustered_vectors(count, dimension=16, clusters=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    points = centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dimension))
+    return points.astype(np.float32)
+
+
+@pytest.mark.parametrize("index_type,min_recall", [("ivf_flat", 0.9), ("ivf_pq", 0.5), ("hnsw", 0.9)])
+def test_ann_index_is_trained_once_enough_vectors_exist(monkeypatch, index_type, min_recall):
+    monkeypatch.setattr(settings, "FAISS_ANN_MIN_VECTORS", 2000)
+    monkeypatch.setattr(settings, "FAISS_PQ_M", 8)
+    monkeypatch.setattr(settings, "FAISS_PQ_NBITS", 6)
+    vectors = clustered_vectors(4000)
+
+    assert index_type_of(build_index(vectors[:500], index_type)) == "flat"
+    index = build_index(vectors, index_type)
+    assert index_type_of(index) == index_type
+    assert index.ntotal == len(vectors)
+
+    queries = vectors[:50] + 0.05
+    _, expected = build_index(vectors, "flat").search(queries, 10)
+    _, found = index.search(queries, 10)
+    recall = np.mean([len(set(e) & set(f)) / 10 for e, f in zip(expected, found)])
+    assert recall >= min_recall
+
+
+def test_compaction_builds_and_persists_trained_segments(tmp_path, monkeypatch, embedding_model):
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_ANN_MIN_VECTORS", 300)
+    monkeypatch.setattr(settings, "FAISS_IVF_NLIST", 4)
+    store = make_store(tmp_path, embedding_model, max_segments=1, merge_factor=4)
+    texts = [f"chunk number {i}" for i in range(400)]
+    for i in range(0, 400, 100):
+        store.add_documents(texts[i:i + 100])
+        store.wait_for_compaction()
+    store.compact()
+
+    [segment] = store.snapshot.segments
+    assert index_type_of(segment.index) == "ivf_flat"
+    assert os.path.exists(os.path.join(store.segments_dir, segment.name + ".faiss"))
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert index_type_of(reloaded.snapshot.segments[0].index) == "ivf_flat"
+    for text in texts[::37]:
+        hits = reloaded.search_chunks(embedding_model.vector(text), k=1, nprobe=4)
+        assert hits[0]["text"] == text
+
+
+def test_reload_maps_saved_indexes_instead_of_rebuilding_them(tmp_path, monkeypatch, embedding_model):
+    # Small segments stay Flat under an IVF setting; they must not be rebuilt on every startup either.
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_ANN_MIN_VECTORS", 300)
+    store = make_store(tmp_path, embedding_model)
+    texts = [f"chunk number {i}" for i in range(60)]
+    store.add_documents(texts[:30])
+    store.add_documents(texts[30:])
+    index_files = [os.path.join(store.segments_dir, segment.name + ".faiss") for segment in store.snapshot.segments]
+    saved = [os.stat(path).st_mtime_ns for path in index_files]
+    queries = [embedding_model.vector(text) for text in texts[::7]]
+    expected = [[hit["id"] for hit in store.search_chunks(query, k=3)] for query in queries]
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert [os.stat(path).st_mtime_ns for path in index_files] == saved
+    assert [[hit["id"] for hit in reloaded.search_chunks(query, k=3)] for query in queries] == expected
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps") as f:
+            mapped = f.read()
+        assert all(path in mapped for path in index_files)
+
+    monkeypatch.setattr(settings, "FAISS_MMAP_INDEXES", False)
+    in_memory = make_store(tmp_path, embedding_model)
+    assert [[hit["id"] for hit in in_memory.search_chunks(query, k=3)] for query in queries] == expected
+
+    # faiss releases without IO_FLAG_MMAP_IFC read indexes into memory even when mapping is configured.
+    monkeypatch.setattr(settings, "FAISS_MMAP_INDEXES", True)
+    monkeypatch.setattr(segments, "_MMAP_FLAG", None)
+    unmappable = make_store(tmp_path, embedding_model)
+    unmappable.add_documents(["chunk added without mmap support"])
+    assert [[hit["id"] for hit in unmappable.search_chunks(query, k=3)] for query in queries] == expected
+
+
+def test_flat_store_is_upgraded_online_and_the_upgrade_survives_restarts(tmp_path, monkeypatch, embedding_model):
+    monkeypatch.setattr(settings, "FAISS_ANN_MIN_VECTORS", 300)
+    monkeypatch.setattr(settings, "FAISS_UPGRADE_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(settings, "FAISS_UPGRADE_MIN_VECTORS", 800)
+    monkeypatch.setattr(settings, "FAISS_UPGRADE_CHECK_SECONDS", 0.0)
+    store = make_store(tmp_path, embedding_model)
+    texts = [f"chunk number {i}" for i in range(1000)]
+    store.add_documents(texts[:400])
+    store.maintenance.wait()
+    assert store.index_type == "flat"  # Below the size threshold.
+
+    errors, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            for text in texts[:400:50]:
+                if store.search_chunks(embedding_model.vector(text), k=1)[0]["text"] != text:
+                    errors.append(text)
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    store.add_documents(texts[400:800])  # Crosses the threshold: the upgrade starts in the background.
+    store.add_documents(texts[800:])  # Written while the first segments are rebuilt.
+    store.maintenance.wait()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert store.index_type == "hnsw"
+    assert [index_type_of(segment.index) for segment in store.snapshot.segments] == ["hnsw", "hnsw", "flat"]
+    assert store.maintenance.stats()["rebuilt_segments"] == 2
+    for text in texts[::97]:
+        assert store.search_chunks(embedding_model.vector(text), k=1)[0]["text"] == text
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert reloaded.index_type == "hnsw"
+    assert reloaded.maintenance.stale_segments() == []
+
+    # Changing FAISS_INDEX_TYPE supersedes the upgrade; old indexes serve until they are rebuilt.
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_IVF_NLIST", 4)
+    reconfigured = make_store(tmp_path, embedding_model)
+    assert reconfigured.search_chunks(embedding_model.vector(texts[5]), k=1, nprobe=4)[0]["text"] == texts[5]
+    reconfigured.maintenance.wait()
+    assert reconfigured.index_type == "ivf_flat"
+    assert [index_type_of(segment.index) for segment in reconfigured.snapshot.segments] == ["ivf_flat", "ivf_flat",
+                                                                                           "flat"]
+
+
+def test_compaction_survives_a_segment_index_rebuilt_while_it_merges(tmp_path, monkeypatch, embedding_model):
+    store = make_store(tmp_path, embedding_model)
+    texts = [f"chunk number {i}" for i in range(90)]
+    for i in range(0, 90, 30):
+        store.add_documents(texts[i:i + 30])
+    store.wait_for_compaction()
+    build_segment, rebuilt = faiss_store.build_segment, []
+
+    def build_segment_during_a_rebuild(*args, **kwargs):
+        # The maintenance thread swaps in a new index for a segment being merged.
+        rebuilt.append(store.rebuild_segment_index(store.snapshot.segments[1]))
+        return build_segment(*args, **kwargs)
+
+    monkeypatch.setattr(faiss_store, "build_segment", build_segment_during_a_rebuild)
+    store.max_segments, store.merge_factor = 1, 3
+    store.compact()
+
+    assert rebuilt == [True]
+    assert len(store.snapshot.segments) == 1 and store.ntotal == 90
+    reloaded = make_store(tmp_path, embedding_model)
+    assert len(reloaded.snapshot.segments) == 1
+    for text in texts[::11]:
+        assert reloaded.search_chunks(embedding_model.vector(text), k=1)[0]["text"] == text
+
+
+@pytest.mark.parametrize("codec", ["fp16", "sq8", "binary", "pca"])
+def test_compressed_segments_are_rescored_exactly(tmp_path, monkeypatch, embedding_model, codec):
+    monkeypatch.setattr(settings, "FAISS_VECTOR_CODEC", codec)
+    monkeypatch.setattr(settings, "FAISS_CODEC_MIN_VECTORS", 100)
+    monkeypatch.setattr(settings, "FAISS_PCA_DIMENSION", 4)
+    texts = [f"chunk number {i}" for i in range(400)]
+    store, exact = make_store(tmp_path, embedding_model), make_store(tmp_path / "exact", embedding_model,
+                                                                      vector_codec="none")
+    for each in (store, exact):
+        each.add_documents(texts[:200], [{"document_id": "a"}] * 200)
+        each.add_documents(texts[200:], [{"document_id": "b"}] * 200)
+        each.add_documents(["small segment"])  # Below FAISS_CODEC_MIN_VECTORS: stays float32.
+    assert [segment.codec for segment in store.snapshot.segments] == [codec, codec, "none"]
+    index_bytes = [os.path.getsize(os.path.join(store.segments_dir, segment.name + ".faiss"))
+                   for segment in store.snapshot.segments[:2]]
+    assert all(size < 200 * 16 * 4 for size in index_bytes)
+
+    # Rescored hits carry exact float distances, comparable with those of float segments.
+    queries = [embedding_model.vector(text) for text in texts[::23]]
+    for query in queries:
+        hits = store.search_chunks(query, k=3)
+        assert hits[0]["id"] == exact.search_chunks(query, k=1)[0]["id"]
+        assert np.allclose([hit["distance"] for hit in hits],
+                           [((embedding_model.vector(hit["text"]) - query) ** 2).sum() for hit in hits], atol=1e-4)
+    # Over-fetching every chunk, rescoring reproduces the exact ranking.
+    store.rescore_factor = 200
+    store.result_cache.clear()
+    for query in queries:
+        expected = [hit["id"] for hit in exact.search_chunks(query, k=3)]
+        assert [hit["id"] for hit in store.search_chunks(query, k=3)] == expected
+    query = embedding_model.vector(texts[250])
+    assert store.search_chunks(query, k=1, document_ids=["a"])[0]["metadata"]["document_id"] == "a"
+    assert store.search_chunks(query, k=1, document_ids=["b"])[0]["text"] == texts[250]
+
+    # Without rescoring, the codes alone still find the stored vector itself.
+    store.rescore_factor = 0
+    store.result_cache.clear()
+    assert store.search_chunks(query, k=1)[0]["text"] == texts[250]
+
+    reloaded = make_store(tmp_path, embedding_model)
+    assert [codec_of(segment.index) for segment in reloaded.snapshot.segments] == [codec, codec, "none"]
+    assert reloaded.maintenance.stale_segments() == []
+
+
+def test_binary_codec_is_rejected_on_faiss_releases_without_rabitq(tmp_path, monkeypatch, embedding_model):
+    monkeypatch.setattr(index_factory, "_RABITQ_INDEXES", ())
+    store = make_store(tmp_path, embedding_model)
+    store.add_documents(["a chunk stored and searched as before"])
+    assert codec_of(store.snapshot.segments[0].index) == "none"
+    assert store.search_chunks(embedding_model.vector("a chunk stored and searched as before"), k=1)
+
+    monkeypatch.setattr(settings, "FAISS_VECTOR_CODEC", "binary")
+    with pytest.raises(ValueError, match="binary"):
+        make_store(tmp_path / "binary", embedding_model)
@@ -1,13 +1,14 @@
 import streamlit as st
 import asyncio
 import logging
+import uuid
 from ui.components import file_uploader_component, chat_input_component, message_display_component, clear_chat_button
 from mcp.message_bus import InMemoryMessageBus
 from agents.coordinator import Coordinator
 from agents.ingestion_agent import IngestionAgent
 from agents.retrieval_agent import RetrievalAgent
 from agents.llm_agent import LLMAgent
-from mcp.message_types import MessageType, MCPMessage
+from mcp.message_types import MessageType, MCPMessage, LLMResponsePayload, LLMStreamDeltaPayload
 from utils.helpers import generate_unique_id
 from config.settings import settings
 import os
@@ -30,6 +31,12 @@ class ChatInterface:
             st.session_state.messages = []
         if "file_processed" not in st.session_state:
             st.session_state.file_processed = False
+        if "streaming_trace_id" not in st.session_state:
+            st.session_state.streaming_trace_id = None
+        if "namespace" not in st.session_state:
+            # A session namespace keeps this session's uploads out of everyone else's searches.
+            st.session_state.namespace = (f"session-{uuid.uuid4().hex}" if settings.VECTOR_STORE_SESSION_NAMESPACES
+                                          else settings.VECTOR_STORE_DEFAULT_NAMESPACE)
 
         # self.setup_mcp_handlers() # Handlers will be registered in agent setup
         logger.info("ChatInterface initialized.")
@@ -53,14 +60,28 @@ class ChatInterface:
                 st.session_state.messages.append({"role": "assistant", "content": f"Document processing failed: {message.payload.message}"})
             st.rerun() # Trigger rerun to update UI
 
+        async def handle_llm_stream_delta(message: MCPMessage):
+            # The first delta replaces the "Thinking..." placeholder; later ones extend it.
+            delta = LLMStreamDeltaPayload(**message.payload)
+            if st.session_state.streaming_trace_id != delta.trace_id:
+                st.session_state.streaming_trace_id = delta.trace_id
+                st.session_state.messages[-1] = {"role": "assistant", "content": ""}
+            st.session_state.messages[-1]["content"] += delta.delta
+            st.rerun() # Trigger rerun to update UI
+
         async def handle_llm_response(message: MCPMessage):
-            if message.payload.status == "success":
-                st.session_state.messages.append({"role": "assistant", "content": message.payload.response})
+            # Failures arrive as ERROR messages; an LLM_RESPONSE always carries the full answer.
+            content = LLMResponsePayload(**message.payload).response
+            if st.session_state.streaming_trace_id == message.trace_id:
+                # The summary carries the full text, including any deltas still in flight.
+                st.session_state.messages[-1] = {"role": "assistant", "content": content}
+                st.session_state.streaming_trace_id = None
             else:
-                st.session_state.messages.append({"role": "assistant", "content": f"Error: {message.payload.response}"})
+                st.session_state.messages.append({"role": "assistant", "content": content})
             st.rerun() # Trigger rerun to update UI
 
         asyncio.create_task(self.message_bus.register_handler(MessageType.INGESTION_RESPONSE, handle_ingestion_response))
+        asyncio.create_task(self.message_bus.register_handler(MessageType.LLM_STREAM_DELTA, handle_llm_stream_delta))
         asyncio.create_task(self.message_bus.register_handler(MessageType.LLM_RESPONSE, handle_llm_response))
 
     async def run(self):
@@ -88,7 +109,8 @@ class ChatInterface:
                 ingestion_payload = {
                     "request_id": request_id,
                     "file_path": file_path,
-                    "file_type": os.path.splitext(uploaded_file.name)[1]
+                    "file_type": os.path.splitext(uploaded_file.name)[1],
+                    "namespace": st.session_state.namespace
                 }
                 await self.coordinator.send_message(MessageType.INGESTION_REQUEST, ingestion_payload)
                 st.session_state.messages.append({"role": "user", "content": f"Uploaded file: {uploaded_file.name}"})
@@ -104,7 +126,8 @@ class ChatInterface:
             request_id = generate_unique_id(user_query)
             query_payload = {
                 "request_id": request_id,
-                "query": user_query
+                "query": user_query,
+                "namespace": st.session_state.namespace
             }
             await self.coordinator.send_message(MessageType.RETRIEVAL_REQUEST, query_payload)
             st.session_state.messages.append({"role": "assistant", "content": "Thinking..."})
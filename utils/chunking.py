@@ -1,16 +1,231 @@
-from typing import List
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from config.settings import settings
 
+logger = logging.getLogger(__name__)
+
 def chunk_text(text: str, chunk_size: int = settings.CHUNK_SIZE, chunk_overlap: int = settings.CHUNK_OVERLAP) -> List[str]:
     """Chunks a given text into smaller pieces with a specified overlap."""
+    return list(chunk_stream([text], chunk_size, chunk_overlap))
+
+def chunk_stream(pieces: Iterable[str], chunk_size: int = settings.CHUNK_SIZE,
+                 chunk_overlap: int = settings.CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Chunks text that arrives in pieces (pages, slides, paragraphs, row blocks) as it
+    arrives. Yields exactly the chunks `chunk_text` would yield for the concatenated
+    pieces, while holding only the unfinished tail and the current piece in memory.
+    """
     if chunk_overlap >= chunk_size:
         raise ValueError("Chunk overlap must be less than chunk size.")
 
-    chunks = []
+    step = chunk_size - chunk_overlap
+    buffer = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        # The tail carried over is shorter than a chunk, so this copy stays small.
+        buffer += piece
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            yield buffer[start:start + chunk_size]
+            start += step
+        buffer = buffer[start:]
     start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start += chunk_size - chunk_overlap
-    return chunks
\ No newline at end of file
+    while start < len(buffer):
+        yield buffer[start:start + chunk_size]
+        start += step
+
+def join_pieces(pieces: Iterable[str], separator: str) -> Iterator[str]:
+    """Yields `pieces` with `separator` between them, like a lazy `separator.join(pieces)`."""
+    first = True
+    for piece in pieces:
+        if not first:
+            yield separator
+        first = False
+        yield piece
+
+# Boundaries the token chunker may split at: paragraph breaks, sentence ends, line breaks.
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|(?<=[.!?])\s+|\n")
+# Words and punctuation, the approximation used when no tokenizer can be loaded.
+_APPROXIMATE_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Text without any boundary is split by words once the pending tail grows past this.
+_MAX_PENDING_CHARS = 64 * 1024
+# A paragraph break ends a chunk once it is at least this full.
+_PARAGRAPH_FILL = 0.5
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+def approximate_token_counts(texts: List[str]) -> List[int]:
+    """Counts words and punctuation marks; word-piece tokenizers produce at least as many tokens."""
+    return [len(_APPROXIMATE_TOKEN.findall(text)) for text in texts]
+
+@lru_cache(maxsize=None)
+def embedding_token_counter(model_name: str = settings.EMBEDDING_MODEL_NAME) -> TokenCounter:
+    """
+    Returns a batch token counter backed by the embedding model's tokenizer, loaded
+    once per process. Falls back to `approximate_token_counts` if it cannot be loaded.
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model_name}, approximating token counts: {e}")
+        return approximate_token_counts
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+class CharacterChunker:
+    """Fixed-size character windows with overlap, see `chunk_stream`."""
+    def __init__(self, chunk_size: int = settings.CHUNK_SIZE, chunk_overlap: int = settings.CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def chunk_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        return chunk_stream(pieces, self.chunk_size, self.chunk_overlap)
+
+class TokenChunker:
+    """
+    Packs whole sentences into chunks of at most `max_tokens` tokens of the embedding
+    model's tokenizer, so no part of a chunk is truncated away when it is embedded.
+
+    Text is split at paragraph, sentence and line boundaries in one pass over the
+    pieces, and every sentence is tokenized once. A chunk ends early at a paragraph
+    break once it is half full; otherwise consecutive chunks share up to
+    `overlap_tokens` tokens of trailing sentences. A sentence longer than the budget
+    is split between words.
+    """
+    def __init__(self, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+                 count_tokens: Optional[TokenCounter] = None):
+        """
+        Initializes the TokenChunker.
+
+        Args:
+            max_tokens (int, optional): Token budget per chunk. Defaults to the embedding
+                model's sequence limit minus its two special tokens.
+            overlap_tokens (int, optional): Overrides `settings.CHUNK_OVERLAP_TOKENS`.
+            count_tokens (callable, optional): Maps a list of texts to their token counts.
+                Defaults to the embedding model's tokenizer.
+        """
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS or settings.EMBEDDING_MAX_TOKENS - 2
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        if self.overlap_tokens >= self.max_tokens:
+            raise ValueError("Chunk overlap must be less than the chunk token budget.")
+        self._count_tokens = count_tokens
+
+    @property
+    def count_tokens(self) -> TokenCounter:
+        if self._count_tokens is None:
+            self._count_tokens = embedding_token_counter()
+        return self._count_tokens
+
+    def _units(self, text: str, final: bool) -> Tuple[List[Tuple[str, bool]], str]:
+        """
+        Splits text into (sentence including its trailing separator, ends paragraph)
+        units. Returns the units and the unfinished tail, which is empty when `final`.
+        """
+        units = []
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            end = match.end()
+            if end == len(text) and not final:
+                break  # The separator may continue in the next piece.
+            units.append((text[start:end], match.group().count("\n") > 1))
+            start = end
+        tail = text[start:]
+        if tail and (final or len(tail) > _MAX_PENDING_CHARS):
+            units.append((tail, False))
+            tail = ""
+        return units, tail
+
+    def _split_long(self, sentence: str) -> Iterator[str]:
+        """Splits a sentence over the budget into word runs that fit it."""
+        words = re.findall(r"\S+\s*", sentence)
+        counts = self.count_tokens(words)
+        run, total = [], 0
+        for word, tokens in zip(words, counts):
+            if run and total + tokens > self.max_tokens:
+                yield "".join(run)
+                run, total = [], 0
+            run.append(word)
+            total += tokens
+        if run:
+            yield "".join(run)
+
+    def chunk_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Yields token-bounded chunks of text that arrives in pieces."""
+        current: List[Tuple[str, int]] = []
+        total = 0
+
+        def flush(keep_overlap: bool):
+            nonlocal current, total
+            chunk = "".join(text for text, _ in current).strip()
+            kept, kept_tokens = [], 0
+            if keep_overlap:
+                for text, tokens in reversed(current):
+                    if kept_tokens + tokens > self.overlap_tokens:
+                        break
+                    kept.insert(0, (text, tokens))
+                    kept_tokens += tokens
+            current, total = kept, kept_tokens
+            return chunk
+
+        pending = ""
+        iterator = iter(pieces)
+        final = False
+        while not final:
+            piece = next(iterator, None)
+            final = piece is None
+            if not final and not piece:
+                continue
+            units, pending = self._units(pending + (piece or ""), final)
+            if not units:
+                continue
+            counts = self.count_tokens([text for text, _ in units])
+            for (text, paragraph_end), tokens in zip(units, counts):
+                if tokens > self.max_tokens:
+                    if current:
+                        chunk = flush(keep_overlap=False)
+                        if chunk:
+                            yield chunk
+                    for part in self._split_long(text):
+                        if part.strip():
+                            yield part.strip()
+                    continue
+                if current and total + tokens > self.max_tokens:
+                    chunk = flush(keep_overlap=True)
+                    if chunk:
+                        yield chunk
+                    # The overlap must leave room for the new sentence.
+                    while current and total + tokens > self.max_tokens:
+                        total -= current.pop(0)[1]
+                current.append((text, tokens))
+                total += tokens
+                if paragraph_end and total >= _PARAGRAPH_FILL * self.max_tokens:
+                    chunk = flush(keep_overlap=False)
+                    if chunk:
+                        yield chunk
+        if current:
+            chunk = flush(keep_overlap=False)
+            if chunk:
+                yield chunk
+
+CHUNKERS = {
+    "characters": CharacterChunker,
+    "tokens": TokenChunker,
+}
+
+def get_chunker(processor_name: Optional[str] = None):
+    """
+    Returns the chunker configured for a processor: the one `settings.CHUNKER_BY_PROCESSOR`
+    names for it, else `settings.CHUNKER`.
+    """
+    name = settings.CHUNKER_BY_PROCESSOR.get(processor_name, settings.CHUNKER)
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {name}. Expected one of {sorted(CHUNKERS)}.")
+    return CHUNKERS[name]()
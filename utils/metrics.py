@@ -0,0 +1,34 @@
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+class LatencyStats:
+    """
+    Keeps the most recent `window` samples of a latency (in seconds) and reports the
+    count, mean and percentiles over them. Thread-safe.
+    """
+    def __init__(self, window: int = 1024):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the total count and the mean/p50/p95/max of the recent samples, in seconds."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+        return {
+            "count": self.count,
+            "mean": round(sum(samples) / len(samples), 4),
+            "p50": round(percentile(0.5), 4),
+            "p95": round(percentile(0.95), 4),
+            "max": round(samples[-1], 4),
+        }
@@ -1,2 +1,6 @@
 from .embeddings import EmbeddingModel
-from .faiss_store import FAISSVectorStore
\ No newline at end of file
+from .batching import BatchingEmbeddingService
+from .answer_cache import SemanticAnswerCache
+from .embedding_cache import EmbeddingCache, EmbeddingCacheStats
+from .faiss_store import FAISSVectorStore
+from .registry import ResourceRegistry, registry
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def context_fingerprint(context_ids: Optional[Sequence[int]], context: Sequence[str]) -> str:
+    """
+    Fingerprints the set of chunks an answer was generated from: their stable ids if
+    known, otherwise their texts. Order does not matter.
+    """
+    if context_ids:
+        parts = [str(chunk_id) for chunk_id in sorted(set(context_ids))]
+    else:
+        parts = sorted(set(context))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class _Entry:
+    def __init__(self, query: str, fingerprint: str, chunk_ids: List[int], answer: Any, expires_at: Optional[float]):
+        self.query = query
+        self.fingerprint = fingerprint
+        self.chunk_ids = chunk_ids
+        self.answer = answer
+        self.expires_at = expires_at
+
+class SemanticAnswerCache:
+    """
+    Caches LLM answers by the meaning of the question and the context it was answered from.
+
+    A lookup finds past queries whose embeddings have cosine similarity of at least
+    `threshold` with the new one (an inner-product FAISS index over normalized query
+    embeddings) and returns the answer of the most similar one that was generated
+    from the same context set. Entries expire after `ttl` seconds, the least recently
+    used is evicted beyond `capacity`, and `invalidate_chunks` drops every answer that
+    used a deleted or updated chunk.
+    """
+    def __init__(self, dimension: int, capacity: Optional[int] = None, threshold: Optional[float] = None,
+                 ttl: Optional[float] = None, candidates: int = 8, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the SemanticAnswerCache.
+
+        Args:
+            dimension (int): The query embedding dimension.
+            capacity (int, optional): Overrides `settings.ANSWER_CACHE_SIZE`.
+            threshold (float, optional): Overrides `settings.ANSWER_CACHE_SIMILARITY`.
+            ttl (float, optional): Overrides `settings.ANSWER_CACHE_TTL`.
+            candidates (int): Nearest past queries examined per lookup.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.capacity = capacity or settings.ANSWER_CACHE_SIZE
+        self.threshold = settings.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.candidates = candidates
+        self._clock = clock
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, query_embedding: np.ndarray, fingerprint: str) -> Optional[Tuple[Any, float]]:
+        """
+        Returns (answer, similarity) of the closest cached query with the same context
+        fingerprint, or None.
+        """
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            if self._entries:
+                similarities, ids = self._index.search(vector, min(self.candidates, len(self._entries)))
+                now = self._clock()
+                for similarity, entry_id in zip(similarities[0], ids[0]):
+                    if entry_id == -1 or similarity < self.threshold:
+                        break
+                    entry = self._entries.get(int(entry_id))
+                    if entry is None or entry.fingerprint != fingerprint:
+                        continue
+                    if entry.expires_at is not None and now >= entry.expires_at:
+                        self._remove([int(entry_id)])
+                        continue
+                    self._entries.move_to_end(int(entry_id))
+                    self.hits += 1
+                    return entry.answer, float(similarity)
+            self.misses += 1
+            return None
+
+    def add(self, query: str, query_embedding: np.ndarray, fingerprint: str,
+            chunk_ids: Optional[Sequence[int]], answer: Any):
+        """Caches an answer generated for `query` from the context with `fingerprint`."""
+        vector = self._normalize(query_embedding)
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = _Entry(query, fingerprint, list(chunk_ids or []), answer, expires_at)
+            if len(self._entries) > self.capacity:
+                self._remove([next(iter(self._entries))])
+
+    def invalidate_chunks(self, ranges: Optional[List[Tuple[int, int]]]):
+        """
+        Drops the answers that used any chunk id in `ranges` (half-open id ranges).
+        None drops every answer.
+        """
+        with self._lock:
+            if ranges is None:
+                stale = list(self._entries)
+            else:
+                stale = [entry_id for entry_id, entry in self._entries.items()
+                         if any(start <= chunk_id < end for chunk_id in entry.chunk_ids for start, end in ranges)]
+            if stale:
+                self._remove(stale)
+                self.invalidations += len(stale)
+                logger.info(f"Invalidated {len(stale)} cached answers.")
+
+    def _remove(self, entry_ids: List[int]):
+        """Removes entries from the map and the index. Needs the lock."""
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the entry count and hit/miss/invalidation counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from vector_store.query_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class BatchingEmbeddingService:
+    """
+    An async front-end for an EmbeddingModel that coalesces concurrent requests.
+
+    Callers await `embed(text)`. Requests are collected until either `max_batch_size`
+    texts are waiting or `max_wait_ms` has passed since the first one arrived, then
+    encoded in a single `get_embeddings` call on a background thread. While a batch
+    is being encoded, new requests keep accumulating, so batches grow with load.
+
+    Embeddings of recently seen texts are served from an LRU/TTL cache without
+    waiting for a batch at all.
+    """
+    def __init__(self, embedding_model, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 cache: Optional[TTLCache] = None):
+        """
+        Initializes the BatchingEmbeddingService.
+
+        Args:
+            embedding_model: The EmbeddingModel used to encode batches.
+            max_batch_size (int, optional): Maximum texts per encode call.
+            max_wait_ms (float, optional): Maximum time a request waits for a batch to fill.
+            cache (TTLCache, optional): Text to embedding cache. Defaults to one sized by
+                `settings.QUERY_EMBEDDING_CACHE_SIZE` and `settings.QUERY_EMBEDDING_CACHE_TTL`.
+        """
+        self.embedding_model = embedding_model
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self.max_wait = (settings.EMBEDDING_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batch")
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._encoding = False
+        self.cache = cache or TTLCache(settings.QUERY_EMBEDDING_CACHE_SIZE, settings.QUERY_EMBEDDING_CACHE_TTL)
+        self.batches = 0
+        self.requests = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embeds a single text, sharing the encode call with concurrent requests.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            np.ndarray: A float32 vector of shape (dimension,).
+        """
+        self.requests += 1
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds several texts, returning a float32 array of shape (len(texts), dimension).
+        """
+        if not texts:
+            return np.empty((0, self.embedding_model.dimension), dtype=np.float32)
+        rows = await asyncio.gather(*(self.embed(text) for text in texts))
+        return np.stack(rows)
+
+    def _flush(self):
+        """Starts encoding the pending requests unless a batch is already in flight."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._encoding or not self._pending:
+            return
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._encoding = True
+        asyncio.get_running_loop().create_task(self._encode_batch(batch))
+
+    async def _encode_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encodes one batch off the event loop and resolves each caller's future."""
+        loop = asyncio.get_running_loop()
+        # Identical texts in a batch (e.g. the same question from several users) are encoded once.
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = await loop.run_in_executor(self._executor, self.embedding_model.get_embeddings, unique_texts)
+            if len(embeddings) != len(unique_texts):
+                raise RuntimeError("Embedding model returned no embeddings for the batch.")
+            rows = {text: embeddings[i] for i, text in enumerate(unique_texts)}
+            for text, row in rows.items():
+                # Cached vectors are handed to many callers; none may modify them.
+                row.setflags(write=False)
+                self.cache.put(text, row)
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(rows[text])
+            self.batches += 1
+            logger.debug(f"Encoded batch of {len(batch)} requests ({len(unique_texts)} unique texts).")
+        except Exception as e:
+            logger.error(f"Error encoding embedding batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._encoding = False
+            # Requests that arrived during the encode have already waited long enough.
+            if self._pending:
+                self._flush()
+
+    def close(self):
+        """Shuts down the background encoding thread."""
+        self._executor.shutdown(wait=False)
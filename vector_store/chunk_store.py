@@ -0,0 +1,185 @@
+import json
+import logging
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RAGCHNK1"
+CODECS = {"none": 0, "zlib": 1}
+HEADER_SIZE = len(MAGIC) + 1
+
+class BlockCache:
+    """
+    A small, thread-safe LRU of decompressed chunk blocks shared by every ChunkStore.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._blocks: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, int]) -> Optional[bytes]:
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            return block
+
+    def put(self, key: Tuple[str, int], block: bytes):
+        with self._lock:
+            self._blocks[key] = block
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > self.capacity:
+                self._blocks.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+block_cache = BlockCache(settings.CHUNK_STORE_CACHE_BLOCKS)
+
+def _paths(directory: str, name: str) -> Tuple[str, str, str]:
+    base = os.path.join(directory, name)
+    return base + ".chunks", base + ".chunkidx.npy", base + ".blocks.npy"
+
+def write_chunk_store(directory: str, name: str, records: Iterable[Tuple[str, Optional[Dict[str, Any]]]],
+                      compression: Optional[str] = None, block_size: Optional[int] = None):
+    """
+    Writes chunk records (text, metadata) as a binary chunk store.
+
+    Layout:
+        `<name>.chunks`       header (magic + codec) followed by the data blocks
+        `<name>.blocks.npy`   uint64 (num_blocks, 2): file offset and stored length per block
+        `<name>.chunkidx.npy` uint64 (num_chunks, 3): block, offset and length inside the
+                              decoded block per chunk
+
+    Records are packed into blocks of roughly `block_size` bytes, each compressed
+    independently, so reading one chunk decodes at most one block.
+
+    Args:
+        directory (str): Target directory.
+        name (str): File stem, usually the segment name.
+        records: Iterable of (text, metadata) pairs.
+        compression (str, optional): "zlib" or "none". Defaults to settings.
+        block_size (int, optional): Target decoded block size in bytes. Defaults to settings.
+    """
+    compression = compression or settings.CHUNK_STORE_COMPRESSION
+    block_size = block_size or settings.CHUNK_STORE_BLOCK_SIZE
+    codec = CODECS[compression]
+    data_path, chunk_index_path, block_index_path = _paths(directory, name)
+    os.makedirs(directory, exist_ok=True)
+
+    chunk_index: List[Tuple[int, int, int]] = []
+    block_index: List[Tuple[int, int]] = []
+    with open(data_path + ".tmp", "wb") as f:
+        f.write(MAGIC + bytes([codec]))
+        position = HEADER_SIZE
+        pending = bytearray()
+
+        def flush_block():
+            nonlocal position, pending
+            stored = zlib.compress(bytes(pending)) if codec else bytes(pending)
+            f.write(stored)
+            block_index.append((position, len(stored)))
+            position += len(stored)
+            pending = bytearray()
+
+        for text, metadata in records:
+            record = json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False).encode("utf-8")
+            if pending and len(pending) + len(record) > block_size:
+                flush_block()
+            chunk_index.append((len(block_index), len(pending), len(record)))
+            pending += record
+        if pending:
+            flush_block()
+        f.flush()
+        os.fsync(f.fileno())
+
+    for path, rows, width in ((chunk_index_path, chunk_index, 3), (block_index_path, block_index, 2)):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.array(rows, dtype=np.uint64).reshape(-1, width))
+            f.flush()
+            os.fsync(f.fileno())
+    # The data file is renamed last: its presence marks a complete chunk store.
+    os.replace(chunk_index_path + ".tmp", chunk_index_path)
+    os.replace(block_index_path + ".tmp", block_index_path)
+    os.replace(data_path + ".tmp", data_path)
+
+def chunk_store_exists(directory: str, name: str) -> bool:
+    return os.path.exists(_paths(directory, name)[0])
+
+def delete_chunk_store(directory: str, name: str):
+    for path in _paths(directory, name):
+        if os.path.exists(path):
+            os.remove(path)
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped access to a chunk store written by `write_chunk_store`.
+
+    Nothing is decoded up front: a chunk's text and metadata are read only when asked
+    for, typically just for the top-k search hits. Decoded compressed blocks are kept
+    in the shared `block_cache`.
+    """
+    def __init__(self, directory: str, name: str, cache: BlockCache = block_cache):
+        data_path, chunk_index_path, block_index_path = _paths(directory, name)
+        self.path = data_path
+        self._cache = cache
+        self._chunks = np.load(chunk_index_path, mmap_mode="r")
+        self._blocks = np.load(block_index_path, mmap_mode="r")
+        with open(data_path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{data_path} is not a chunk store")
+        self._compressed = self._data[len(MAGIC)] == CODECS["zlib"]
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _record(self, i: int) -> dict:
+        block_no, offset, length = (int(v) for v in self._chunks[i])
+        block_offset, stored_length = (int(v) for v in self._blocks[block_no])
+        if not self._compressed:
+            start = block_offset + offset
+            return json.loads(self._data[start:start + length])
+        key = (self.path, block_no)
+        block = self._cache.get(key)
+        if block is None:
+            block = zlib.decompress(self._data[block_offset:block_offset + stored_length])
+            self._cache.put(key, block)
+        return json.loads(block[offset:offset + length])
+
+    def get(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        """Returns the (text, metadata) of chunk `i`."""
+        record = self._record(i)
+        return record["text"], record["metadata"]
+
+    def text(self, i: int) -> str:
+        return self._record(i)["text"]
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterates over all records in order, decoding each block once (used by compaction)."""
+        decoded_block, decoded_no = None, -1
+        for block_no, offset, length in self._chunks:
+            block_no, offset, length = int(block_no), int(offset), int(length)
+            if block_no != decoded_no:
+                block_offset, stored_length = (int(v) for v in self._blocks[block_no])
+                raw = self._data[block_offset:block_offset + stored_length]
+                decoded_block = zlib.decompress(raw) if self._compressed else raw
+                decoded_no = block_no
+            record = json.loads(decoded_block[offset:offset + length])
+            yield record["text"], record["metadata"]
+
+    def close(self):
+        self._data.close()
@@ -0,0 +1,331 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+import numpy as np
+from config.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: processes sharing a cache directory are not serialized.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_DTYPE = np.dtype([("key", "V32"), ("slot", "<i8")])
+
+class EmbeddingCacheStats:
+    """
+    Hit/miss counts of embedding cache lookups and the encode time they saved, for one
+    ingestion or accumulated over the cache's lifetime.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed cache of chunk embeddings.
+
+    Vectors are keyed by SHA-256 of (model name, chunk text) and stored as float32
+    rows in a fixed-size memory-mapped file (`vectors.f32`); `keys.bin` holds the key
+    of each row (zeros for a free row) and `index.npy` maps keys to rows in least- to
+    most-recently-used order. When the cache is full the least recently used entries
+    are evicted, about 1/64 of the capacity at a time.
+
+    Several processes may share a cache directory (the app and `ingest.py` do). Rows
+    are only handed out and the index only rewritten under an exclusive `flock` on
+    `cache.lock`, after merging the entries other processes have written to
+    `index.npy`, and every hit is checked against the key of its row. An index that
+    is stale, whether another process reused its rows or it was persisted before a
+    crash, therefore costs misses but never returns another chunk's vector.
+
+    The index is rewritten at most every `flush_interval` seconds and on `flush()`.
+    """
+    def __init__(self, model_name: str, dimension: int, directory: Optional[str] = None,
+                 max_bytes: Optional[int] = None, flush_interval: float = 5.0):
+        """
+        Initializes the EmbeddingCache, loading its index if one exists.
+
+        Args:
+            model_name (str): The embedding model's name; each model gets its own cache files.
+            dimension (int): The embedding dimension.
+            directory (str, optional): Overrides `settings.EMBEDDING_CACHE_DIR`.
+            max_bytes (int, optional): Overrides `settings.EMBEDDING_CACHE_MAX_BYTES`.
+            flush_interval (float): Seconds between automatic index writes.
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        directory = directory or settings.EMBEDDING_CACHE_DIR
+        self.directory = os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)}-{dimension}")
+        self.capacity = max(1, (max_bytes or settings.EMBEDDING_CACHE_MAX_BYTES) // (dimension * 4))
+        self.flush_interval = flush_interval
+        self.stats = EmbeddingCacheStats()
+        self.seconds_per_text = 0.0  # Running average encode cost of a cache miss
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, int]" = OrderedDict()
+        # Rows free when last seen, taken from the end; other processes may have taken some since.
+        self._free = np.empty(0, dtype=np.int64)
+        self._index_stamp = None  # (inode, mtime, size) of the index file last merged
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._open()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.npy")
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.directory, "keys.bin")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, "cache.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._lock, self._file_lock(exclusive=True):
+            meta = {}
+            if os.path.exists(self._meta_path):
+                with open(self._meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            if (meta.get("capacity") != self.capacity or meta.get("dimension") != self.dimension
+                    or not os.path.exists(self._keys_path)):
+                # New cache, resized, or written before rows recorded their keys: start empty.
+                for path in (self._vectors_path, self._keys_path, self._index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                meta = {"capacity": self.capacity, "dimension": self.dimension, "seconds_per_text": 0.0}
+                self._write_meta(meta)
+            self.seconds_per_text = meta.get("seconds_per_text", 0.0)
+
+            mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, self.dimension))
+            mode = "r+" if os.path.exists(self._keys_path) else "w+"
+            self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode=mode, shape=(self.capacity, 32))
+            self._sync_index()
+            # Rows no index references were stored by a process that exited (or crashed) before flushing.
+            self._free = self._reclaim_unreferenced()
+        logger.info(f"Embedding cache at {self.directory}: {len(self._entries)}/{self.capacity} entries.")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Holds `cache.lock`, shared for lookups and exclusive for writes. Take the thread lock first."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _sync_index(self):
+        """Merges entries other processes have flushed to the index since it was last read. Needs both locks."""
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._index_stamp:
+            return
+        try:
+            index = np.load(self._index_path)
+        except Exception as e:
+            logger.error(f"Error loading embedding cache index {self._index_path}: {e}. Ignoring it.")
+            index = np.empty(0, dtype=INDEX_DTYPE)
+        self._index_stamp = stamp
+        # Entries this process does not know yet were added since: they are the most recently used.
+        for key, slot in index:
+            key, slot = bytes(key), int(slot)
+            if key not in self._entries and 0 <= slot < self.capacity and self._row_holds(slot, key):
+                self._entries[key] = slot
+
+    def _row_holds(self, slot: int, key: bytes) -> bool:
+        return self._keys[slot].tobytes() == key
+
+    def _take_free_row(self) -> Optional[int]:
+        """Pops a row of the free list that no other process has taken meanwhile, if any."""
+        while len(self._free):
+            slot, self._free = int(self._free[-1]), self._free[:-1]
+            if not self._keys[slot].any():
+                return slot
+        return None
+
+    def _occupied(self) -> np.ndarray:
+        """Returns which rows hold a vector, comparing keys as four 64-bit words."""
+        return self._keys.view(np.uint64).any(axis=1)
+
+    def _free_rows(self) -> np.ndarray:
+        """Returns the rows holding no vector, lowest last. Needs the exclusive file lock."""
+        return np.flatnonzero(~self._occupied())[::-1]
+
+    def _reclaim_unreferenced(self) -> np.ndarray:
+        """
+        Frees the rows this process's index does not reference and returns all free
+        rows, lowest last. Needs the exclusive file lock.
+        """
+        occupied = self._occupied()
+        stale = occupied.copy()
+        stale[np.fromiter(self._entries.values(), dtype=np.int64, count=len(self._entries))] = False
+        stale_rows = np.flatnonzero(stale)
+        if len(stale_rows):
+            self._keys[stale_rows] = 0
+            occupied[stale_rows] = False
+        return np.flatnonzero(~occupied)[::-1]
+
+    def _write_meta(self, meta: dict):
+        with open(self._meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_embeddings(self, texts: List[str], encode: Callable[[List[str]], np.ndarray],
+                       stats: Optional[EmbeddingCacheStats] = None) -> np.ndarray:
+        """
+        Returns embeddings for `texts`, calling `encode` only for texts not in the cache.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            encode (callable): Embeds a list of texts, e.g. `EmbeddingModel.get_embeddings`.
+            stats (EmbeddingCacheStats, optional): Also receives this call's counts.
+
+        Returns:
+            np.ndarray: A float32 array of shape (len(texts), dimension), or an empty
+            array if `encode` fails.
+        """
+        keys = [self._key(text) for text in texts]
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing: "OrderedDict[bytes, List[int]]" = OrderedDict()
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync_index()
+            for i, key in enumerate(keys):
+                slot = self._entries.get(key)
+                if slot is not None and not self._row_holds(slot, key):
+                    # Another process evicted the entry and reused its row.
+                    del self._entries[key]
+                    slot = None
+                if slot is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    result[i] = self._vectors[slot]
+
+        hits = len(texts) - sum(len(rows) for rows in missing.values())
+        if missing:
+            started = time.perf_counter()
+            encoded = encode([texts[rows[0]] for rows in missing.values()])
+            if len(encoded) != len(missing):
+                return np.empty((0, self.dimension), dtype=np.float32)
+            elapsed = time.perf_counter() - started
+            with self._lock, self._file_lock(exclusive=True):
+                per_text = elapsed / len(missing)
+                self.seconds_per_text = per_text if not self.seconds_per_text else 0.8 * self.seconds_per_text + 0.2 * per_text
+                self._sync_index()
+                for (key, rows), vector in zip(missing.items(), encoded):
+                    result[rows] = vector
+                    self._store(key, vector)
+                self._dirty = True
+
+        with self._lock:
+            saved = hits * self.seconds_per_text
+            for counts in (self.stats, stats):
+                if counts is not None:
+                    counts.hits += hits
+                    counts.misses += len(texts) - hits
+                    counts.seconds_saved += saved
+        if self._dirty and time.monotonic() - self._last_flush > self.flush_interval:
+            self.flush()
+        return result
+
+    def _store(self, key: bytes, vector: np.ndarray):
+        """
+        Writes a vector into a free row, evicting the least recently used entries if needed.
+        Needs the thread lock and the exclusive file lock, so no other process takes the row.
+        """
+        slot = self._entries.get(key)
+        if slot is not None and self._row_holds(slot, key):
+            self._entries.move_to_end(key)
+            return
+        slot = self._take_free_row()
+        if slot is None:
+            # Entries whose rows another process reused free nothing: drop them and go on.
+            evicted = []
+            while self._entries and len(evicted) < max(1, self.capacity // 64):
+                old_key, old_slot = self._entries.popitem(last=False)
+                if self._row_holds(old_slot, old_key):
+                    self._keys[old_slot] = 0
+                    evicted.append(old_slot)
+            self._free = np.array(evicted[::-1], dtype=np.int64)
+            slot = self._take_free_row()
+        if slot is None:
+            # Rows other processes freed, else rows only processes that have not flushed yet use.
+            self._free = self._free_rows()
+            if not len(self._free):
+                self._free = self._reclaim_unreferenced()
+            slot = self._take_free_row()
+        self._vectors[slot] = vector
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._entries[key] = slot
+
+    def flush(self):
+        """Durably writes the vectors and the index, merged with the entries of other processes."""
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync_index()
+            self._vectors.flush()
+            self._keys.flush()
+            index = np.array(list(self._entries.items()), dtype=INDEX_DTYPE)
+            # Drop entries whose rows other processes have reused.
+            keys = np.frombuffer(index["key"].tobytes(), dtype=np.uint8).reshape(-1, 32)
+            live = (self._keys[index["slot"]] == keys).all(axis=1)
+            for key in index["key"][~live]:
+                del self._entries[bytes(key)]
+            with open(self._index_path + ".tmp", "wb") as f:
+                np.save(f, index[live])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self._index_path + ".tmp", self._index_path)
+            stat = os.stat(self._index_path)
+            self._index_stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._write_meta({"capacity": self.capacity, "dimension": self.dimension,
+                              "seconds_per_text": self.seconds_per_text})
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flushes the cache, unmaps its files and releases its lock file."""
+        self.flush()
+        del self._vectors
+        del self._keys
+        os.close(self._lock_fd)
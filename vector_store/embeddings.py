@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from config.settings import settings
 
@@ -12,6 +13,8 @@ class EmbeddingModel:
         """
         Initializes the EmbeddingModel by loading the pre-trained SentenceTransformer.
         """
+        self.model_name = settings.EMBEDDING_MODEL_NAME
+        self.dimension = settings.EMBEDDING_DIMENSION
         try:
             # Explicitly set device to CPU to avoid meta tensor issues
             self.model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME, device="cpu")
@@ -20,7 +23,7 @@ class EmbeddingModel:
             logger.error(f"Error loading embedding model {settings.EMBEDDING_MODEL_NAME}: {e}")
             self.model = None
 
-    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+    def get_embeddings(self, texts: list[str]) -> np.ndarray:
         """
         Generates embeddings for a list of text strings.
 
@@ -28,15 +31,16 @@ class EmbeddingModel:
             texts (list[str]): A list of text strings to embed.
 
         Returns:
-            list[list[float]]: A list of embeddings, where each embedding is a list of floats.
+            np.ndarray: A float32 array of shape (len(texts), dimension). The array is
+            empty (zero rows) if the model is unavailable or encoding fails.
         """
         if not self.model:
             logger.error("Embedding model not loaded. Cannot generate embeddings.")
-            return []
+            return np.empty((0, self.dimension), dtype=np.float32)
         try:
-            embeddings = self.model.encode(texts, convert_to_numpy=False).tolist()
+            embeddings = self.model.encode(texts, convert_to_numpy=True)
             logger.info(f"Generated embeddings for {len(texts)} texts.")
-            return embeddings
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
-            return []
\ No newline at end of file
+            return np.empty((0, self.dimension), dtype=np.float32)
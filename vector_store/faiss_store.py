@@ -1,80 +1,570 @@
 import logging
+import re
+import shutil
+import threading
+import time
 import faiss
 import numpy as np
 import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from config.settings import settings
+from vector_store.embedding_cache import EmbeddingCache, EmbeddingCacheStats
 from vector_store.embeddings import EmbeddingModel
+from utils.metrics import LatencyStats
+from vector_store.index_factory import build_index, check_codec, search_params
+from vector_store.maintenance import IndexMaintenance
+from vector_store.query_cache import TTLCache
+from vector_store.snapshots import Snapshot, SnapshotManager
+from vector_store.segments import (
+    IdRange, LogState, Segment, SegmentLog, build_segment, delete_segment_files, load_segment,
+    read_segment_vectors, segment_name, segment_number, stage_segment_index, swap_segment_index, write_segment,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: store directories are not locked.
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Namespaces name directories, and may come from requests: no separators or leading dots.
+_NAMESPACE_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+def validate_namespace(namespace: str) -> str:
+    """Returns `namespace` if it is a valid store namespace; raises ValueError otherwise."""
+    if not isinstance(namespace, str) or not _NAMESPACE_PATTERN.fullmatch(namespace):
+        raise ValueError(f"Invalid vector store namespace: {namespace!r}")
+    return namespace
+
+class StoreLockedError(RuntimeError):
+    """Raised when another process is writing the vector store, or reading it while this one would write."""
+
+# Lock files held by this process: path -> [file descriptor, open stores using it, exclusive].
+_STORE_LOCKS: Dict[str, list] = {}
+_STORE_LOCKS_GUARD = threading.Lock()
+
+def _lock_store(path: str):
+    """
+    Takes the lock `path` shared on behalf of one store, failing fast with
+    StoreLockedError if another process holds it exclusively. Any number of
+    processes may read a store; see `_lock_store_exclusive` for writing. Stores of
+    the same process share the lock; the registry already gives each namespace a
+    single store.
+    """
+    if fcntl is None:
+        return
+    with _STORE_LOCKS_GUARD:
+        held = _STORE_LOCKS.get(path)
+        if held is not None:
+            held[1] += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise StoreLockedError(f"Vector store {os.path.dirname(path)} is being written by another process.")
+        _STORE_LOCKS[path] = [fd, 1, False]
+
+def _lock_store_exclusive(path: str):
+    """
+    Upgrades this process's lock `path` to exclusive, for writing, failing fast
+    with StoreLockedError while another process has the store open. The lock stays
+    exclusive until the last store of the process releases it.
+    """
+    if fcntl is None:
+        return
+    with _STORE_LOCKS_GUARD:
+        held = _STORE_LOCKS[path]
+        if held[2]:
+            return
+        try:
+            fcntl.flock(held[0], fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # A failed conversion has already dropped the shared lock: take it back.
+            try:
+                fcntl.flock(held[0], fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.warning(f"Lost the shared lock on vector store {os.path.dirname(path)}.")
+            raise StoreLockedError(f"Vector store {os.path.dirname(path)} is open in another process; "
+                                   f"it can be read but not written.")
+        held[2] = True
+
+def _unlock_store(path: str):
+    """Releases one store's hold on the lock `path`, unlocking it when it was the last."""
+    if fcntl is None:
+        return
+    with _STORE_LOCKS_GUARD:
+        held = _STORE_LOCKS.get(path)
+        if held is None:
+            return
+        held[1] -= 1
+        if not held[1]:
+            del _STORE_LOCKS[path]
+            fcntl.flock(held[0], fcntl.LOCK_UN)
+            os.close(held[0])
+
+class _Tombstones:
+    """
+    An immutable set of deleted chunk id ranges and the FAISS selector that excludes
+    them from searches. Writers publish a new instance; readers never lock.
+    """
+    def __init__(self, ranges: Tuple[IdRange, ...] = ()):
+        self.ranges = tuple(ranges)
+        if self.ranges:
+            self.ids = np.sort(np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in self.ranges]))
+        else:
+            self.ids = np.empty(0, dtype=np.int64)
+        self.count = len(self.ids)
+        # The batch selector must outlive the selector that wraps it.
+        self._batch = faiss.IDSelectorBatch(self.ids) if self.count else None
+        self.selector = faiss.IDSelectorNot(self._batch) if self.count else None
+
+class _IdFilter:
+    """
+    A FAISS selector restricting a search to some chunk id ranges: a range selector
+    for a single range, a batch (hash set) selector for few ids, and a bitmap over
+    all ids otherwise.
+    """
+    def __init__(self, ranges: List[IdRange], id_limit: int, batch_max_ids: int):
+        self.ranges = sorted(ranges)
+        self.count = sum(end - start for start, end in self.ranges)
+        # The arrays backing the selectors must outlive them.
+        if len(self.ranges) == 1:
+            self.kind = "range"
+            self.selector = faiss.IDSelectorRange(*self.ranges[0])
+        elif self.count <= batch_max_ids:
+            self.kind = "batch"
+            self._ids = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in self.ranges])
+            self.selector = faiss.IDSelectorBatch(self._ids)
+        else:
+            self.kind = "bitmap"
+            bits = np.zeros(id_limit, dtype=bool)
+            for start, end in self.ranges:
+                bits[start:end] = True
+            self._bitmap = np.packbits(bits, bitorder="little")
+            # The bitmap's size is given in bytes; ids past its end are not members.
+            self.selector = faiss.IDSelectorBitmap(len(self._bitmap), faiss.swig_ptr(self._bitmap))
+
+def _document_ranges(ids: np.ndarray, metadatas: Optional[List[Dict[str, Any]]]) -> Dict[str, List[IdRange]]:
+    """Groups consecutive chunks of the same `document_id` into id ranges."""
+    ranges: Dict[str, List[IdRange]] = {}
+    for chunk_id, metadata in zip(ids.tolist(), metadatas or []):
+        document_id = (metadata or {}).get("document_id")
+        if document_id is None:
+            continue
+        document_ranges = ranges.setdefault(document_id, [])
+        if document_ranges and document_ranges[-1][1] == chunk_id:
+            document_ranges[-1] = (document_ranges[-1][0], chunk_id + 1)
+        else:
+            document_ranges.append((chunk_id, chunk_id + 1))
+    return ranges
+
 class FAISSVectorStore:
     """
     A FAISS-based vector store for efficient similarity search.
+
+    The store is a sequence of immutable segments, one per `add_documents` call. Each
+    add writes only its own vectors and chunks to disk and appends a record to the
+    segment log, so ingestion cost does not grow with the corpus. A background
+    compaction merges small adjacent segments to keep searches fanning out over few
+    indexes, and startup replays the log to reload the segments.
+
+    Every chunk gets a stable 64-bit id, and the store keeps a map from `document_id`
+    to the id ranges of its chunks. `delete_document` and `upsert_document` tombstone
+    just those ranges, so updating one file costs O(document); compaction drops
+    tombstoned chunks from the segments it rewrites. The same map restricts searches
+    to given documents, see `search_chunks`.
+
+    Readers work on snapshots: the segments, document map and tombstones are published
+    together as one immutable `Snapshot`, so a search never sees a half-applied change
+    and never waits for a writer. A search pins its snapshot, and segments that
+    compaction or `clear_index` replaced keep their files until the last search using
+    them finishes. On disk, every segment is written under temporary names and renamed
+    into place before the log record that adds it is appended, so the record is the
+    commit point: after a crash the store reloads exactly the committed snapshot.
+
+    `version` increases with every change to the store's contents. Search results
+    are cached under the version of the snapshot they were computed from, so a cached
+    result is never served after a change.
+
+    Chunk texts and metadata live in memory-mapped chunk stores and are only decoded
+    for the hits a search returns.
+
+    Segments index their vectors with `settings.FAISS_INDEX_TYPE`. Small segments use
+    exact Flat search until compaction merges them past `FAISS_ANN_MIN_VECTORS`, at
+    which point the merged segment's IVF or HNSW index is trained on its own vectors.
+    With `settings.FAISS_VECTOR_CODEC`, segment indexes store compressed codes instead
+    of float32 vectors; candidates they return are rescored exactly from the segment's
+    memory-mapped float vectors (`FAISS_RESCORE_FACTOR`).
     """
-    def __init__(self):
+    def __init__(self, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE,
+                 embedding_model: Optional[EmbeddingModel] = None, base_dir: Optional[str] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         """
         Initializes the FAISSVectorStore, loading an existing index if available,
         or creating a new one.
+
+        Args:
+            namespace (str): The index namespace. The default namespace lives directly in
+                the vector store directory; others live under `namespaces/<name>/`.
+            embedding_model (EmbeddingModel, optional): A shared embedding model. A private
+                one is loaded if omitted; prefer `registry.acquire_vector_store()`.
+            base_dir (str, optional): Overrides `settings.VECTOR_STORE_DIR`.
+            embedding_cache (EmbeddingCache, optional): If given, chunks embedded before
+                (by any store sharing the cache) are not encoded again.
+
+        Raises:
+            StoreLockedError: If another process is writing the store. Otherwise it
+                stays locked, shared until its first write, until `close`.
+            RuntimeError: If the store's files exist but cannot be loaded.
+            ValueError: If `settings.FAISS_VECTOR_CODEC` is unknown or unsupported by faiss.
         """
-        self.index = None
-        self.texts = []
-        self.embedding_model = EmbeddingModel()
-        self.index_path = os.path.join(settings.VECTOR_STORE_DIR, settings.FAISS_INDEX_NAME)
-        self._load_or_create_index()
+        self.namespace = validate_namespace(namespace)
+        check_codec(settings.FAISS_VECTOR_CODEC)
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.embedding_cache = embedding_cache
+        self.dimension = getattr(self.embedding_model, "dimension", settings.EMBEDDING_DIMENSION)
+        base_dir = base_dir or settings.VECTOR_STORE_DIR
+        if namespace != settings.VECTOR_STORE_DEFAULT_NAMESPACE:
+            base_dir = os.path.join(base_dir, "namespaces", namespace)
+        self.index_path = os.path.join(base_dir, settings.FAISS_INDEX_NAME)
+        self.segments_dir = self.index_path + ".segments"
+        # Another process writing the same store would assign colliding chunk ids, and
+        # whichever rewrote the log last would drop the other's segments. Readers share
+        # the lock; the first write takes it exclusively (`_lock_for_writing`).
+        self._lock_path: Optional[str] = os.path.abspath(self.index_path + ".lock")
+        _lock_store(self._lock_path)
+        self._writing = False
+        self.max_segments = settings.FAISS_MAX_SEGMENTS
+        self.merge_factor = settings.FAISS_MERGE_FACTOR
+        self.index_type = settings.FAISS_INDEX_TYPE
+        self.vector_codec = settings.FAISS_VECTOR_CODEC
+        self.rescore_factor = settings.FAISS_RESCORE_FACTOR
+        self.tombstone_ratio = settings.FAISS_TOMBSTONE_RATIO
+        self.filter_brute_force_ratio = settings.FAISS_FILTER_BRUTE_FORCE_RATIO
+        self.filter_batch_max_ids = settings.FAISS_FILTER_BATCH_MAX_IDS
+
+        # Readers pin the current snapshot and never take the write lock; writers build
+        # a new snapshot and publish it under the write lock.
+        self._snapshots = SnapshotManager(Snapshot(tombstones=_Tombstones()))
+        self._next_id = 0
+        self.result_cache = TTLCache(settings.RETRIEVAL_CACHE_SIZE, settings.RETRIEVAL_CACHE_TTL)
+        self._change_listeners: List[Callable[[Optional[List[IdRange]]], None]] = []
+        self._write_lock = threading.RLock()
+        self._log = SegmentLog(self.segments_dir)
+        self._next_segment = 1
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._upgrade: Optional[Dict[str, str]] = None
+        # Searches that missed the result cache, watched by the index maintenance.
+        self.search_seconds = LatencyStats(256)
+        try:
+            self._load_or_create_index()
+        except Exception:
+            _unlock_store(self._lock_path)
+            raise
+        self.maintenance = IndexMaintenance(self)
+        self.maintenance.maybe_start()
         logger.info("FAISSVectorStore initialized.")
 
+    @property
+    def ntotal(self) -> int:
+        """The number of live (not deleted) chunks in the store."""
+        snapshot = self._snapshots.current
+        return sum(segment.size for segment in snapshot.segments) - snapshot.tombstones.count
+
+    @property
+    def version(self) -> int:
+        """The content version of the current snapshot."""
+        return self._snapshots.current.version
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """The current snapshot, for inspection. Use `pin` to read chunks from it."""
+        return self._snapshots.current
+
+    def pin(self):
+        """
+        Returns a context manager yielding the current snapshot. Its segments stay
+        readable until the block exits, however the store changes meanwhile.
+        """
+        return self._snapshots.pin()
+
+    def resident_bytes(self) -> int:
+        """Returns the memory the store's segments take once they are all paged in."""
+        with self.pin() as snapshot:
+            return sum(segment.nbytes for segment in snapshot.segments)
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        """Returns the current version and the pinned snapshots and retired segments kept alive."""
+        return self._snapshots.stats()
+
+    def _publish(self, changed: bool = True, directory: Optional[str] = "", **fields):
+        """
+        Publishes the current snapshot with `fields` (segments, documents, tombstones)
+        replaced, bumping the version if the contents `changed`. Call with the write
+        lock held. Retired segments' files are deleted from `directory`, by default the
+        segments directory.
+        """
+        current = self._snapshots.current
+        snapshot = Snapshot(fields.get("segments", current.segments), fields.get("documents", current.documents),
+                            fields.get("tombstones", current.tombstones), current.version + (1 if changed else 0))
+        self._snapshots.publish(snapshot, self.segments_dir if directory == "" else directory)
+
     def _load_or_create_index(self):
         """
-        Loads the FAISS index and texts from disk if they exist, otherwise creates a new index.
+        Replays the segment log to load the store, migrating a legacy single-file
+        index first if one exists.
+
+        Raises:
+            RuntimeError: If the store exists but cannot be loaded. Its files are left
+                untouched: starting empty would hide the data, and the next write would
+                reuse the names of the segments it failed to load.
         """
-        if os.path.exists(self.index_path) and os.path.exists(self.index_path + ".texts"):
-            try:
-                self.index = faiss.read_index(self.index_path)
-                with open(self.index_path + ".texts", "r", encoding="utf-8") as f:
-                    self.texts = [line.strip() for line in f]
-                logger.info(f"FAISS index and texts loaded from {self.index_path}")
-            except Exception as e:
-                logger.error(f"Error loading FAISS index or texts: {e}. Creating new index.")
+        segments = []
+        try:
+            if not os.path.exists(self._log.path) and os.path.exists(self.index_path) \
+                    and os.path.exists(self.index_path + ".texts"):
+                self._migrate_legacy_index()
+            state = self._log.replay()
+            if state.upgrade is not None and state.upgrade["configured"] == self.index_type:
+                self._upgrade = state.upgrade
+                self.index_type = state.upgrade["index_type"]
+            names = state.names
+            if not names:
+                logger.info("No existing FAISS index found. Creating a new one.")
                 self._create_new_index()
-        else:
-            logger.info("No existing FAISS index found. Creating a new one.")
-            self._create_new_index()
+                self._next_id = state.next_id
+                return
+            next_id = 0
+            for name in names:
+                segment = load_segment(self.segments_dir, name, next_id)
+                segments.append(segment)
+                if segment.size:
+                    next_id = int(segment.ids[-1]) + 1
+            self._publish(changed=False, segments=tuple(segments), documents=state.documents,
+                          tombstones=_Tombstones(tuple(state.deleted)))
+            self._next_id = max(next_id, state.next_id)
+            self._next_segment = max(segment_number(name) for name in names) + 1
+            logger.info(f"FAISS index loaded from {self.segments_dir}: {len(names)} segments, {self.ntotal} chunks")
+        except Exception as e:
+            logger.error(f"Error loading FAISS index segments from {self.segments_dir}: {e}")
+            for segment in segments:
+                segment.chunks.close()
+            raise RuntimeError(f"Could not load the FAISS vector store in {self.segments_dir}: {e}") from e
+
+    def _migrate_legacy_index(self):
+        """
+        Converts the old `faiss_index` + `.texts` pair into the first segment.
+        """
+        self._lock_for_writing()
+        index = faiss.read_index(self.index_path)
+        with open(self.index_path + ".texts", "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f]
+        vectors = index.reconstruct_n(0, index.ntotal)
+        if len(texts) != len(vectors):
+            logger.warning(f"Legacy index has {len(vectors)} vectors but {len(texts)} texts; keeping the common prefix.")
+            count = min(len(texts), len(vectors))
+            vectors, texts = vectors[:count], texts[:count]
+        name = segment_name(1)
+        write_segment(self.segments_dir, name, vectors, texts)
+        self._log.append({"op": "add", "segment": name, "rows": len(texts), "ids": [0, len(texts)]})
+        for path in (self.index_path, self.index_path + ".texts"):
+            os.replace(path, path + ".migrated")
+        logger.info(f"Migrated legacy FAISS index at {self.index_path} ({len(texts)} chunks) to segments.")
+
+    def _lock_for_writing(self):
+        """
+        Takes the store's lock exclusively before its first write. Files a crashed
+        writer left behind (staged or unlogged segment files, a torn log record) are
+        tidied up then rather than on open, since other processes may be reading the
+        store until now. Call with the write lock held, or while loading.
+
+        Raises:
+            StoreLockedError: If another process has the store open.
+        """
+        if self._writing:
+            return
+        if self._lock_path is not None:
+            _lock_store_exclusive(self._lock_path)
+        if self._log.torn:
+            # Later appends must not land behind the torn record.
+            self._log.rewrite(self._log_state())
+        if os.path.isdir(self.segments_dir):
+            self._log.remove_orphans([segment.name for segment in self._snapshots.current.segments])
+        self._writing = True
+
+    def can_write(self) -> bool:
+        """Takes the store's lock exclusively if no other process has the store open, and says whether it did."""
+        with self._write_lock:
+            try:
+                self._lock_for_writing()
+            except StoreLockedError:
+                return False
+        return True
 
     def _create_new_index(self):
         """
-        Creates a new FAISS index.
+        Resets the store to an empty sequence of segments. Files on disk are left alone.
         """
-        self.index = faiss.IndexFlatL2(settings.EMBEDDING_DIMENSION)  # L2 distance for similarity
-        self.texts = []
-        logger.info(f"New FAISS index created with dimension {settings.EMBEDDING_DIMENSION}")
+        self._publish(changed=False, directory=None, segments=(), documents={}, tombstones=_Tombstones())
+        logger.info(f"New FAISS index created with dimension {self.dimension}")
 
-    def add_documents(self, documents: list[str]):
+    def add_documents(self, documents: list[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                      cache_stats: Optional[EmbeddingCacheStats] = None):
         """
         Adds a list of text documents to the FAISS index.
 
         Args:
             documents (list[str]): A list of text documents to add.
+            metadatas (list[dict], optional): Per-document metadata such as `document_id`,
+                `source` and `page`.
+            cache_stats (EmbeddingCacheStats, optional): Receives the embedding cache hits and misses.
         """
         if not documents:
             return
 
-        new_embeddings = self.embedding_model.get_embeddings(documents)
-        if not new_embeddings:
+        new_embeddings_np = self.embed_documents(documents, cache_stats)
+        if len(new_embeddings_np) == 0:
             logger.error("Could not generate embeddings for documents. Aborting add.")
             return
 
-        new_embeddings_np = np.array(new_embeddings).astype('float32')
+        self.add_embeddings(new_embeddings_np, documents, metadatas)
 
-        if self.index.is_trained:
-            self.index.add(new_embeddings_np)
-        else:
-            # For IndexFlatL2, is_trained is always true after creation, but good practice
-            # to handle other index types that might require training.
-            self.index.add(new_embeddings_np)
+    def embed_documents(self, documents: list[str], cache_stats: Optional[EmbeddingCacheStats] = None) -> np.ndarray:
+        """Embeds chunk texts, through the embedding cache if the store has one."""
+        if self.embedding_cache is None:
+            return self.embedding_model.get_embeddings(documents)
+        return self.embedding_cache.get_embeddings(documents, self.embedding_model.get_embeddings, cache_stats)
+
+    def add_embeddings(self, embeddings: np.ndarray, documents: list[str],
+                       metadatas: Optional[List[Dict[str, Any]]] = None, upsert: Optional[str] = None):
+        """
+        Appends already embedded documents to the store as a new segment.
+
+        Args:
+            embeddings (np.ndarray): A float32 array of shape (len(documents), dimension).
+            documents (list[str]): The chunk texts, in the same order.
+            metadatas (list[dict], optional): Per-document metadata, in the same order.
+            upsert (str, optional): A document id whose previously stored chunks are
+                deleted in the same step, see `upsert_document`.
+        """
+        if not documents:
+            return
+        with self._write_lock:
+            self._lock_for_writing()
+            name = segment_name(self._next_segment)
+            self._next_segment += 1
+            ids = np.arange(self._next_id, self._next_id + len(documents), dtype=np.int64)
+            self._next_id += len(documents)
+            document_ranges = _document_ranges(ids, metadatas)
+            record = {"op": "add", "segment": name, "rows": len(documents), "ids": [int(ids[0]), int(ids[-1]) + 1],
+                      "documents": document_ranges}
+            if upsert is not None:
+                record["upsert"] = upsert
+            try:
+                write_segment(self.segments_dir, name, embeddings, documents, metadatas, ids)
+                self._log.append(record)
+            except Exception as e:
+                logger.error(f"Error saving FAISS segment {name}: {e}")
+                delete_segment_files(self.segments_dir, name)
+                raise
+            segment = build_segment(self.segments_dir, name, embeddings, ids, self.index_type, self.vector_codec)
+
+            current = self._snapshots.current
+            documents_by_id = dict(current.documents)
+            replaced = documents_by_id.pop(upsert, []) if upsert is not None else []
+            for document_id, ranges in document_ranges.items():
+                documents_by_id[document_id] = documents_by_id.get(document_id, []) + ranges
+            tombstones = current.tombstones
+            if replaced:
+                tombstones = _Tombstones(tombstones.ranges + tuple(replaced))
+            self._publish(segments=current.segments + (segment,), documents=documents_by_id, tombstones=tombstones)
+            logger.info(f"Added {len(documents)} documents to FAISS index. Total documents: {self.ntotal}")
+        if replaced:
+            self._notify_deleted(replaced)
+        self._maybe_start_compaction()
+        self.maintenance.maybe_start()
 
-        self.texts.extend(documents)
-        logger.info(f"Added {len(documents)} documents to FAISS index. Total documents: {len(self.texts)}")
-        self._save_index()
+    def upsert_document(self, document_id: str, documents: list[str],
+                        metadatas: Optional[List[Dict[str, Any]]] = None,
+                        cache_stats: Optional[EmbeddingCacheStats] = None):
+        """
+        Replaces all chunks of a document with new ones.
+
+        The new chunks are added and the old ones tombstoned in a single logged step,
+        so the cost is proportional to the document, not the corpus.
+
+        Args:
+            document_id (str): The document to replace. It need not exist yet.
+            documents (list[str]): The document's new chunk texts. If empty, the
+                document is deleted.
+            metadatas (list[dict], optional): Per-chunk metadata; `document_id` is set on each.
+            cache_stats (EmbeddingCacheStats, optional): Receives the embedding cache hits and misses.
+        """
+        if not documents:
+            self.delete_document(document_id)
+            return
+        metadatas = [dict(metadata or {}, document_id=document_id) for metadata in (metadatas or [None] * len(documents))]
+        embeddings = self.embed_documents(documents, cache_stats)
+        if len(embeddings) == 0:
+            logger.error(f"Could not generate embeddings for document {document_id}. Aborting upsert.")
+            return
+        self.add_embeddings(embeddings, documents, metadatas, upsert=document_id)
+
+    def delete_document(self, document_id: str) -> int:
+        """
+        Deletes all chunks of a document. The chunks are tombstoned immediately and
+        physically removed by a later compaction.
+
+        Args:
+            document_id (str): The document to delete.
+
+        Returns:
+            int: The number of chunks deleted (0 if the document is unknown).
+        """
+        with self._write_lock:
+            current = self._snapshots.current
+            ranges = current.documents.get(document_id)
+            if not ranges:
+                return 0
+            self._lock_for_writing()
+            self._log.append({"op": "delete", "document": document_id})
+            documents_by_id = dict(current.documents)
+            del documents_by_id[document_id]
+            self._publish(documents=documents_by_id, tombstones=_Tombstones(current.tombstones.ranges + tuple(ranges)))
+        deleted = sum(end - start for start, end in ranges)
+        logger.info(f"Deleted document {document_id} ({deleted} chunks) from FAISS index.")
+        self._notify_deleted(ranges)
+        self._maybe_start_compaction()
+        return deleted
+
+    def add_change_listener(self, listener: Callable[[Optional[List[IdRange]]], None]):
+        """
+        Registers a callback invoked with the id ranges of chunks that were deleted or
+        replaced, or with None when the whole store is cleared.
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[Optional[List[IdRange]]], None]):
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _notify_deleted(self, ranges: Optional[List[IdRange]]):
+        for listener in list(self._change_listeners):
+            try:
+                listener(ranges)
+            except Exception as e:
+                logger.error(f"Error in FAISS store change listener: {e}")
+
+    def document_ids(self) -> List[str]:
+        """Returns the ids of the documents in the store."""
+        return list(self._snapshots.current.documents)
+
+    def document_chunk_count(self, document_id: str) -> int:
+        """Returns the number of live chunks stored for a document (0 if it is unknown)."""
+        return sum(end - start for start, end in self._snapshots.current.documents.get(document_id, ()))
 
     def search(self, query: str, k: int = 5) -> list[str]:
         """
@@ -87,48 +577,354 @@ class FAISSVectorStore:
         Returns:
             list[str]: A list of the top-k most similar text documents.
         """
-        if not self.index or self.index.ntotal == 0:
+        if self.ntotal == 0:
             logger.warning("FAISS index is empty. No search performed.")
             return []
 
         query_embedding = self.embedding_model.get_embeddings([query])
-        if not query_embedding:
+        if len(query_embedding) == 0:
             logger.error("Could not generate embedding for query. Aborting search.")
             return []
 
-        query_embedding_np = np.array(query_embedding).astype('float32')
+        return self.search_by_embedding(query_embedding[0], k)
+
+    def search_by_embedding(self, query_embedding: np.ndarray, k: int = 5) -> list[str]:
+        """
+        Searches the FAISS index with an already computed query embedding.
 
-        D, I = self.index.search(query_embedding_np, k)  # D is distances, I is indices
+        Args:
+            query_embedding (np.ndarray): A float32 vector of shape (dimension,).
+            k (int): The number of nearest neighbors to retrieve.
 
+        Returns:
+            list[str]: A list of the top-k most similar text documents.
+        """
+        return [hit["text"] for hit in self.search_chunks(query_embedding, k)]
+
+    def search_chunks(self, query_embedding: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None, document_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Searches the FAISS index and returns the hits with their metadata.
+
+        With `document_ids`, only chunks of those documents are searched. A filter that
+        selects less than `filter_brute_force_ratio` of the stored chunks is answered by
+        an exact scan over just those chunks' vectors; a wider one is pushed into the
+        FAISS search as an IDSelector.
+
+        Args:
+            query_embedding (np.ndarray): A float32 vector of shape (dimension,).
+            k (int): The number of nearest neighbors to retrieve.
+            nprobe (int, optional): IVF lists to scan, overriding `settings.FAISS_IVF_NPROBE`.
+            ef_search (int, optional): HNSW candidate list size, overriding `settings.FAISS_HNSW_EF_SEARCH`.
+            document_ids (list[str], optional): Restricts the search to these documents.
+
+        Returns:
+            list[dict]: Up to k hits, nearest first, each with `id`, `text`, `metadata` and `distance`.
+        """
+        query_embedding_np = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        with self._snapshots.pin() as snapshot:
+            key = (query_embedding_np.tobytes(), k, nprobe, ef_search,
+                   tuple(document_ids) if document_ids is not None else None, snapshot.version)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return [dict(hit) for hit in cached]
+            started = time.perf_counter()
+            results = self._search_chunks(snapshot, query_embedding_np, k, nprobe, ef_search, document_ids)
+            self.search_seconds.record(time.perf_counter() - started)
+        self.result_cache.put(key, tuple(dict(hit) for hit in results))
+        self.maintenance.maybe_start()
+        return results
+
+    def _search_chunks(self, snapshot: Snapshot, query_embedding_np: np.ndarray, k: int, nprobe: Optional[int],
+                       ef_search: Optional[int], document_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Runs an uncached search over a pinned snapshot; see `search_chunks`."""
+        tombstones = snapshot.tombstones
+        documents = snapshot.documents
+        segments = snapshot.segments
+        if not segments:
+            logger.warning("FAISS index is empty. No search performed.")
+            return []
+
+        selector = tombstones.selector
+        if document_ids is not None:
+            # Document ranges never include tombstoned ids, so the filter replaces the tombstone selector.
+            ranges = [r for document_id in dict.fromkeys(document_ids) for r in documents.get(document_id, [])]
+            if not ranges:
+                logger.info(f"No chunks stored for documents {document_ids}. No search performed.")
+                return []
+            if sum(end - start for start, end in ranges) <= self.filter_brute_force_ratio * self._physical_rows(snapshot):
+                return self._hits(self._scan_ranges(segments, ranges, query_embedding_np[0], k), k)
+            id_filter = _IdFilter(ranges, self._next_id, self.filter_batch_max_ids)
+            selector = id_filter.selector
+
+        # Every segment returns its own top-k; the global top-k is among them. Segments
+        # storing compressed codes return `rescore_factor` times as many candidates,
+        # which are then ranked by their exact distances from the float vectors.
+        candidates = []
+        for segment in segments:
+            params = search_params(segment.index, nprobe, ef_search, selector)
+            rescore = self.rescore_factor > 0 and segment.codec != "none"
+            fetch = k * self.rescore_factor if rescore else k
+            D, I = segment.index.search(query_embedding_np, min(fetch, segment.size), params=params)  # D is distances, I is chunk ids
+            found = I[0] != -1
+            distances, chunk_ids = D[0][found], I[0][found]
+            if rescore and len(chunk_ids):
+                distances = segment.exact_distances(query_embedding_np[0], chunk_ids)
+                if len(chunk_ids) > k:
+                    nearest = np.argpartition(distances, k - 1)[:k]
+                    distances, chunk_ids = distances[nearest], chunk_ids[nearest]
+            candidates.extend((float(distance), segment, int(i)) for distance, i in zip(distances, chunk_ids))
+
+        results = self._hits(candidates, k)
+        logger.info(f"Performed FAISS search for query over {len(segments)} segments. Found {len(results)} results.")
+        return results
+
+    @staticmethod
+    def _scan_ranges(segments: Tuple[Segment, ...], ranges: List[IdRange], query: np.ndarray, k: int) -> list:
+        """
+        Computes exact distances to the chunks in `ranges`. A live range always lies
+        within one segment, as consecutive rows.
+        """
+        candidates = []
+        for segment in segments:
+            if not segment.size:
+                continue
+            for start, end in ranges:
+                row = segment.row(start)
+                if row >= segment.size or segment.ids[row] != start:
+                    continue
+                distances = ((segment.vectors[row:row + end - start] - query) ** 2).sum(axis=1)
+                nearest = np.argpartition(distances, k - 1)[:k] if len(distances) > k else np.arange(len(distances))
+                candidates.extend((float(distances[i]), segment, start + int(i)) for i in nearest)
+        return candidates
+
+    @staticmethod
+    def _hits(candidates: list, k: int) -> List[Dict[str, Any]]:
+        """Reads the k nearest (distance, segment, chunk id) candidates from the chunk stores."""
+        candidates.sort(key=lambda candidate: candidate[0])
+        # Only the winning chunks are read from the chunk stores.
         results = []
-        for i in I[0]:
-            if i != -1 and i < len(self.texts):  # Ensure index is valid
-                results.append(self.texts[i])
-        
-        logger.info(f"Performed FAISS search for query. Found {len(results)} results.")
+        for distance, segment, chunk_id in candidates[:k]:
+            text, metadata = segment.chunks.get(segment.row(chunk_id))
+            results.append({"id": chunk_id, "text": text, "metadata": metadata, "distance": distance})
         return results
 
-    def _save_index(self):
+    def _physical_rows(self, snapshot: Optional[Snapshot] = None) -> int:
+        return sum(segment.size for segment in (snapshot or self._snapshots.current).segments)
+
+    def _needs_purge(self) -> bool:
+        """True if tombstoned chunks exceed `tombstone_ratio` of the stored chunks."""
+        snapshot = self._snapshots.current
+        count = snapshot.tombstones.count
+        return count > 0 and count > self.tombstone_ratio * self._physical_rows(snapshot)
+
+    def _maybe_start_compaction(self):
+        """Starts a background compaction if there are too many segments or tombstones."""
+        if len(self._snapshots.current.segments) <= self.max_segments and not self._needs_purge():
+            return
+        with self._write_lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self.compact, name="faiss-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    @property
+    def compacting(self) -> bool:
+        """True while a background compaction is running."""
+        thread = self._compaction_thread
+        return thread is not None and thread.is_alive()
+
+    @property
+    def busy(self) -> bool:
+        """True while a background compaction or index rebuild is running."""
+        return self.compacting or self.maintenance.running
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        """Blocks until a running background compaction finishes."""
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def compact(self):
         """
-        Saves the FAISS index and associated texts to disk.
+        Merges adjacent segments until at most `max_segments` remain, then rewrites the
+        segments holding the most tombstoned chunks until tombstones are back under
+        `tombstone_ratio`.
+
+        Each merge step merges the run of `merge_factor` adjacent segments with the
+        fewest chunks, so large segments are rewritten rarely. Every rewrite drops the
+        tombstoned chunks of the segments it replaces. The new segment is written and
+        logged before it replaces the old ones; searches continue throughout, and the
+        old segments' files are deleted once no search is using them.
         """
-        os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
         try:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.index_path + ".texts", "w", encoding="utf-8") as f:
-                for text in self.texts:
-                    f.write(text + "\n")
-            logger.info(f"FAISS index and texts saved to {self.index_path}")
+            while len(self._snapshots.current.segments) > self.max_segments:
+                segments = self._snapshots.current.segments
+                width = min(self.merge_factor, len(segments))
+                first = min(range(len(segments) - width + 1),
+                            key=lambda i: sum(segment.size for segment in segments[i:i + width]))
+                if not self._compact_step(first, width):
+                    return
+            while self._needs_purge():
+                snapshot = self._snapshots.current
+                deleted_ids = snapshot.tombstones.ids
+                dead = [int(np.isin(segment.ids, deleted_ids).sum()) for segment in snapshot.segments]
+                first = int(np.argmax(dead))
+                if dead[first] == 0 or not self._compact_step(first, 1):
+                    return
         except Exception as e:
-            logger.error(f"Error saving FAISS index or texts: {e}")
+            logger.error(f"Error compacting FAISS segments: {e}")
+
+    def _compact_step(self, first: int, width: int) -> bool:
+        """
+        Rewrites `width` adjacent segments starting at `first` as one segment without
+        their tombstoned chunks. Returns False if the store changed underneath it.
+        """
+        with self._write_lock:
+            self._lock_for_writing()
+        # The pin keeps the window's chunk stores open while they are read.
+        with self._snapshots.pin() as snapshot:
+            window = snapshot.segments[first:first + width]
+            tombstones = snapshot.tombstones
+
+            ids = np.concatenate([np.asarray(s.ids) for s in window])
+            keep = ~np.isin(ids, tombstones.ids)
+            range_starts = np.array([start for start, _ in tombstones.ranges], dtype=np.int64)
+            purged = [r for r, inside in zip(tombstones.ranges, np.isin(range_starts, ids)) if inside]
+            vectors = np.concatenate([read_segment_vectors(self.segments_dir, s.name) for s in window])[keep]
+            records = [record for s in window for record in s.chunks]
+            records = [record for record, kept in zip(records, keep) if kept]
+
+        name, merged = None, ()
+        if records:
+            with self._write_lock:
+                name = segment_name(self._next_segment)
+                self._next_segment += 1
+            write_segment(self.segments_dir, name, vectors, [text for text, _ in records],
+                          [metadata for _, metadata in records], ids[keep])
+            merged = (build_segment(self.segments_dir, name, vectors, ids[keep], self.index_type,
+                                     self.vector_codec),)
+
+        with self._write_lock:
+            current = self._snapshots.current
+            # Compared by name: a segment whose index the maintenance rebuilt meanwhile is
+            # a new Segment object over the same chunks, which the merged segment covers.
+            if [s.name for s in current.segments[first:first + width]] != [s.name for s in window]:
+                # Another compaction or a clear replaced these segments while we were merging.
+                if name is not None:
+                    merged[0].chunks.close()
+                    delete_segment_files(self.segments_dir, name)
+                return False
+            self._log.append({"op": "merge", "segment": name, "replaces": [s.name for s in window],
+                              "purged": purged})
+            # Deletes that arrived during the merge stay tombstoned: their ids live on in the new segment.
+            purged_ranges = set(purged)
+            # The contents are unchanged, so the version (and every cached result) stays valid.
+            self._publish(changed=False, segments=current.segments[:first] + merged + current.segments[first + width:],
+                          tombstones=_Tombstones(tuple(r for r in current.tombstones.ranges if r not in purged_ranges)))
+            if self._log.records > 2 * len(self._snapshots.current.segments) + 16:
+                self._log.rewrite(self._log_state())
+        logger.info(f"Compacted {width} FAISS segments ({len(records)} chunks, "
+                    f"{int((~keep).sum())} deleted chunks dropped) into {name}.")
+        return True
+
+    def upgrade_index_type(self, index_type: str):
+        """
+        Switches the index type new and rebuilt segments get, durably: the switch is
+        logged and survives restarts until `settings.FAISS_INDEX_TYPE` changes. Existing
+        segments keep their indexes until the maintenance rebuilds them.
+        """
+        with self._write_lock:
+            if index_type == self.index_type:
+                return
+            self._lock_for_writing()
+            configured = self._upgrade["configured"] if self._upgrade else self.index_type
+            self._upgrade = {"index_type": index_type, "configured": configured}
+            self._log.append({"op": "upgrade", **self._upgrade})
+            logger.info(f"Upgrading FAISS index type of namespace '{self.namespace}' from {self.index_type} "
+                        f"to {index_type} ({self.ntotal} chunks).")
+            self.index_type = index_type
+
+    def rebuild_segment_index(self, segment: Segment) -> bool:
+        """
+        Rebuilds a segment's index with the store's index type and codec and swaps it in. The index
+        is built and saved without blocking searches or writes. Returns False if the
+        segment was compacted away or the store cleared meanwhile.
+        """
+        with self._write_lock:
+            self._lock_for_writing()
+        index_type, codec = self.index_type, self.vector_codec
+        # The pin keeps the segment's vector file in place while the index is built.
+        with self._snapshots.pin() as snapshot:
+            if segment not in snapshot.segments:
+                return False
+            index = build_index(segment.vectors, index_type, segment.ids, codec)
+            staged_path = stage_segment_index(self.segments_dir, segment.name, index)
+            with self._write_lock:
+                current = self._snapshots.current
+                if segment not in current.segments:
+                    os.remove(staged_path)
+                    return False
+                rebuilt = swap_segment_index(self.segments_dir, segment, staged_path, index)
+                position = current.segments.index(segment)
+                # Same files, same contents: the old Segment only needs closing, and cached results stay valid.
+                self._publish(changed=False, directory=None,
+                              segments=current.segments[:position] + (rebuilt,) + current.segments[position + 1:])
+        logger.info(f"Rebuilt FAISS segment {segment.name} ({segment.size} chunks) as {index_type} "
+                    f"({rebuilt.codec} codec).")
+        return True
+
+    def _log_state(self) -> LogState:
+        snapshot = self._snapshots.current
+        state = LogState()
+        state.upgrade = self._upgrade
+        state.names = [s.name for s in snapshot.segments]
+        state.documents = snapshot.documents
+        state.deleted = list(snapshot.tombstones.ranges)
+        state.next_id = self._next_id
+        return state
+
+    def close(self):
+        """
+        Closes the store's segments once no search uses them, leaving its files on disk.
+        The store must not be used afterwards; open the namespace again to reload it.
+        """
+        self.maintenance.stop()
+        self.wait_for_compaction()
+        with self._write_lock:
+            self._publish(changed=False, directory=None, segments=())
+        self.result_cache.clear()
+        if self._lock_path is not None:
+            _unlock_store(self._lock_path)
+            self._lock_path = None
+        logger.info(f"FAISS vector store for namespace '{self.namespace}' closed.")
 
     def clear_index(self):
         """
         Clears the FAISS index and removes associated files from disk.
+
+        The segments directory is first renamed out of the way, so a crash leaves either
+        the whole old store or an empty one. Searches still running on the old snapshot
+        finish on its already opened segments.
         """
-        self._create_new_index() # Re-initialize an empty index
-        if os.path.exists(self.index_path):
-            os.remove(self.index_path)
-        if os.path.exists(self.index_path + ".texts"):
-            os.remove(self.index_path + ".texts")
-        logger.info("FAISS index and associated files cleared.")
\ No newline at end of file
+        # A running compaction would write into the directory being removed.
+        self.wait_for_compaction()
+        with self._write_lock:
+            self._lock_for_writing()
+            if os.path.exists(self.segments_dir):
+                trash = f"{self.segments_dir}.cleared-{os.getpid()}-{self._snapshots.current.version}"
+                os.replace(self.segments_dir, trash)
+                shutil.rmtree(trash, ignore_errors=True)
+            for path in (self.index_path, self.index_path + ".texts"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._log = SegmentLog(self.segments_dir)
+            if self._upgrade is not None:
+                # An empty store starts over at the configured index type.
+                self.index_type = self._upgrade["configured"]
+                self._upgrade = None
+            # The old segments' files are already gone; they only need closing.
+            self._publish(directory=None, segments=(), documents={}, tombstones=_Tombstones())
+        self.result_cache.clear()
+        self._notify_deleted(None)
+        logger.info("FAISS index and associated files cleared.")
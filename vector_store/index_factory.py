@@ -0,0 +1,220 @@
+import logging
+import math
+from typing import Optional
+import faiss
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# How vectors are stored in an index: float32, half floats, 8-bit scalar quantization,
+# RaBitQ binary codes (1 bit per dimension plus a few factors) or PCA-reduced float32.
+CODECS = ("none", "fp16", "sq8", "binary", "pca")
+
+_SCALAR_QUANTIZERS = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+# The "binary" codec's RaBitQ indexes only exist in recent faiss releases; the other codecs work with any.
+_RABITQ_INDEXES = tuple(index_class for index_class in (getattr(faiss, "IndexRaBitQ", None),
+                                                        getattr(faiss, "IndexIVFRaBitQ", None)) if index_class is not None)
+
+# Vectors sampled to train IVF coarse quantizers and PQ codebooks.
+_MAX_TRAINING_VECTORS = 256 * 1024
+
+def ivf_nlist(num_vectors: int) -> int:
+    """
+    Returns the number of IVF lists for a corpus: the configured value, or ~4*sqrt(n)
+    capped so that every list gets the ~39 training points FAISS asks for.
+    """
+    if settings.FAISS_IVF_NLIST:
+        return settings.FAISS_IVF_NLIST
+    return max(1, min(65536, int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def min_vectors_for(index_type: str, num_vectors: int) -> int:
+    """Returns how many vectors an index type needs before it is worth building."""
+    if index_type == "flat":
+        return 0
+    needed = settings.FAISS_ANN_MIN_VECTORS
+    if index_type == "ivf_flat":
+        needed = max(needed, 39 * ivf_nlist(num_vectors))
+    elif index_type == "ivf_pq":
+        needed = max(needed, 39 * ivf_nlist(num_vectors), 39 * (1 << settings.FAISS_PQ_NBITS))
+    return needed
+
+def effective_index_type(index_type: Optional[str], num_vectors: int) -> str:
+    """Returns the index type `build_index` uses for `num_vectors` vectors when asked for `index_type`."""
+    index_type = index_type or settings.FAISS_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}. Expected one of {INDEX_TYPES}.")
+    if num_vectors < min_vectors_for(index_type, num_vectors):
+        return "flat"
+    return index_type
+
+def check_codec(codec: str) -> str:
+    """Returns `codec` if it is one of CODECS and the installed faiss supports it; raises ValueError otherwise."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown FAISS vector codec: {codec}. Expected one of {CODECS}.")
+    if codec == "binary" and len(_RABITQ_INDEXES) < 2:
+        raise ValueError(f"The 'binary' FAISS vector codec needs IndexRaBitQ and IndexIVFRaBitQ, which faiss "
+                         f"{faiss.__version__} does not have. Upgrade faiss-cpu or choose another codec.")
+    return codec
+
+def effective_codec(codec: Optional[str], index_type: str, num_vectors: int, dimension: int) -> str:
+    """
+    Returns the codec `build_index` uses for `num_vectors` vectors of an `index_type`
+    index when asked for `codec`. Small segments keep float32 vectors, PQ codes are
+    compact already, and HNSW has no binary variant.
+    """
+    codec = check_codec(codec or settings.FAISS_VECTOR_CODEC)
+    if codec == "none" or num_vectors < settings.FAISS_CODEC_MIN_VECTORS:
+        return "none"
+    if codec == "pca":
+        return codec if settings.FAISS_PCA_DIMENSION < dimension else "none"
+    if index_type == "ivf_pq" or (codec == "binary" and index_type == "hnsw"):
+        return "none"
+    return codec
+
+def _create(index_type: str, dimension: int, num_vectors: int, codec: str = "none") -> faiss.Index:
+    if codec == "pca":
+        reduced = settings.FAISS_PCA_DIMENSION
+        return faiss.IndexPreTransform(faiss.PCAMatrix(dimension, reduced), _create(index_type, reduced, num_vectors))
+    scalar_quantizer = _SCALAR_QUANTIZERS.get(codec)
+    if index_type == "flat":
+        if scalar_quantizer is not None:
+            return faiss.IndexScalarQuantizer(dimension, scalar_quantizer)
+        if codec == "binary":
+            return faiss.IndexRaBitQ(dimension, faiss.METRIC_L2)
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "hnsw":
+        if scalar_quantizer is not None:
+            index = faiss.IndexHNSWSQ(dimension, scalar_quantizer, settings.FAISS_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, settings.FAISS_HNSW_M)
+        index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+        return index
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf_flat":
+        if scalar_quantizer is not None:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dimension, ivf_nlist(num_vectors), scalar_quantizer)
+        if codec == "binary":
+            return faiss.IndexIVFRaBitQ(quantizer, dimension, ivf_nlist(num_vectors))
+        return faiss.IndexIVFFlat(quantizer, dimension, ivf_nlist(num_vectors))
+    if index_type == "ivf_pq":
+        pq_m = max(m for m in range(1, settings.FAISS_PQ_M + 1) if dimension % m == 0)
+        if pq_m != settings.FAISS_PQ_M:
+            logger.warning(f"FAISS_PQ_M={settings.FAISS_PQ_M} does not divide dimension {dimension}; using {pq_m}.")
+        return faiss.IndexIVFPQ(quantizer, dimension, ivf_nlist(num_vectors), pq_m, settings.FAISS_PQ_NBITS)
+    raise ValueError(f"Unknown FAISS index type: {index_type}. Expected one of {INDEX_TYPES}.")
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """Returns the index inside an IndexIDMap and a PCA IndexPreTransform, or the index itself."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def apply_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Applies the query-time tuning knobs to an index. Knobs that do not apply to the
+    index type are ignored.
+    """
+    nprobe = nprobe or settings.FAISS_IVF_NPROBE
+    ef_search = ef_search or settings.FAISS_HNSW_EF_SEARCH
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                  selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Returns per-query search parameters, or None if the index defaults apply as they are.
+    Unlike `apply_search_params` this does not modify the index, so it is safe while
+    other threads search it.
+
+    Args:
+        index (faiss.Index): The index about to be searched.
+        nprobe (int, optional): IVF lists to scan instead of the index default.
+        ef_search (int, optional): HNSW candidate list size instead of the index default.
+        selector (faiss.IDSelector, optional): Restricts the search to the selected ids.
+            The caller must keep it alive until the search returns.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe, sel=selector)
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW) and (ef_search or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or inner.hnsw.efSearch, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+def index_type_of(index: faiss.Index) -> str:
+    """Returns the INDEX_TYPES name of an index built by `build_index`."""
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+def codec_of(index: faiss.Index) -> str:
+    """Returns the CODECS name of how an index built by `build_index` stores its vectors."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return "pca"
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(index, _RABITQ_INDEXES):
+        return "binary"
+    return "none"
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None,
+                ids: Optional[np.ndarray] = None, codec: Optional[str] = None) -> faiss.Index:
+    """
+    Builds a FAISS index over `vectors`, training it first if the type requires it.
+
+    Index types that need training (IVF) or only pay off at scale (HNSW) fall back to
+    an exact Flat index until enough vectors exist; segments are rebuilt with the
+    configured type as compaction merges them past the threshold.
+
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, dimension).
+        index_type (str, optional): One of INDEX_TYPES. Defaults to `settings.FAISS_INDEX_TYPE`.
+        ids (np.ndarray, optional): int64 ids of the vectors. If given, the index is wrapped
+            in an IndexIDMap and searches return these ids instead of row numbers.
+        codec (str, optional): One of CODECS. Defaults to `settings.FAISS_VECTOR_CODEC`.
+
+    Returns:
+        faiss.Index: The populated index, with search parameters applied.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dimension = vectors.shape
+    index_type = effective_index_type(index_type, num_vectors)
+    codec = effective_codec(codec, index_type, num_vectors, dimension)
+
+    index = _create(index_type, dimension, num_vectors, codec)
+    if not index.is_trained:
+        sample = vectors
+        if num_vectors > _MAX_TRAINING_VECTORS:
+            rows = np.random.default_rng(0).choice(num_vectors, _MAX_TRAINING_VECTORS, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+        logger.info(f"Trained {index_type} index ({codec} codec) on {len(sample)} vectors.")
+    if ids is not None:
+        # Not IndexIDMap2: its reverse id map would be rebuilt on every load, and
+        # segment vectors are read from their own files rather than reconstructed.
+        index = faiss.IndexIDMap(index)
+        if num_vectors:
+            index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    elif num_vectors:
+        index.add(vectors)
+    apply_search_params(index)
+    return index
@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from config.settings import settings
+from utils.metrics import LatencyStats
+from vector_store.index_factory import effective_codec, effective_index_type, index_type_of
+from vector_store.segments import Segment
+
+logger = logging.getLogger(__name__)
+
+class IndexMaintenance:
+    """
+    Background upkeep of a FAISSVectorStore's segment indexes.
+
+    Watches the store's size and search latency. Once a Flat store holds
+    `min_vectors` live chunks, or its p95 search latency reaches `latency_ms` with at
+    least FAISS_ANN_MIN_VECTORS chunks, the store is upgraded to `upgrade_index_type`.
+    Segments whose index is not of the type or codec the store builds for them (after
+    an upgrade, or after FAISS_INDEX_TYPE or FAISS_VECTOR_CODEC changed) are then
+    rebuilt one at a time on a background thread, from their memory-mapped vectors,
+    and swapped in atomically.
+
+    Searches keep using the old index until the swap. Nothing written meanwhile needs
+    replaying into the new one: added chunks land in new segments, built with the new
+    type, and deletes are tombstones applied at search time.
+    """
+    def __init__(self, store, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the IndexMaintenance.
+
+        Args:
+            store (FAISSVectorStore): The store to maintain.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.store = store
+        self.upgrade_index_type = settings.FAISS_UPGRADE_INDEX_TYPE
+        self.min_vectors = settings.FAISS_UPGRADE_MIN_VECTORS
+        self.latency_ms = settings.FAISS_UPGRADE_LATENCY_MS
+        self.check_interval = settings.FAISS_UPGRADE_CHECK_SECONDS
+        self._clock = clock
+        self._next_check = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.upgrades = 0
+        self.rebuilt_segments = 0
+        self.rebuild_seconds = LatencyStats()
+
+    @property
+    def running(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def maybe_start(self):
+        """
+        Starts a background pass if there is work to do. Checks at most once every
+        `check_interval` seconds, so it is cheap enough to call after every search.
+        """
+        now = self._clock()
+        if now < self._next_check or self._stopped.is_set():
+            return
+        self._next_check = now + self.check_interval
+        if self.running or (self.upgrade_due() is None and not self.stale_segments()):
+            return
+        with self._lock:
+            if self.running or self._stopped.is_set():
+                return
+            self._thread = threading.Thread(target=self.run, name="faiss-maintenance", daemon=True)
+            self._thread.start()
+
+    def upgrade_due(self) -> Optional[str]:
+        """Returns the index type to upgrade the store to, if it is Flat and past a threshold."""
+        target = self.upgrade_index_type
+        if self.store.index_type != "flat" or not target or target == "flat":
+            return None
+        live = self.store.ntotal
+        if live >= self.min_vectors:
+            return target
+        if self.latency_ms and live >= settings.FAISS_ANN_MIN_VECTORS:
+            latency = self.store.search_seconds.stats()
+            if latency["count"] >= 20 and latency["p95"] * 1000 >= self.latency_ms:
+                return target
+        return None
+
+    def stale_segments(self) -> List[Segment]:
+        """Returns the segments whose index is not of the type or codec the store builds for them, largest first."""
+        stale = [segment for segment in self.store.snapshot.segments if self._stale(segment)]
+        return sorted(stale, key=lambda segment: segment.size, reverse=True)
+
+    def _stale(self, segment: Segment) -> bool:
+        index_type = effective_index_type(self.store.index_type, segment.size)
+        if index_type_of(segment.index) != index_type:
+            return True
+        return segment.codec != effective_codec(self.store.vector_codec, index_type, segment.size, self.store.dimension)
+
+    def run(self):
+        """Upgrades the store if due, then rebuilds its stale segments until done or stopped."""
+        if not self.store.can_write():
+            logger.info("Skipping FAISS index maintenance: another process has the store open.")
+            return
+        try:
+            target = self.upgrade_due()
+            if target is not None:
+                self.store.upgrade_index_type(target)
+                self.upgrades += 1
+            for segment in self.stale_segments():
+                if self._stopped.is_set():
+                    return
+                started = time.perf_counter()
+                if self.store.rebuild_segment_index(segment):
+                    self.rebuilt_segments += 1
+                    self.rebuild_seconds.record(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Error maintaining FAISS segment indexes: {e}")
+
+    def wait(self, timeout: Optional[float] = None):
+        """Blocks until a running pass finishes."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stop(self):
+        """Stops after the segment being rebuilt, if any, and starts no further passes."""
+        self._stopped.set()
+        self.wait()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "index_type": self.store.index_type,
+            "vector_codec": self.store.vector_codec,
+            "running": self.running,
+            "upgrades": self.upgrades,
+            "rebuilt_segments": self.rebuilt_segments,
+            "stale_segments": len(self.stale_segments()),
+            "rebuild_seconds": self.rebuild_seconds.stats(),
+            "search_seconds": self.store.search_seconds.stats(),
+        }
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+from config.settings import settings
+from utils.metrics import LatencyStats
+from vector_store.embedding_cache import EmbeddingCache
+from vector_store.embeddings import EmbeddingModel
+from vector_store.faiss_store import FAISSVectorStore, validate_namespace
+
+logger = logging.getLogger(__name__)
+
+class ResourceRegistry:
+    """
+    Process-wide owner of the heavyweight vector search resources shared by agents.
+
+    Hands out a single lazily loaded EmbeddingModel and one live FAISSVectorStore per
+    namespace, so every agent in the process sees the same index: vectors added by the
+    IngestionAgent are searchable by the RetrievalAgent immediately. Resources are
+    reference counted.
+
+    A namespace store nobody holds stays resident so the next request for it is
+    served without reloading, as long as the resident stores fit in `resident_bytes`.
+    Beyond that, idle stores are closed, least recently used first, and reloaded on
+    their next acquire. Stores in use are never evicted. `residency_stats()` reports
+    what is resident, load times, and hit, load and eviction counts.
+
+    The stores also share one persistent EmbeddingCache for the model, so a chunk is
+    encoded once no matter how often, or into which namespace, it is ingested.
+    """
+    def __init__(self, embedding_model_factory: Optional[Callable[[], EmbeddingModel]] = None,
+                 base_dir: Optional[str] = None, resident_bytes: Optional[int] = None):
+        """
+        Initializes the ResourceRegistry.
+
+        Args:
+            embedding_model_factory (callable, optional): Builds the shared embedding model.
+                Defaults to `EmbeddingModel`.
+            base_dir (str, optional): Overrides `settings.VECTOR_STORE_DIR` for the stores.
+                The embedding cache then lives in its `embedding_cache` subdirectory.
+            resident_bytes (int, optional): Overrides `settings.VECTOR_STORE_RESIDENT_BYTES`.
+                0 closes every store as soon as its last holder releases it.
+        """
+        self._embedding_model_factory = embedding_model_factory or EmbeddingModel
+        self._base_dir = base_dir
+        self._lock = threading.RLock()
+        self._embedding_model: Optional[EmbeddingModel] = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._embedding_refs = 0
+        # Resident stores, least recently used first.
+        self._stores: "OrderedDict[str, FAISSVectorStore]" = OrderedDict()
+        self._store_refs: Dict[str, int] = {}
+        self.resident_bytes = settings.VECTOR_STORE_RESIDENT_BYTES if resident_bytes is None else resident_bytes
+        self.load_seconds = LatencyStats()
+        self._hits = 0
+        self._loads = 0
+        self._evictions = 0
+
+    def acquire_embedding_model(self) -> EmbeddingModel:
+        """
+        Returns the shared EmbeddingModel, loading it on first use.
+
+        Every call must be paired with `release_embedding_model()`.
+        """
+        with self._lock:
+            if self._embedding_model is None:
+                logger.info("Loading shared embedding model.")
+                self._embedding_model = self._embedding_model_factory()
+            self._embedding_refs += 1
+            return self._embedding_model
+
+    def release_embedding_model(self):
+        """Drops one reference to the shared EmbeddingModel, unloading it at zero."""
+        with self._lock:
+            if self._embedding_refs == 0:
+                logger.warning("release_embedding_model called without a matching acquire.")
+                return
+            self._embedding_refs -= 1
+            if self._embedding_refs == 0:
+                self._embedding_model = None
+                if self._embedding_cache is not None:
+                    self._embedding_cache.close()
+                    self._embedding_cache = None
+                logger.info("Shared embedding model unloaded.")
+
+    def _acquire_embedding_cache(self, embedding_model) -> Optional[EmbeddingCache]:
+        """Returns the embedding cache for the shared model, opening it on first use. Needs the lock."""
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return None
+        if self._embedding_cache is None:
+            directory = os.path.join(self._base_dir, "embedding_cache") if self._base_dir else None
+            model_name = getattr(embedding_model, "model_name", type(embedding_model).__name__)
+            self._embedding_cache = EmbeddingCache(model_name, embedding_model.dimension, directory=directory)
+        return self._embedding_cache
+
+    def acquire_vector_store(self, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE) -> FAISSVectorStore:
+        """
+        Returns the live FAISSVectorStore for a namespace, loading it if it is not resident.
+
+        Every call must be paired with `release_vector_store(namespace)`; prefer
+        `vector_store(namespace)` for a store used by one request.
+
+        Args:
+            namespace (str): The index namespace.
+
+        Returns:
+            FAISSVectorStore: The store shared by every holder of this namespace.
+
+        Raises:
+            ValueError: If the namespace is not a valid name.
+        """
+        validate_namespace(namespace)
+        with self._lock:
+            store = self._stores.get(namespace)
+            if store is None:
+                embedding_model = self.acquire_embedding_model()
+                started = time.perf_counter()
+                try:
+                    store = FAISSVectorStore(namespace=namespace, embedding_model=embedding_model,
+                                             base_dir=self._base_dir,
+                                             embedding_cache=self._acquire_embedding_cache(embedding_model))
+                except Exception:
+                    self.release_embedding_model()
+                    raise
+                elapsed = time.perf_counter() - started
+                self.load_seconds.record(elapsed)
+                self._loads += 1
+                self._stores[namespace] = store
+                self._store_refs[namespace] = 0
+                logger.info(f"Opened shared vector store for namespace '{namespace}' in {elapsed:.3f}s.")
+            else:
+                self._hits += 1
+                self._stores.move_to_end(namespace)
+            self._store_refs[namespace] += 1
+            self._evict()
+            return store
+
+    def release_vector_store(self, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE):
+        """Drops one reference to a namespace's store; idle stores are evicted beyond the byte budget."""
+        with self._lock:
+            if not self._store_refs.get(namespace):
+                logger.warning(f"release_vector_store called for '{namespace}' without a matching acquire.")
+                return
+            self._store_refs[namespace] -= 1
+            if self._store_refs[namespace] == 0:
+                self._stores.move_to_end(namespace)
+                self._evict()
+
+    @contextmanager
+    def vector_store(self, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE) -> Iterator[FAISSVectorStore]:
+        """Holds a namespace's store for the duration of the block."""
+        store = self.acquire_vector_store(namespace)
+        try:
+            yield store
+        finally:
+            self.release_vector_store(namespace)
+
+    @asynccontextmanager
+    async def async_vector_store(self, namespace: str = settings.VECTOR_STORE_DEFAULT_NAMESPACE
+                                 ) -> AsyncIterator[FAISSVectorStore]:
+        """
+        Like `vector_store`, for handlers on the event loop. Opening a cold namespace
+        (and closing the stores it evicts) happens under the registry lock and may take
+        a while, so acquire and release run in the default executor instead of blocking
+        every other handler.
+        """
+        loop = asyncio.get_running_loop()
+        acquired = loop.run_in_executor(None, self.acquire_vector_store, namespace)
+        try:
+            store = await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The acquire still completes in its thread; hand the store back once it does.
+            def release_when_acquired(future):
+                if not future.cancelled() and future.exception() is None:
+                    self.release_vector_store(namespace)
+            acquired.add_done_callback(release_when_acquired)
+            raise
+        try:
+            yield store
+        finally:
+            await loop.run_in_executor(None, self.release_vector_store, namespace)
+
+    def _evict(self):
+        """
+        Closes idle stores, least recently used first, until the resident ones fit the
+        byte budget. Stores compacting or rebuilding indexes in the background are
+        skipped. Call with the lock held.
+        """
+        sizes = {namespace: store.resident_bytes() for namespace, store in self._stores.items()}
+        total = sum(sizes.values())
+        for namespace in list(self._stores):
+            if self.resident_bytes and total <= self.resident_bytes:
+                break
+            store = self._stores[namespace]
+            if self._store_refs[namespace] or store.busy:
+                continue
+            del self._stores[namespace]
+            del self._store_refs[namespace]
+            store.close()
+            self.release_embedding_model()
+            self._evictions += 1
+            total -= sizes[namespace]
+            logger.info(f"Evicted vector store for namespace '{namespace}' ({sizes[namespace]} bytes).")
+
+    def residency_stats(self) -> dict:
+        """
+        Returns the resident stores (least recently used first) with their sizes and
+        holders, the byte budget, and the hit, load and eviction counters.
+        """
+        with self._lock:
+            resident = {namespace: {"bytes": store.resident_bytes(), "refs": self._store_refs[namespace],
+                                    "chunks": store.ntotal}
+                        for namespace, store in self._stores.items()}
+            return {
+                "budget_bytes": self.resident_bytes,
+                "resident_bytes": sum(entry["bytes"] for entry in resident.values()),
+                "resident": resident,
+                "hits": self._hits,
+                "loads": self._loads,
+                "evictions": self._evictions,
+                "load_seconds": self.load_seconds.stats(),
+            }
+
+    def stats(self) -> dict:
+        """Returns the current reference counts and cache counters, for diagnostics."""
+        with self._lock:
+            return {
+                "embedding_model_loaded": self._embedding_model is not None,
+                "embedding_model_refs": self._embedding_refs,
+                "embedding_cache": self._embedding_cache.stats.as_dict() if self._embedding_cache else None,
+                "vector_stores": {namespace: refs for namespace, refs in self._store_refs.items() if refs},
+                "result_caches": {namespace: store.result_cache.stats() for namespace, store in self._stores.items()},
+            }
+
+registry = ResourceRegistry()
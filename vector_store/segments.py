@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from config.settings import settings
+from vector_store.chunk_store import ChunkStore, chunk_store_exists, delete_chunk_store, write_chunk_store
+from vector_store.index_factory import apply_search_params, build_index, codec_of, index_type_of
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "seg-"
+LOG_NAME = "segments.log"
+# Memory-mapped index reads need IO_FLAG_MMAP_IFC; faiss releases without it read
+# segment indexes into memory, as with FAISS_MMAP_INDEXES = False.
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+if _MMAP_FLAG is None:
+    logger.warning("This faiss release cannot memory-map indexes; segment indexes are read into memory.")
+
+# A half-open range [start, end) of chunk ids.
+IdRange = Tuple[int, int]
+
+class Segment:
+    """
+    An immutable run of chunks: a FAISS index over their vectors and a memory-mapped
+    chunk store holding their texts and metadata. `ids` are the chunks' stable 64-bit
+    ids in ascending order; the index returns them as search labels. `vectors` are the
+    memory-mapped float32 vectors, in the same order, for exact scans and for rescoring
+    candidates from an index that stores compressed codes.
+    """
+    def __init__(self, name: str, index: faiss.Index, chunks: ChunkStore, ids: np.ndarray, vectors: np.ndarray):
+        self.name = name
+        self.index = index
+        self.chunks = chunks
+        self.ids = ids
+        self.vectors = vectors
+        self._nbytes: Optional[int] = None
+        self._codec: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The bytes searching the segment keeps in memory once hot: its files, which are
+        memory-mapped, or for a Flat index rebuilt in memory, another copy of its vectors.
+        """
+        if self._nbytes is None:
+            directory = os.path.dirname(self.chunks.path)
+            total, indexed = 0, False
+            for filename in os.listdir(directory):
+                if filename.split(".")[0] == self.name:
+                    total += os.path.getsize(os.path.join(directory, filename))
+                    indexed = indexed or filename.endswith(".faiss")
+            self._nbytes = total if indexed else total + self.vectors.nbytes
+        return self._nbytes
+
+    @property
+    def codec(self) -> str:
+        """How the segment's index stores its vectors; one of index_factory.CODECS."""
+        if self._codec is None:
+            self._codec = codec_of(self.index)
+        return self._codec
+
+    def row(self, chunk_id: int) -> int:
+        """Returns the position of a chunk id within the segment."""
+        return int(np.searchsorted(self.ids, chunk_id))
+
+    def exact_distances(self, query: np.ndarray, chunk_ids: np.ndarray) -> np.ndarray:
+        """Returns the squared L2 distances from `query` to the float vectors of the given chunks."""
+        rows = np.searchsorted(self.ids, chunk_ids)
+        return ((self.vectors[rows] - query) ** 2).sum(axis=1)
+
+def segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:08d}"
+
+def segment_number(name: str) -> int:
+    return int(name[len(SEGMENT_PREFIX):])
+
+def _fsync_replace(tmp_path: str, final_path: str):
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+def _save_array(path: str, array: np.ndarray):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    _fsync_replace(path + ".tmp", path)
+
+def write_segment(directory: str, name: str, vectors: np.ndarray, texts: List[str],
+                  metadatas: Optional[List[Optional[Dict[str, Any]]]] = None, ids: Optional[np.ndarray] = None):
+    """
+    Durably writes a segment's vectors (`<name>.npy`), chunk ids (`<name>.ids.npy`)
+    and its chunk store. `ids` default to 0..n-1.
+
+    Files are written under temporary names and renamed into place, so a crash never
+    leaves a half-written segment behind a valid name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if ids is None:
+        ids = np.arange(len(texts), dtype=np.int64)
+    _save_array(os.path.join(directory, name + ".npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+    _save_array(os.path.join(directory, name + ".ids.npy"), np.asarray(ids, dtype=np.int64))
+    write_chunk_store(directory, name, zip(texts, metadatas or [None] * len(texts)))
+
+def read_segment_vectors(directory: str, name: str) -> np.ndarray:
+    """Returns a segment's vectors as a read-only memory-mapped float32 array."""
+    return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+
+def read_segment_ids(directory: str, name: str) -> np.ndarray:
+    """Returns a segment's chunk ids as a read-only memory-mapped int64 array."""
+    return np.load(os.path.join(directory, name + ".ids.npy"), mmap_mode="r")
+
+def _mmap_indexes() -> bool:
+    """Whether segment indexes are memory-mapped: configured, and supported by the installed faiss."""
+    return settings.FAISS_MMAP_INDEXES and _MMAP_FLAG is not None
+
+def read_segment_index(directory: str, name: str) -> faiss.Index:
+    """
+    Reads a segment's saved index. With `settings.FAISS_MMAP_INDEXES` its vectors, codes,
+    graph and inverted lists are memory-mapped from the file rather than copied into
+    memory: opening takes milliseconds whatever the segment's size, pages are read on
+    first use, and processes opening the same store share them through the page cache.
+    faiss releases without IO_FLAG_MMAP_IFC read the index into memory instead.
+    """
+    flags = _MMAP_FLAG if _mmap_indexes() else 0
+    index = faiss.read_index(os.path.join(directory, name + ".faiss"), flags)
+    apply_search_params(index)
+    return index
+
+def stage_segment_index(directory: str, name: str, index: faiss.Index) -> str:
+    """Durably writes an index for a segment under a temporary name and returns its path."""
+    staged_path = os.path.join(directory, name + ".faiss.tmp")
+    faiss.write_index(index, staged_path)
+    with open(staged_path, "rb+") as f:
+        os.fsync(f.fileno())
+    return staged_path
+
+def build_segment(directory: str, name: str, vectors: np.ndarray, ids: np.ndarray,
+                  index_type: Optional[str] = None, codec: Optional[str] = None) -> Segment:
+    """
+    Builds the index for a segment whose chunk store is already on disk.
+
+    The index is saved as `<name>.faiss` so it is not rebuilt (or retrained) on every
+    startup, and reopened memory-mapped. Without `settings.FAISS_MMAP_INDEXES` only
+    trained indexes (non-Flat, or storing compressed codes) are saved; float Flat indexes
+    are then cheaper to rebuild from the vectors than to read.
+    """
+    index = build_index(vectors, index_type, ids, codec)
+    if _mmap_indexes() or index_type_of(index) != "flat" or codec_of(index) != "none":
+        os.replace(stage_segment_index(directory, name, index), os.path.join(directory, name + ".faiss"))
+        if _mmap_indexes():
+            index = read_segment_index(directory, name)
+    return Segment(name, index, ChunkStore(directory, name), ids, read_segment_vectors(directory, name))
+
+def swap_segment_index(directory: str, segment: Segment, staged_path: str, index: faiss.Index) -> Segment:
+    """
+    Installs an index staged by `stage_segment_index` as the segment's `<name>.faiss`
+    and returns a new Segment object using it. Searches holding the old Segment keep
+    using its index, whose file stays readable until it is unmapped.
+    """
+    os.replace(staged_path, os.path.join(directory, segment.name + ".faiss"))
+    if _mmap_indexes():
+        index = read_segment_index(directory, segment.name)
+    return Segment(segment.name, index, ChunkStore(directory, segment.name), segment.ids, segment.vectors)
+
+def load_segment(directory: str, name: str, first_id: int) -> Segment:
+    """
+    Loads a segment written by `write_segment`, opening its saved index if it has one,
+    whatever its type and codec; a segment without one gets a float Flat index. Nothing is trained at
+    load time: the store's IndexMaintenance rebuilds indexes of the wrong type or codec
+    in the background.
+
+    Segments from before stable chunk ids are given the ids `first_id`, `first_id + 1`, ...
+    """
+    legacy_texts = os.path.join(directory, name + ".jsonl")
+    if not chunk_store_exists(directory, name) and os.path.exists(legacy_texts):
+        # Segments from before the binary chunk store kept one JSON string per line.
+        with open(legacy_texts, "r", encoding="utf-8") as f:
+            write_chunk_store(directory, name, ((json.loads(line), None) for line in f))
+        os.remove(legacy_texts)
+    ids_path = os.path.join(directory, name + ".ids.npy")
+    if not os.path.exists(ids_path):
+        _save_array(ids_path, np.arange(first_id, first_id + len(read_segment_vectors(directory, name)), dtype=np.int64))
+    ids = read_segment_ids(directory, name)
+    index_path = os.path.join(directory, name + ".faiss")
+    if os.path.exists(index_path):
+        index = read_segment_index(directory, name)
+        # IndexIDMap2 (from before memory-mapped loading) is a subclass of IndexIDMap.
+        if isinstance(index, faiss.IndexIDMap):
+            return Segment(name, index, ChunkStore(directory, name), ids, read_segment_vectors(directory, name))
+        # The index predates chunk ids; replace it.
+        del index
+        os.remove(index_path)
+    return build_segment(directory, name, read_segment_vectors(directory, name), ids, "flat", "none")
+
+def delete_segment_files(directory: str, name: str):
+    for suffix in (".npy", ".ids.npy", ".faiss", ".jsonl"):
+        path = os.path.join(directory, name + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    delete_chunk_store(directory, name)
+
+class LogState:
+    """
+    The store state recorded by the segment log: the live segments in order, which
+    chunk id ranges belong to which document, the tombstoned id ranges that are still
+    physically present in segments, the next unused chunk id, and the latest index
+    upgrade ({"index_type": ..., "configured": ...}), if any.
+    """
+    def __init__(self):
+        self.names: List[str] = []
+        self.documents: Dict[str, List[IdRange]] = {}
+        self.deleted: List[IdRange] = []
+        self.next_id = 0
+        self.upgrade: Optional[Dict[str, str]] = None
+
+def _ranges(ranges) -> List[IdRange]:
+    return [(int(start), int(end)) for start, end in ranges]
+
+class SegmentLog:
+    """
+    The append-only log recording which segments make up a store, in order, and which
+    chunk ids belong to which document.
+
+    Records are JSON lines:
+        {"op": "add", "segment": "seg-00000007", "rows": 128, "ids": [900, 1028],
+         "documents": {"report.pdf": [[900, 1028]]}, "upsert": "report.pdf"}
+        {"op": "merge", "segment": "seg-00000009", "replaces": ["seg-00000003", ...],
+         "purged": [[0, 40]]}
+        {"op": "delete", "document": "report.pdf"}
+        {"op": "upgrade", "index_type": "hnsw", "configured": "flat"}
+        {"op": "state", "next_id": 1028, "documents": {...}, "deleted": [[...]], "upgrade": {...}}
+
+    An add with "upsert" tombstones the document's previous chunks. A merge drops the
+    "purged" tombstoned ranges from the segments it replaces; a merge whose every row
+    was purged has a null "segment". An upgrade switches the store from its
+    "configured" index type (settings.FAISS_INDEX_TYPE) to "index_type"; it lapses
+    if the setting changes. "state" is written by `rewrite`.
+
+    Replaying the log yields the LogState. A torn final line (from a crash mid-append)
+    is ignored, and the log is periodically rewritten to just the live segments and
+    the current state so it does not grow without bound.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, LOG_NAME)
+        self.records = 0
+        self.torn = False  # The last replay ignored a torn record; rewrite before appending
+
+    def replay(self) -> LogState:
+        """Returns the recorded state."""
+        state = LogState()
+        self.records = 0
+        torn = False
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring torn record at the end of {self.path}")
+                    torn = True
+                    break
+                self.records += 1
+                self._apply(state, record)
+        # Replaying may run while other processes read the log, so the writer repairs it.
+        self.torn = torn
+        return state
+
+    @staticmethod
+    def _apply(state: LogState, record: dict):
+        op = record["op"]
+        if op == "add":
+            state.names.append(record["segment"])
+            if "ids" in record:
+                state.next_id = max(state.next_id, record["ids"][1])
+            if record.get("upsert") is not None:
+                state.deleted.extend(state.documents.pop(record["upsert"], []))
+            for document_id, ranges in record.get("documents", {}).items():
+                state.documents.setdefault(document_id, []).extend(_ranges(ranges))
+        elif op == "merge":
+            replaced = record["replaces"]
+            position = state.names.index(replaced[0])
+            state.names[position:position + len(replaced)] = [record["segment"]] if record["segment"] else []
+            purged = set(_ranges(record.get("purged", [])))
+            state.deleted = [r for r in state.deleted if r not in purged]
+        elif op == "delete":
+            state.deleted.extend(state.documents.pop(record["document"], []))
+        elif op == "upgrade":
+            state.upgrade = {"index_type": record["index_type"], "configured": record["configured"]}
+        elif op == "state":
+            state.next_id = record["next_id"]
+            state.documents = {document_id: _ranges(ranges) for document_id, ranges in record["documents"].items()}
+            state.deleted = _ranges(record["deleted"])
+            state.upgrade = record.get("upgrade")
+
+    def append(self, record: dict):
+        """Durably appends a record."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += 1
+
+    def rewrite(self, state: LogState):
+        """Atomically replaces the log with one "add" record per live segment and a "state" record."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for name in state.names:
+                f.write(json.dumps({"op": "add", "segment": name}) + "\n")
+            f.write(json.dumps({"op": "state", "next_id": state.next_id, "documents": state.documents,
+                                "deleted": state.deleted, "upgrade": state.upgrade}) + "\n")
+        _fsync_replace(tmp_path, self.path)
+        self.records = len(state.names) + 1
+        self.torn = False
+
+    def remove_orphans(self, live_names: List[str]):
+        """Deletes segment files no longer referenced by the log, and staged files (e.g. left by a crash)."""
+        live = set(live_names)
+        for filename in os.listdir(self.directory):
+            if filename.startswith(SEGMENT_PREFIX) and (filename.split(".")[0] not in live or filename.endswith(".tmp")):
+                os.remove(os.path.join(self.directory, filename))
+                logger.info(f"Removed orphaned segment file {filename}")
@@ -0,0 +1,105 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from vector_store.segments import IdRange, Segment, delete_segment_files
+
+logger = logging.getLogger(__name__)
+
+class Snapshot:
+    """
+    An immutable, consistent view of a store: its segments in order, the chunk id
+    ranges of each document and the tombstoned chunks. `version` is the store's
+    content version; it does not change when compaction merely rearranges segments.
+    """
+    def __init__(self, segments: Tuple[Segment, ...] = (), documents: Optional[Dict[str, List[IdRange]]] = None,
+                 tombstones: Any = None, version: int = 0):
+        self.segments = tuple(segments)
+        self.documents = documents if documents is not None else {}
+        self.tombstones = tombstones
+        self.version = version
+        self.pins = 0 # Readers using the snapshot; guarded by the SnapshotManager's lock
+
+class SnapshotManager:
+    """
+    Publishes a store's snapshots and keeps the segments readers use alive.
+
+    Readers `pin` the current snapshot and use it without further locking. Writers
+    `publish` a new one. A segment the new snapshot no longer contains is retired: its
+    chunk store is closed and its files are deleted only once no pinned snapshot
+    contains it. The lock is held for a few bookkeeping steps only, never for I/O
+    other than deleting garbage, so readers never wait for a writer.
+    """
+    def __init__(self, snapshot: Optional[Snapshot] = None):
+        self._current = snapshot or Snapshot()
+        self._lock = threading.Lock()
+        self._pinned: Set[Snapshot] = set() # Superseded snapshots still pinned by readers
+        self._retired: List[Tuple[Segment, Optional[str]]] = []
+
+    @property
+    def current(self) -> Snapshot:
+        """The latest snapshot. Pin it before reading chunk texts from its segments."""
+        return self._current
+
+    @contextmanager
+    def pin(self) -> Iterator[Snapshot]:
+        """Yields the current snapshot, keeping its segments' files alive until the block exits."""
+        with self._lock:
+            snapshot = self._current
+            snapshot.pins += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.pins -= 1
+                garbage = []
+                if not snapshot.pins and snapshot in self._pinned:
+                    self._pinned.discard(snapshot)
+                    garbage = self._collect()
+            self._dispose(garbage)
+
+    def publish(self, snapshot: Snapshot, directory: Optional[str]):
+        """
+        Makes `snapshot` the current one.
+
+        Args:
+            snapshot (Snapshot): The new snapshot.
+            directory (str, optional): Where the files of segments it retires live; None
+                if they are removed some other way and only need closing.
+        """
+        with self._lock:
+            previous = self._current
+            self._current = snapshot
+            if previous.pins:
+                self._pinned.add(previous)
+            live = set(snapshot.segments)
+            self._retired.extend((segment, directory) for segment in previous.segments if segment not in live)
+            garbage = self._collect()
+        self._dispose(garbage)
+
+    def _collect(self) -> List[Tuple[Segment, Optional[str]]]:
+        """Removes and returns the retired segments no snapshot in use contains. Call with the lock held."""
+        if not self._retired:
+            return []
+        live = set(self._current.segments).union(*(snapshot.segments for snapshot in self._pinned))
+        garbage = [(segment, directory) for segment, directory in self._retired if segment not in live]
+        self._retired = [(segment, directory) for segment, directory in self._retired if segment in live]
+        return garbage
+
+    @staticmethod
+    def _dispose(garbage: List[Tuple[Segment, Optional[str]]]):
+        for segment, directory in garbage:
+            try:
+                segment.chunks.close()
+                if directory is not None:
+                    delete_segment_files(directory, segment.name)
+            except Exception as e:
+                logger.error(f"Error removing retired FAISS segment {segment.name}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "version": self._current.version,
+                "pinned_snapshots": len(self._pinned) + (1 if self._current.pins else 0),
+                "retired_segments": len(self._retired),
+            }